@@ -1,9 +1,18 @@
 import pandas as pd
 import os
 import datetime
+import json
+import re
 import numpy as np
 from dotenv import load_dotenv
 
+import instrument
+from ingest import CACHE_DIR, CHUNK_SIZE, decode_column, decode_pairs, iter_sales_chunks, read_sales, source_key
+from occupancy import (align_cube, merge_cubes, minute_deltas, occupancy_cube, peak_concurrency,
+                       peaks_from_deltas, reduce_occupancy_cube, sum_cubes)
+from report_writer import ReportWriter
+from sales_cube import DAY_TYPES, METRICS, SLOTS, SalesCube
+
 # --- НАСТРОЙКИ ---
 load_dotenv()
 FILE_NAME = 'Покупка пакетов.xlsx'
@@ -14,6 +23,20 @@ COMPETITORS_FILE = 'competitors.xlsx'
 HIGH_LOAD_THRESHOLD = 0.80  # Если продаж > 80% от рекорда этой зоны -> ПОДНЯТЬ
 LOW_LOAD_THRESHOLD = 0.20   # Если продаж < 20% от рекорда -> АКЦИЯ
 
+# Режим анализа продаж: 'columnar' (pandas/NumPy) или 'rows' (эталонный построчный цикл)
+ANALYSIS_MODE = 'columnar'
+# Пиковая загрузка: 'sweep' (реально одновременные сессии) или 'bucket' (минуты в часе / 60)
+PEAK_MODE = 'sweep'
+# Версия формата скомпилированного price.xlsx (кэш в .cache/); менять при изменении load_config
+CONFIG_VERSION = 2
+# Базовая рыночная цена для 'fair': 'avg' (среднее по конкурентам) или 'median' (устойчива к выбросам)
+MARKET_BASIS = 'avg'
+# Компактный флаер: CSS-классы вместо inline-стилей, цифры ячеек одним JSON (для планшетов)
+FLYER_COMPACT = False
+# Дополнительно писать FLYER_WITH_STATS.html.gz (сжатая копия для веб-сервера)
+FLYER_GZIP = False
+
+
 def normalize_name(val):
     return str(val).strip().lower()
 
@@ -70,75 +93,170 @@ def get_tariff_code(name_raw):
 
     return None, False
 
+PC_RANGE_RE = re.compile(r'^(\D*)(\d+)\s*-\s*(\D*)(\d+)$')
+
+def parse_pc_list(pcs_raw):
+    """'11,12, 13' -> ['11', '12', '13']; ranges expand: '1-3' -> ['1', '2', '3']. None for an empty cell."""
+    pcs_str = str(pcs_raw)
+    if not pcs_str or pcs_str.lower() == 'nan': return None
+
+    pcs = []
+    for x in pcs_str.split(','):
+        x = x.strip()
+        m = PC_RANGE_RE.match(x)
+        if m and m.group(3) in ('', m.group(1)) and int(m.group(2)) <= int(m.group(4)):
+            pcs.extend(f"{m.group(1)}{n}" for n in range(int(m.group(2)), int(m.group(4)) + 1))
+        else:
+            pcs.append(x)
+    return pcs
+
+def parse_start_hour(time_range):
+    """'08:00-17:00' -> 8 (0 if unparseable)."""
+    try:
+        return int(str(time_range).split('-')[0].split(':')[0])
+    except:
+        return 0
+
+def parse_market_tags(t_raw):
+    """Context tags from a competitor tariff name: {'day_type': ..., 'slot': ...}."""
+    tags = {}
+    name_lower = str(t_raw).lower()
+    if 'выходн' in name_lower: tags['day_type'] = 'выходные'
+    elif 'будн' in name_lower: tags['day_type'] = 'будни'
+
+    if 'вечер' in name_lower: tags['slot'] = 'evening'
+    elif 'день' in name_lower or 'днев' in name_lower: tags['slot'] = 'day'
+    return tags
+
+def get_market_tags(t_raws):
+    """Vectorized parse_market_tags: (day_type, slot) label arrays, None where the name has no tag."""
+    names = pd.Series(t_raws).astype(str).str.strip().str.lower()
+    day_types = np.select(
+        [names.str.contains('выходн', regex=False), names.str.contains('будн', regex=False)],
+        ['выходные', 'будни'], None)
+    slots = np.select(
+        [names.str.contains('вечер', regex=False),
+         names.str.contains('день', regex=False) | names.str.contains('днев', regex=False)],
+        ['evening', 'day'], None)
+    return day_types, slots
+
 # --- 1. ЗАГРУЗКА КОНФИГУРАЦИИ (PRICE.XLSX) ---
-def load_config(file_path):
-    print(f"🌐 Загрузка конфигурации из {file_path}...")
+@instrument.staged(rows_out=lambda config: len(config['pc_map']))
+def compile_config(file_path):
+    """
+    Parses and validates price.xlsx.
+    Returns {'pc_map', 'price_grid', 'zone_capacity', 'duplicates', 'warnings'} or None if the file is unusable.
+    duplicates: {pc: [zones]} for PCs listed under more than one zone (the last row wins).
+    warnings: the printed messages, shown again when the config comes from the cache.
+    """
     try:
         df = pd.read_excel(file_path)
         df.columns = df.columns.str.strip()
     except Exception as e:
         print(f"❌ Ошибка чтения Price.xlsx: {e}")
-        return {}, {}, {}, {}
+        return None
 
     pc_map = {}
     price_grid = {}
     zone_capacity = {}
+    warnings = []
 
     required_cols = ['Название', 'номера ПК', 'Тариф', 'тип дня недели', 'Время цены', 'Цена']
     missing = [c for c in required_cols if c not in df.columns]
     if missing:
         print(f"❌ Ошибка: В файле {file_path} не найдены столбцы: {missing}")
-        return {}, {}, {}, {}
-
-    for _, row in df.iterrows():
-        z_name = str(row['Название']).strip()
-        pcs_str = str(row.get('номера ПК', ''))
-        t_raw = str(row.get('Тариф', ''))
-        d_type = str(row.get('тип дня недели', '')).lower()
-        time_range = str(row.get('Время цены', ''))
-        price = float(row.get('Цена', 0))
-
-        # 1. Map PCs
-        if pcs_str and pcs_str.lower() != 'nan':
-            pcs = [x.strip() for x in pcs_str.split(',')]
-            for pc in pcs:
-                norm_pc = normalize_name(pc)
-                pc_map[norm_pc] = z_name
-            zone_capacity[z_name] = len(pcs)
-
+        return None
+
+    # Classification runs once per distinct cell value (tariffs, PC lists and time ranges repeat a lot)
+    z_names = decode_column(df['Название'], lambda v: str(v).strip())
+    pc_lists = decode_column(df['номера ПК'], parse_pc_list)
+    t_codes, is_autosim = decode_pairs(df['Тариф'], lambda v: get_tariff_code(str(v)))
+    d_types = decode_column(df['тип дня недели'], lambda v: str(v).lower())
+    start_hs = decode_column(df['Время цены'], parse_start_hour).astype(int)
+    slots = get_slots(t_codes, is_autosim.astype(bool), start_hs)
+    prices = pd.to_numeric(df['Цена'], errors='coerce').to_numpy(dtype=float)
+
+    bad_prices = np.flatnonzero(np.isnan(prices) & df['Цена'].notna().to_numpy())
+    if len(bad_prices):
+        warnings.append(f"⚠️ Нечисловая цена в строках {[int(i) + 2 for i in bad_prices]}, строки пропущены.")
+
+    # 1. Map PCs (the last row listing a PC wins)
+    pc_zones = {}
+    pcs_frame = pd.DataFrame({'zone': z_names, 'pcs': decode_column(df['номера ПК'], str)})
+    for i in pcs_frame.drop_duplicates(keep='last').index:
+        pcs = pc_lists[i]
+        if not pcs: continue
+        for pc in pcs:
+            pc = normalize_name(pc)
+            pc_map[pc] = z_names[i]
+            zones = pc_zones.setdefault(pc, [])
+            if z_names[i] not in zones: zones.append(z_names[i])
+        zone_capacity[z_names[i]] = len(pcs)
+
+    duplicates = {pc: zones for pc, zones in pc_zones.items() if len(zones) > 1}
+    for pc, zones in duplicates.items():
+        warnings.append(f"⚠️ ПК '{pc}' указан в нескольких зонах {zones}, используется '{pc_map[pc]}'.")
+    for w in warnings: print(w)
+
+    for z_name, t_code, d_type, slot, price in zip(z_names, t_codes, d_types, slots, prices):
         # 2. Identify Tariff Code
-        t_code, is_autosim = get_tariff_code(t_raw)
-        if not t_code: continue
+        if not t_code or np.isnan(price): continue
 
-        # 3. Identify Time Slot
-        try:
-            start_h = int(time_range.split('-')[0].split(':')[0])
-        except:
-            start_h = 0
-
-        slot = 'day'
-        if is_autosim:
-            slot = 'all_day'
-        elif t_code == 'NIGHT':
-            slot = 'night'
-        else:
-            cutoff = get_cutoff_hour(t_code)
-            if 4 <= start_h < cutoff: slot = 'day'
-            else: slot = 'evening'
-
-        # 4. Populate Grid
+        # 3. Populate Grid
         if z_name not in price_grid: price_grid[z_name] = {}
         if t_code not in price_grid[z_name]: price_grid[z_name][t_code] = {}
         if d_type not in price_grid[z_name][t_code]: price_grid[z_name][t_code][d_type] = {}
 
-        price_grid[z_name][t_code][d_type][slot] = price
+        price_grid[z_name][t_code][d_type][slot] = float(price)
+
+    return {'pc_map': pc_map, 'price_grid': price_grid, 'zone_capacity': zone_capacity, 'duplicates': duplicates,
+            'warnings': warnings}
+
+def config_cache_path(file_path, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"config_v{CONFIG_VERSION}_{source_key(file_path, cache_dir)[:16]}.json")
+
+def load_compiled_config(file_path, cache_dir=CACHE_DIR):
+    """
+    compile_config through a JSON artifact keyed by the content hash of price.xlsx.
+    An unchanged price file is never re-parsed; any edit produces a new hash and a recompile.
+    Warnings of the file are repeated on every load; an unreadable artifact is recompiled.
+    """
+    try:
+        path = config_cache_path(file_path, cache_dir)
+    except OSError as e:
+        print(f"❌ Ошибка чтения Price.xlsx: {e}")
+        return None
 
-    return pc_map, price_grid, zone_capacity
+    if os.path.exists(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                config = json.load(f)
+            for w in config['warnings']: print(w)
+            return config
+        except (ValueError, KeyError) as e:
+            print(f"⚠️ Кэш конфигурации {path} поврежден ({e}), пересборка.")
+
+    config = compile_config(file_path)
+    if config is None: return None
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return config
+
+@instrument.staged(rows_out=lambda r: len(r[0]))
+def load_config(file_path, cache_dir=CACHE_DIR):
+    print(f"🌐 Загрузка конфигурации из {file_path}...")
+    config = load_compiled_config(file_path, cache_dir)
+    if config is None: return {}, {}, {}
+    return config['pc_map'], config['price_grid'], config['zone_capacity']
 
 # --- 2. ЗАГРУЗКА КОНКУРЕНТОВ С ПРИОРИТЕТОМ ---
+@instrument.staged(rows_out=lambda m: sum(len(e) for tariffs in m.values() for e in tariffs.values()))
 def load_competitors(file_path):
     print(f"⚔️ Загрузка конкурентов из {file_path}...")
-    market_data = {} # {Zone: {TariffCode: [ {tags: {}, fair: X} ] }}
+    market_data = MarketData() # {Zone: {TariffCode: [ {tags: {}, fair: X} ] }}
 
     if not os.path.exists(file_path):
         print(f"⚠️ Файл конкурентов {file_path} не найден. Работаем без рыночного фильтра.")
@@ -151,52 +269,83 @@ def load_competitors(file_path):
         cols = df.columns.tolist()
         price_cols = [c for c in cols if 'цена' in c.lower() and 'конкурент' in c.lower()]
 
-        for _, row in df.iterrows():
-            z_name = str(row.get('Ваша Зона', '')).strip()
-            t_raw = str(row.get('Тариф', '')).strip()
-            k = float(row.get('Ваш Коэффициент', 1.0))
-
-            t_code, _ = get_tariff_code(t_raw)
-            if not t_code or not z_name: continue
-
-            # Parse Tags from Name (Context)
+        def col(name, default):
+            return df[name] if name in df.columns else pd.Series([default] * len(df), index=df.index)
+
+        # Zone and tariff code are resolved once per distinct string
+        z_names = decode_column(col('Ваша Зона', ''), lambda v: str(v).strip())
+        t_raws = col('Тариф', '')
+        t_codes, _ = decode_pairs(t_raws, lambda v: get_tariff_code(str(v).strip()))
+        tag_days, tag_slots = get_market_tags(t_raws)
+        ks = pd.to_numeric(col('Ваш Коэффициент', 1.0), errors='coerce').fillna(1.0).to_numpy()
+
+        # All price columns coerced in bulk; junk, empty and non-positive cells become NaN
+        prices = np.array(df[price_cols].apply(pd.to_numeric, errors='coerce'), dtype=float)
+        prices[~(prices > 0) | ~np.isfinite(prices)] = np.nan
+        n_prices = (~np.isnan(prices)).sum(axis=1)
+
+        keep = (t_codes.astype(bool)) & (z_names.astype(bool)) & (n_prices > 0)
+        prices, n_prices = prices[keep], n_prices[keep]
+        stats = {
+            'avg': np.nansum(prices, axis=1) / n_prices,
+            'median': np.nanmedian(prices, axis=1),
+            'min': np.nanmin(prices, axis=1, initial=np.inf),
+            'max': np.nanmax(prices, axis=1, initial=-np.inf),
+        }
+        fair_prices = stats[MARKET_BASIS] * ks[keep]
+
+        rows = zip(z_names[keep], t_codes[keep], tag_days[keep], tag_slots[keep], fair_prices,
+                   stats['avg'], stats['median'], stats['min'], stats['max'], n_prices)
+        for z_name, t_code, day_tag, slot_tag, fair_price, avg, med, lo, hi, n in rows:
             tags = {}
-            name_lower = t_raw.lower()
-            if 'выходн' in name_lower: tags['day_type'] = 'выходные'
-            elif 'будн' in name_lower: tags['day_type'] = 'будни'
-
-            if 'вечер' in name_lower: tags['slot'] = 'evening'
-            elif 'день' in name_lower or 'днев' in name_lower: tags['slot'] = 'day'
-
-            # Calculate Avg
-            prices = []
-            for c in price_cols:
-                val = row.get(c)
-                try:
-                    val = float(val)
-                    if val > 0 and not np.isnan(val):
-                        prices.append(val)
-                except:
-                    pass
-
-            if prices:
-                avg_price = sum(prices) / len(prices)
-                fair_price = avg_price * k
-
-                if z_name not in market_data: market_data[z_name] = {}
-                if t_code not in market_data[z_name]: market_data[z_name][t_code] = []
-
-                market_data[z_name][t_code].append({
-                    'tags': tags,
-                    'fair': int(fair_price),
-                    'avg': int(avg_price)
-                })
+            if day_tag: tags['day_type'] = day_tag
+            if slot_tag: tags['slot'] = slot_tag
+
+            market_data.setdefault(z_name, {}).setdefault(t_code, []).append({
+                'tags': tags,
+                'fair': int(fair_price),
+                'avg': int(avg),
+                'median': int(med),
+                'min': int(lo),
+                'max': int(hi),
+                'spread': int(hi - lo),
+                'n': int(n),
+            })
 
     except Exception as e:
         print(f"❌ Ошибка чтения конкурентов: {e}")
 
+    market_data.build_index()
     return market_data
 
+class MarketData(dict):
+    """
+    market_data dict plus a resolved fair-price index keyed by (zone, tariff, day type, slot).
+    Specificity matching (get_fair_price) runs once per key at load time, so report
+    rendering does O(1) lookups. Call build_index() again after mutating the dict.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fair_index = {}
+
+    def build_index(self, day_types=DAY_TYPES, slots=SLOTS):
+        self.fair_index = {
+            (z_name, t_code, d_type, slot): get_fair_price(entries, d_type, slot)
+            for z_name, tariffs in self.items()
+            for t_code, entries in tariffs.items()
+            for d_type in day_types
+            for slot in slots
+        }
+        return self
+
+    def fair(self, z_name, t_code, day_type, slot):
+        key = (z_name, t_code, day_type, slot)
+        if key not in self.fair_index:
+            # Labels outside the precompiled axes (e.g. a custom day type in price.xlsx)
+            self.fair_index[key] = get_fair_price(self.get(z_name, {}).get(t_code, []), day_type, slot)
+        return self.fair_index[key]
+
 def get_fair_price(market_entries, day_type, slot):
     """
     Finds the best matching fair price based on specificity.
@@ -232,28 +381,189 @@ def get_fair_price(market_entries, day_type, slot):
     return None
 
 # --- 3. АНАЛИЗ EXCEL (SALES) ---
-def analyze_excel(file_path, pc_map, price_grid):
-    print("📂 Анализ продаж и подсчет чеков...")
-    try:
-        df = pd.read_excel(file_path)
-    except Exception as e:
-        print(f"❌ Ошибка чтения Excel: {e}")
-        return None, None, None, None, None, None
+DURATION_MAP = { '1_HOUR': 1, '2_HOURS': 2, '3_HOURS': 3, '5_HOURS': 5, 'NIGHT': 10 }
+
+def get_day_types(dt):
+    """Vectorized get_day_type for a datetime Series. Returns an ndarray of labels."""
+    weekday = dt.dt.weekday.to_numpy()
+    hour = dt.dt.hour.to_numpy()
+    weekend = (weekday > 4) | ((weekday == 4) & (hour >= 17)) | ((weekday == 0) & (hour < 8))
+    return np.where(weekend, 'выходные', 'будни')
+
+def get_slots(t_codes, is_autosim, hours):
+    """Vectorized slot assignment (day / evening / night / all_day)."""
+    cutoff = np.select([t_codes == '5_HOURS', t_codes == '3_HOURS'], [14, 16], 17)
+    std_slot = np.where((hours >= 4) & (hours < cutoff), 'day', 'evening')
+    return np.where(is_autosim, 'all_day', np.where(t_codes == 'NIGHT', 'night', std_slot))
+
+@instrument.staged(rows_in=lambda df, *a, **kw: len(df), rows_out=len)
+def classify_sales(df, pc_map, resolve_zone=None):
+    """
+    Columnar classification of the sales export.
+    Returns one row per mapped session: pc, zone, t_code, is_autosim, dt_start, dt_end,
+    d_type, slot, dur, cash, bonus, phone (+ dt_buy when the export has it).
+    resolve_zone: optional callable(raw_pc) -> (zone, zone_type) for PCs missing from
+    pc_map. With it unmapped PCs are kept and 'in_price'/'zone_type' columns are added.
+    """
+    n = len(df)
+    pc_col = df['ПК'] if 'ПК' in df.columns else pd.Series([None] * n, index=df.index)
+    t_col = df['Название тарифа'] if 'Название тарифа' in df.columns else pd.Series([None] * n, index=df.index)
+
+    pcs = decode_column(pc_col, normalize_name)
+    zones = decode_column(pc_col, lambda v: pc_map.get(normalize_name(v)))
+    t_codes, is_autosim = decode_pairs(t_col, lambda v: get_tariff_code(normalize_name(v)))
+    is_autosim = is_autosim.astype(bool)
+
+    if resolve_zone is None:
+        mask = pd.notnull(zones) & pd.notnull(t_codes)
+        instrument.count('dropped_unmapped_pc', (~pd.notnull(zones)).sum())
+        instrument.count('dropped_unknown_tariff', (pd.notnull(zones) & ~pd.notnull(t_codes)).sum())
+    else:
+        in_price = pd.notnull(zones)
+        fallback, zone_types = decode_pairs(pc_col, resolve_zone)
+        zones = np.where(in_price, zones, fallback)
+        mask = pd.notnull(t_codes)
+        instrument.count('dropped_unknown_tariff', (~mask).sum())
+
+    out = pd.DataFrame({
+        'pc': pcs[mask],
+        'zone': zones[mask],
+        't_code': t_codes[mask],
+        'is_autosim': is_autosim[mask],
+        'dt_start': df['dt_start'].to_numpy()[mask],
+    })
+    if 'dt_buy' in df.columns:
+        out['dt_buy'] = df['dt_buy'].to_numpy()[mask]
+    if resolve_zone is not None:
+        out['in_price'] = in_price[mask]
+        out['zone_type'] = zone_types[mask]
+
+    def numeric(col):
+        if col not in df.columns: return np.zeros(mask.sum())
+        return pd.to_numeric(df[col], errors='coerce').fillna(0).to_numpy(dtype=float)[mask]
+
+    out['cash'] = numeric('Списано рублей')
+    out['bonus'] = numeric('Списано бонусов')
+
+    if 'Номер телефона гостя' in df.columns:
+        out['phone'] = decode_column(df['Номер телефона гостя'], str)[mask]
+    else:
+        out['phone'] = ''
+
+    t = out['t_code'].to_numpy(dtype=object)
+    out['d_type'] = get_day_types(out['dt_start'])
+    out['slot'] = get_slots(t, out['is_autosim'].to_numpy(), out['dt_start'].dt.hour.to_numpy())
+    out['dur'] = out['t_code'].map(DURATION_MAP).fillna(1).astype(int)
+
+    default_end = out['dt_start'] + pd.to_timedelta(out['dur'], unit='h')
+    if 'Дата завершения сессии' in df.columns:
+        dt_end = pd.to_datetime(df['Дата завершения сессии'], dayfirst=True, errors='coerce').to_numpy()[mask]
+        instrument.count('defaulted_end_time', pd.isnull(dt_end).sum())
+        out['dt_end'] = pd.Series(dt_end).fillna(default_end)
+    else:
+        out['dt_end'] = default_end
+
+    return out
+
+SALES_KEYS = ['zone', 't_code', 'd_type', 'slot']
+
+def rollup_sales(sessions, keys=SALES_KEYS):
+    """count/hours/cash/bonus per key combination, in first-appearance order."""
+    return sessions.groupby(keys, sort=False).agg(
+        count=('cash', 'size'), hours=('dur', 'sum'), cash=('cash', 'sum'), bonus=('bonus', 'sum')).reset_index()
+
+def build_sales_stats(rollup):
+    """sales_stats as a SalesCube from a rollup (extra key columns such as 'day' are summed out)."""
+    return SalesCube.from_rollup(rollup)
+
+def rollup_pc_revenue(sessions):
+    pcs = sessions[sessions['pc'] != '']
+    return pcs.groupby('pc', sort=False).agg(
+        zone=('zone', 'first'), cash=('cash', 'sum'), bonus=('bonus', 'sum')).reset_index()
+
+def build_pc_revenue(rollup):
+    return {pc: {'cash': float(cash), 'bonus': float(bonus), 'zone': zone}
+            for pc, zone, cash, bonus in rollup[['pc', 'zone', 'cash', 'bonus']].itertuples(index=False)}
+
+def count_phones(sessions):
+    phones = sessions['phone']
+    counts = phones[phones.str.len() > 5].value_counts(sort=False)
+    return {p: int(c) for p, c in counts.items()}
+
+def aggregate_sales(sessions):
+    """Single groupby pass: sales_stats, pc_revenue and phone_counts from classified sessions."""
+    sales_stats = build_sales_stats(rollup_sales(sessions))
+    pc_revenue = build_pc_revenue(rollup_pc_revenue(sessions))
+    return sales_stats, pc_revenue, count_phones(sessions)
+
+def empty_rollups():
+    """Additive aggregates that can be folded batch by batch (chunks, daily increments)."""
+    return {
+        'sales': None,               # per-day rollup: day + SALES_KEYS + METRICS
+        'pc_revenue': None,          # pc, zone, cash, bonus
+        'phone_counts': {},
+        'occupancy': (np.array([], dtype='datetime64[D]'), [], np.zeros((0, 0, 24))),
+    }
 
-    df['dt_start'] = pd.to_datetime(df['Дата активации сессии'], dayfirst=True, errors='coerce')
-    if 'Дата покупки тарифа' in df.columns:
-        df['dt_buy'] = pd.to_datetime(df['Дата покупки тарифа'], dayfirst=True, errors='coerce')
-        df['dt_start'] = df['dt_start'].fillna(df['dt_buy'])
+def _concat_rollup(old, new, keys, agg):
+    if old is None: return new
+    return pd.concat([old, new]).groupby(keys, sort=False).agg(agg).reset_index()
+
+def merge_rollups(acc, sessions):
+    """Folds a batch of classified sessions into the additive aggregates in acc."""
+    sessions = sessions.assign(day=sessions['dt_start'].dt.normalize())
+    day_keys = ['day'] + SALES_KEYS
+
+    acc['sales'] = _concat_rollup(acc['sales'], rollup_sales(sessions, day_keys), day_keys,
+                                  {m: 'sum' for m in METRICS})
+    acc['pc_revenue'] = _concat_rollup(acc['pc_revenue'], rollup_pc_revenue(sessions), 'pc',
+                                       {'zone': 'first', 'cash': 'sum', 'bonus': 'sum'})
+    for phone, c in count_phones(sessions).items():
+        acc['phone_counts'][phone] = acc['phone_counts'].get(phone, 0) + c
+
+    acc['occupancy'] = merge_cubes(acc['occupancy'], build_occupancy_cube(sessions))
+
+def rollup_results(acc, peaks=None):
+    """analyze_excel tuple from folded aggregates; peaks aligned with acc['occupancy'] or None."""
+    if acc['sales'] is None:
+        return build_results({}, {'будни': {}, 'выходные': {}}, {}, {}, {})
 
-    df = df.dropna(subset=['dt_start'])
+    dates, zones, cube = acc['occupancy']
+    group_hourly_stats, global_max_stats = reduce_occupancy_cube(dates, zones, cube, peaks)
 
+    return build_results(
+        build_sales_stats(acc['sales']),
+        group_hourly_stats, global_max_stats,
+        acc['phone_counts'],
+        build_pc_revenue(acc['pc_revenue']),
+    )
+
+def _accumulate_occupancy(daily_occupancy, z_name, dt, est_end):
+    curr_h = dt.replace(minute=0, second=0, microsecond=0)
+    while curr_h < est_end:
+        d_str = curr_h.strftime('%Y-%m-%d')
+        h = curr_h.hour
+
+        overlap_start = max(dt, curr_h)
+        slot_end = curr_h + pd.Timedelta(hours=1)
+        overlap_end = min(est_end, slot_end)
+
+        mins = (overlap_end - overlap_start).total_seconds() / 60.0
+
+        if mins > 0:
+            if d_str not in daily_occupancy: daily_occupancy[d_str] = {}
+            if z_name not in daily_occupancy[d_str]: daily_occupancy[d_str][z_name] = {i: 0 for i in range(24)}
+            daily_occupancy[d_str][z_name][h] += mins
+
+        curr_h += pd.Timedelta(hours=1)
+
+def _analyze_rows(df, pc_map):
+    """Reference mode: the original per-row loop. Kept for result comparison."""
     sales_stats = {}
     daily_occupancy = {}
     phone_counts = {}
     pc_revenue = {}
 
-    duration_map = { '1_HOUR': 1, '2_HOURS': 2, '3_HOURS': 3, '5_HOURS': 5, 'NIGHT': 10 }
-
     for _, row in df.iterrows():
         pc_raw = normalize_name(row.get('ПК'))
         z_name = pc_map.get(pc_raw)
@@ -302,7 +612,7 @@ def analyze_excel(file_path, pc_map, price_grid):
 
         bucket = sales_stats[z_name][t_code][d_type][slot]
         bucket['count'] += 1
-        dur = duration_map.get(t_code, 1)
+        dur = DURATION_MAP.get(t_code, 1)
         bucket['hours'] += dur
         bucket['cash'] += cash
         bucket['bonus'] += bonus
@@ -314,24 +624,40 @@ def analyze_excel(file_path, pc_map, price_grid):
             est_end = pd.to_datetime(est_end, dayfirst=True, errors='coerce')
             if pd.isnull(est_end): est_end = dt + pd.Timedelta(hours=dur)
 
-        curr_h = dt.replace(minute=0, second=0, microsecond=0)
-        while curr_h < est_end:
-            d_str = curr_h.strftime('%Y-%m-%d')
-            h = curr_h.hour
+        _accumulate_occupancy(daily_occupancy, z_name, dt, est_end)
+
+    return sales_stats, daily_occupancy, phone_counts, pc_revenue
+
+def build_occupancy_cube(sessions):
+    """Runs the NumPy occupancy kernel over classified sessions. Returns (dates, zones, cube)."""
+    zone_ids, zones = pd.factorize(sessions['zone'])
+    dates, cube = occupancy_cube(sessions['dt_start'], sessions['dt_end'], zone_ids, len(zones))
+    return dates, list(zones), cube
 
-            overlap_start = max(dt, curr_h)
-            slot_end = curr_h + pd.Timedelta(hours=1)
-            overlap_end = min(est_end, slot_end)
+def build_peak_cube(sessions, dates, zones):
+    """Sweep-line peak concurrency aligned with the occupancy cube axes."""
+    zone_ids = pd.Categorical(sessions['zone'], categories=zones).codes
+    return peak_concurrency(sessions['dt_start'], sessions['dt_end'], zone_ids, len(zones), dates)
 
-            mins = (overlap_end - overlap_start).total_seconds() / 60.0
+def analyze_sessions(sessions, peak_mode=PEAK_MODE):
+    """
+    Columnar analysis over an already classified session table (see classify_sales).
+    Returns the analyze_excel tuple.
+    """
+    with instrument.stage('aggregate_sales', rows_in=len(sessions)):
+        sales_stats, pc_revenue, phone_counts = aggregate_sales(sessions)
 
-            if mins > 0:
-                if d_str not in daily_occupancy: daily_occupancy[d_str] = {}
-                if z_name not in daily_occupancy[d_str]: daily_occupancy[d_str][z_name] = {i: 0 for i in range(24)}
-                daily_occupancy[d_str][z_name][h] += mins
+    with instrument.stage('occupancy_cube', rows_in=len(sessions)):
+        dates, zones, cube = build_occupancy_cube(sessions)
+    with instrument.stage('peak_concurrency', rows_in=len(sessions)):
+        peaks = build_peak_cube(sessions, dates, zones) if peak_mode == 'sweep' else None
+    with instrument.stage('reduce_occupancy'):
+        group_hourly_stats, global_max_stats = reduce_occupancy_cube(dates, zones, cube, peaks)
 
-            curr_h += pd.Timedelta(hours=1)
+    return build_results(sales_stats, group_hourly_stats, global_max_stats, phone_counts, pc_revenue)
 
+def reduce_daily_occupancy(daily_occupancy):
+    """daily_occupancy {date: {zone: {hour: mins}}} -> (group_hourly_stats, global_max_stats)."""
     group_hourly_stats = {'будни': {}, 'выходные': {}}
     global_max_stats = {}
 
@@ -357,6 +683,39 @@ def analyze_excel(file_path, pc_map, price_grid):
 
                 global_max_stats[z][h] = max(global_max_stats[z][h], conc)
 
+    return group_hourly_stats, global_max_stats
+
+def parse_sales_dates(df):
+    """Adds dt_start (activation, falling back to purchase) and drops rows without a date."""
+    df['dt_start'] = pd.to_datetime(df['Дата активации сессии'], dayfirst=True, errors='coerce')
+    if 'Дата покупки тарифа' in df.columns:
+        df['dt_buy'] = pd.to_datetime(df['Дата покупки тарифа'], dayfirst=True, errors='coerce')
+        df['dt_start'] = df['dt_start'].fillna(df['dt_buy'])
+
+    parsed = df.dropna(subset=['dt_start'])
+    instrument.count('dropped_unparseable_date', len(df) - len(parsed))
+    return parsed
+
+def analyze_sales(df, pc_map, mode=ANALYSIS_MODE, peak_mode=PEAK_MODE):
+    """
+    Runs the sales analysis over an already loaded export.
+    mode: 'columnar' (pandas/NumPy) or 'rows' (reference per-row loop).
+    peak_mode: 'sweep' or 'bucket'; the rows mode always uses 'bucket'.
+    """
+    with instrument.stage('parse_sales_dates', rows_in=len(df)) as st:
+        df = parse_sales_dates(df)
+        st['rows_out'] = len(df)
+
+    if mode != 'rows':
+        return analyze_sessions(classify_sales(df, pc_map), peak_mode)
+
+    sales_stats, daily_occupancy, phone_counts, pc_revenue = _analyze_rows(df, pc_map)
+    group_hourly_stats, global_max_stats = reduce_daily_occupancy(daily_occupancy)
+
+    return build_results(sales_stats, group_hourly_stats, global_max_stats, phone_counts, pc_revenue)
+
+def build_results(sales_stats, group_hourly_stats, global_max_stats, phone_counts, pc_revenue):
+    """Final analyze_excel tuple; retention is derived from phone_counts."""
     repeats = sum(1 for c in phone_counts.values() if c > 1)
     retention_rate = (repeats / len(phone_counts) * 100) if phone_counts else 0
 
@@ -364,11 +723,54 @@ def analyze_excel(file_path, pc_map, price_grid):
 
     return sales_stats, day_counts, group_hourly_stats, global_max_stats, retention_rate, pc_revenue
 
+def analyze_excel_stream(file_path, pc_map, chunk_size=CHUNK_SIZE, peak_mode=PEAK_MODE):
+    """
+    Bounded-memory analyze_excel: the export is read chunk by chunk and every chunk goes
+    through classification and aggregation before the next one is loaded.
+    Peaks come from additive minute deltas, so chunk order does not matter.
+    """
+    print("📂 Потоковый анализ продаж...")
+    acc = empty_rollups()
+    chunk_deltas = []   # (dates, zones, deltas) per chunk, added up once at the end
+
+    try:
+        for chunk in iter_sales_chunks(file_path, chunk_size):
+            sessions = classify_sales(parse_sales_dates(chunk), pc_map)
+            merge_rollups(acc, sessions)
+            if peak_mode == 'sweep':
+                zone_ids, zones = pd.factorize(sessions['zone'])
+                dates, deltas = minute_deltas(sessions['dt_start'], sessions['dt_end'], zone_ids, len(zones))
+                chunk_deltas.append((dates, list(zones), deltas))
+    except Exception as e:
+        print(f"❌ Ошибка чтения Excel: {e}")
+        return None, None, None, None, None, None
+
+    peaks = None
+    if peak_mode == 'sweep':
+        dates, zones, _ = acc['occupancy']
+        deltas = sum_cubes(chunk_deltas)
+        peaks = align_cube((deltas[0], deltas[1], peaks_from_deltas(deltas[2])), dates, zones)
+
+    return rollup_results(acc, peaks)
+
+@instrument.staged()
+def analyze_excel(file_path, pc_map, price_grid, mode=ANALYSIS_MODE, peak_mode=PEAK_MODE):
+    print("📂 Анализ продаж и подсчет чеков...")
+    try:
+        with instrument.stage('read_sales') as st:
+            df = read_sales(file_path)
+            st['rows_out'] = len(df)
+    except Exception as e:
+        print(f"❌ Ошибка чтения Excel: {e}")
+        return None, None, None, None, None, None
+
+    return analyze_sales(df, pc_map, mode, peak_mode)
+
 # --- 4. РЕКОМЕНДАЦИИ С УЧЕТОМ РЫНКА ---
 def get_recommendation(peak_load_pct, price, bonus_share_pct, market_info=None):
     """
     Returns (action_code, new_price, reason)
-    market_info: {'fair': X, 'avg': Y}
+    market_info: {'fair': X, 'avg': Y, 'median': ..., 'min': ..., 'max': ..., 'spread': ...}
     """
     proposed_price = price
     action = 'OK'
@@ -403,61 +805,9 @@ def get_recommendation(peak_load_pct, price, bonus_share_pct, market_info=None):
 
     return action, proposed_price, reason
 
-def generate_flyer_with_stats(price_grid, sales_stats, zone_capacities, group_hourly_stats, retention_rate, pc_revenue, market_data):
-    print("🎨 Рисуем отчет...")
-
-    total_sales = 0
-    total_rev_c = 0
-    total_rev_b = 0
-
-    for z in sales_stats:
-        for t in sales_stats[z]:
-            for d in sales_stats[z][t]:
-                for s in sales_stats[z][t][d]:
-                    dat = sales_stats[z][t][d][s]
-                    total_sales += dat['count']
-                    total_rev_c += dat['cash']
-                    total_rev_b += dat['bonus']
-
-    total_rev = total_rev_c + total_rev_b
-    bonus_share = (total_rev_b / total_rev * 100) if total_rev else 0
-
-    worst_pcs = sorted(pc_revenue.items(), key=lambda x: (x[1]['cash'] + x[1]['bonus']))[:15]
-    worst_pc_html = """
-    <div style='margin-top:40px; border-top:1px solid #333; padding-top:20px;'>
-        <h3 style='color:#ff4d4d;'>📉 Топ-15 ПК с минимальной выручкой (Аутсайдеры)</h3>
-        <table style='width:100%; max-width:800px; margin:0 auto; font-size:12px;'>
-            <thead><tr style='background:#252525; color:#fff;'><th style='text-align:left; padding:8px;'>ПК</th><th style='text-align:left; padding:8px;'>Зона</th><th style='text-align:right; padding:8px;'>Выручка</th><th style='text-align:right; padding:8px;'>Бонусы</th></tr></thead>
-            <tbody>
-    """
-    for pc, d in worst_pcs:
-        worst_pc_html += f"<tr><td style='padding:8px;'>{pc}</td><td style='padding:8px;'>{d['zone']}</td><td style='text-align:right;'>{int(d['cash'])}</td><td style='text-align:right;'>{int(d['bonus'])}</td></tr>"
-    worst_pc_html += "</tbody></table></div>"
-
-    heatmap_html = ""
-    for d_type in ['будни', 'выходные']:
-        heatmap_html += f"<div style='margin-bottom:30px;'><h4>{d_type.upper()} - Пиковая Загрузка</h4><table style='font-size:10px; width:100%; border-spacing: 2px;'>"
-        heatmap_html += "<tr><td style='width:100px;'></td>" + "".join([f"<td style='text-align:center; color:#888;'>{h:02d}</td>" for h in range(24)]) + "</tr>"
-
-        for z_name in sorted(price_grid.keys()):
-            stats = group_hourly_stats.get(d_type, {}).get(z_name, {})
-            z_cap = zone_capacities.get(z_name, 1)
-
-            heatmap_html += f"<tr><td style='text-align:right; padding-right:10px; font-weight:bold;'>{z_name}</td>"
-            for h in range(24):
-                val = stats.get(h, {}).get('max', 0)
-                intensity = min(val/z_cap, 1.0) if z_cap > 0 else 0
-                bg = "#222"
-                if intensity >= 0.9: bg = f"rgba(255, 0, 0, {intensity})"
-                elif intensity > 0.7: bg = f"rgba(255, 77, 77, {intensity})"
-                elif intensity > 0.4: bg = f"rgba(255, 234, 0, {intensity})"
-                elif intensity > 0: bg = f"rgba(0, 230, 118, {intensity})"
-
-                heatmap_html += f"<td style='background:{bg}; color:white; text-align:center; padding:4px;'>{int(val)}</td>"
-            heatmap_html += "</tr>"
-        heatmap_html += "</table></div>"
-
-    html = f"""
+# --- 5. HTML-ОТЧЕТ (ФЛАЕР) ---
+# Static parts of the flyer, formatted per section and streamed through ReportWriter
+FLYER_TOP = """
     <html>
     <head>
         <title>CyberX Smart Price (Market Aware)</title>
@@ -482,16 +832,16 @@ def generate_flyer_with_stats(price_grid, sales_stats, zone_capacities, group_ho
             .rec-bonus {{ background: #ffea00; color: #000; padding: 2px 6px; border-radius: 4px; font-size: 10px; font-weight: bold; }}
             .empty {{ color: #444; }}
             .mkt-info {{ font-size: 9px; color: #aaa; border-top: 1px dashed #444; margin-top: 4px; padding-top: 2px; }}
-        </style>
+{extra_css}        </style>
     </head>
     <body>
         <div class="container">
-            <h1>Умный Прайс-Лист (Анализ Рынка)</h1>
+            <h1>Умный Прайс-Лист (Анализ Рынка)</h1>{period}
             <div class="dashboard">
-                <div class="kpi-card"><div class="kpi-val">{int(total_sales)}</div><div>Чеков</div></div>
-                <div class="kpi-card"><div class="kpi-val">{int(total_rev):,} ₽</div><div>Выручка</div></div>
-                <div class="kpi-card"><div class="kpi-val">{int(bonus_share)}%</div><div>Бонусы</div></div>
-                <div class="kpi-card"><div class="kpi-val">{int(retention_rate)}%</div><div>Retention</div></div>
+                <div class="kpi-card"><div class="kpi-val">{sales}</div><div>Чеков</div></div>
+                <div class="kpi-card"><div class="kpi-val">{revenue:,} ₽</div><div>Выручка</div></div>
+                <div class="kpi-card"><div class="kpi-val">{bonus_share}%</div><div>Бонусы</div></div>
+                <div class="kpi-card"><div class="kpi-val">{retention}%</div><div>Retention</div></div>
             </div>
 
             <div style="display:flex; gap:20px;">
@@ -499,127 +849,58 @@ def generate_flyer_with_stats(price_grid, sales_stats, zone_capacities, group_ho
                     <canvas id="mainChart"></canvas>
                 </div>
                 <div style="flex:1; overflow-y:auto; max-height:400px;">
-                    {heatmap_html}
+                    """.format
+FLYER_PERIOD = "<div style='text-align:center; color:#888; margin-bottom:20px;'>Период: {} — {}</div>".format
+FLYER_AFTER_HEATMAP = """
                 </div>
             </div>
 
-            {worst_pc_html}
-            <br>
-    """
+            """
 
-    col_order_std = [('1 ЧАС', '1_HOUR'), ('3 ЧАСА', '3_HOURS'), ('5 ЧАСОВ', '5_HOURS'), ('НОЧЬ', 'NIGHT')]
-    col_order_auto = [('1 ЧАС', '1_HOUR'), ('2 ЧАСА', '2_HOURS'), ('3 ЧАСА', '3_HOURS')]
+HEATMAP_OPEN = "<div style='margin-bottom:30px;'><h4>{} - Пиковая Загрузка</h4><table style='font-size:10px; width:100%; border-spacing: 2px;'>".format
+HEATMAP_HOURS = "<tr><td style='width:100px;'></td>" + "".join([f"<td style='text-align:center; color:#888;'>{h:02d}</td>" for h in range(24)]) + "</tr>"
+HEATMAP_ROW = "<tr><td style='text-align:right; padding-right:10px; font-weight:bold;'>{}</td>".format
+HEATMAP_CELL = "<td style='background:{}; color:white; text-align:center; padding:4px;'>{}</td>".format
 
-    for z_name in sorted(price_grid.keys()):
-        is_autosim = 'авто' in z_name.lower() or 'auto' in z_name.lower()
-        col_list = col_order_auto if is_autosim else col_order_std
+WORST_PC_OPEN = """
+    <div style='margin-top:40px; border-top:1px solid #333; padding-top:20px;'>
+        <h3 style='color:#ff4d4d;'>📉 Топ-15 ПК с минимальной выручкой (Аутсайдеры)</h3>
+        <table style='width:100%; max-width:800px; margin:0 auto; font-size:12px;'>
+            <thead><tr style='background:#252525; color:#fff;'><th style='text-align:left; padding:8px;'>ПК</th><th style='text-align:left; padding:8px;'>Зона</th><th style='text-align:right; padding:8px;'>Выручка</th><th style='text-align:right; padding:8px;'>Бонусы</th></tr></thead>
+            <tbody>
+    """
+WORST_PC_ROW = "<tr><td style='padding:8px;'>{}</td><td style='padding:8px;'>{}</td><td style='text-align:right;'>{}</td><td style='text-align:right;'>{}</td></tr>".format
+WORST_PC_CLOSE = "</tbody></table></div>"
 
-        html += f"""
+ZONE_OPEN = """
         <div class="zone-card">
             <div class="zone-header">{z_name}</div>
             <table>
                 <thead>
                     <tr>
                         <th style="padding-left:20px;">День недели</th>
-                        {"".join([f"<th>{lbl}</th>" for lbl, _ in col_list])}
+                        {headers}
                     </tr>
                 </thead>
                 <tbody>
-        """
-
-        active_days = set()
-        for t in price_grid[z_name].values():
-            active_days.update(t.keys())
-
-        for d_type in sorted(active_days, reverse=True):
-            html += f"<tr><td style='font-weight:bold; color:#ddd;'>{d_type.capitalize()}</td>"
-
-            for lbl, t_code in col_list:
-                p_data = price_grid[z_name].get(t_code, {}).get(d_type, {})
-                s_data = sales_stats.get(z_name, {}).get(t_code, {}).get(d_type, {})
-
-                # Market Lookup
-                market_entries = market_data.get(z_name, {}).get(t_code, [])
-
-                def render_cell(slot, label=None):
-                    price = int(p_data.get(slot, 0))
-                    if price == 0 and slot == 'all_day':
-                         for k, v in p_data.items():
-                             if v > 0: price = int(v); break
-
-                    if price == 0: return "<span class='empty'>-</span>"
-
-                    if slot not in s_data:
-                        bucket = {'count':0, 'hours':0, 'cash':0, 'bonus':0}
-                    else:
-                        bucket = s_data[slot]
-
-                    cash = bucket['cash']
-                    bonus = bucket['bonus']
-                    z_cap = zone_capacities.get(z_name, 1)
-
-                    h_range = range(0,24)
-                    if slot == 'day':
-                        cut = get_cutoff_hour(t_code)
-                        h_range = range(4, cut)
-                    elif slot == 'evening':
-                        cut = get_cutoff_hour(t_code)
-                        h_range = list(range(cut, 24)) + list(range(0,4))
-                    elif slot == 'night':
-                        h_range = list(range(22, 24)) + list(range(0,8))
-
-                    max_conc = 0
-                    stats_z = group_hourly_stats.get(d_type, {}).get(z_name, {})
-                    for h in h_range:
-                        max_conc = max(max_conc, stats_z.get(h, {}).get('max', 0))
-
-                    peak_pct = int(max_conc / z_cap * 100) if z_cap > 0 else 0
-
-                    tot_rev_cell = cash + bonus
-                    bon_pct = int(bonus / tot_rev_cell * 100) if tot_rev_cell > 0 else 0
-
-                    # Smart Market Match
-                    mkt_entry = get_fair_price(market_entries, d_type, slot)
-
-                    rec_action, rec_price, rec_reason = get_recommendation(peak_pct, price, bon_pct, mkt_entry)
-
-                    badge = ""
-                    if rec_action == 'UP': badge = f"<div class='rec-up'>▲ {rec_price}</div>"
-                    elif rec_action == 'PROMO': badge = f"<div class='rec-promo'>▼ {rec_price}</div>"
-                    elif rec_action == 'BONUS_UP': badge = f"<div class='rec-bonus'>★ BONUS</div>"
-                    elif rec_action == 'WARN': badge = f"<div class='rec-warn'>⚠ РЫНОК</div>"
-
-                    lbl_html = f"<div style='font-size:9px; color:#555;'>{label}</div>" if label else ""
-
-                    mkt_html = ""
-                    if mkt_entry:
-                        mkt_html = f"<div class='mkt-info'>Fair: {mkt_entry['fair']}</div>"
-
-                    return f"""
+        """.format
+ZONE_DAY = "<tr><td style='font-weight:bold; color:#ddd;'>{}</td>".format
+PRICE_CELL = """
                     <div style='text-align:center;'>
-                        {lbl_html}
+                        {label}
                         {badge}
                         <span class='price-tag'>{price}</span>
-                        <span class='stats'>Pk:{peak_pct}% <span style='color:#ff6384'>B:{bon_pct}%</span></span>
-                        {mkt_html}
+                        <span class='stats'>Pk:{peak}% <span style='color:#ff6384'>B:{bonus}%</span></span>
+                        {market}
                     </div>
-                    """
-
-                if is_autosim:
-                    html += f"<td>{render_cell('all_day')}</td>"
-                else:
-                    if t_code == 'NIGHT':
-                        html += f"<td>{render_cell('night')}</td>"
-                    else:
-                        html += "<td><div class='split-row' style='display:flex; gap:10px; justify-content:center;'>"
-                        html += f"<div style='flex:1; border-right:1px solid #333;'>{render_cell('day', 'День')}</div>"
-                        html += f"<div style='flex:1;'>{render_cell('evening', 'Вечер')}</div>"
-                        html += "</div></td>"
-
-            html += "</tr>"
-        html += "</tbody></table></div>"
-
-    html += """
+                    """.format
+EMPTY_CELL = "<span class='empty'>-</span>"
+SPLIT_OPEN = "<td><div class='split-row' style='display:flex; gap:10px; justify-content:center;'>"
+SPLIT_DAY = "<div style='flex:1; border-right:1px solid #333;'>{}</div>".format
+SPLIT_EVENING = "<div style='flex:1;'>{}</div>".format
+SPLIT_CLOSE = "</div></td>"
+
+FLYER_SCRIPT_OPEN = """
         <script>
             const ctx = document.getElementById('mainChart').getContext('2d');
             new Chart(ctx, {
@@ -627,7 +908,8 @@ def generate_flyer_with_stats(price_grid, sales_stats, zone_capacities, group_ho
                 data: {
                     labels: ['Рубли', 'Бонусы'],
                     datasets: [{
-                        data: [""" + str(total_rev_c) + "," + str(total_rev_b) + """],
+                        data: ["""
+FLYER_SCRIPT_CLOSE = """],
                         backgroundColor: ['#36a2eb', '#ff6384'],
                         borderWidth: 0
                     }]
@@ -643,11 +925,249 @@ def generate_flyer_with_stats(price_grid, sales_stats, zone_capacities, group_ho
     </body></html>
     """
 
-    with open("FLYER_WITH_STATS.html", "w", encoding="utf-8") as f:
-        f.write(html)
+BADGES = {
+    'UP': "<div class='rec-up'>▲ {}</div>".format,
+    'PROMO': "<div class='rec-promo'>▼ {}</div>".format,
+    'BONUS_UP': lambda _: "<div class='rec-bonus'>★ BONUS</div>",
+    'WARN': lambda _: "<div class='rec-warn'>⚠ РЫНОК</div>",
+}
+
+# Compact mode: heat intensity in steps of 1/HEAT_STEPS, one CSS class per (color band, step)
+HEAT_STEPS = 20
+HEAT_BANDS = [('r', 0.9, 1.0, '255, 0, 0'), ('o', 0.7, 0.9, '255, 77, 77'), ('y', 0.4, 0.7, '255, 234, 0'), ('g', 0, 0.4, '0, 230, 118')]
+
+def heat_class(intensity):
+    """CSS class of a heatmap cell; same color bands as heat_color."""
+    step = max(1, round(intensity * HEAT_STEPS))
+    if intensity >= 0.9: return f"r{step}"
+    if intensity > 0.7: return f"o{step}"
+    if intensity > 0.4: return f"y{step}"
+    if intensity > 0: return f"g{step}"
+    return "h0"
+
+def _heat_css():
+    rules = [".hm td.h0 { background: #222; }"]
+    for band, low, high, rgb in HEAT_BANDS:
+        for step in range(max(1, round(low * HEAT_STEPS)), round(high * HEAT_STEPS) + 1):
+            rules.append(f".hm td.{band}{step} {{ background: rgba({rgb}, {step / HEAT_STEPS}); }}")
+    return "".join(f"            {r}\n" for r in rules)
+
+COMPACT_CSS = """            .hm { font-size: 10px; width: 100%; }
+            .hm td { color: white; text-align: center; padding: 4px; }
+            .hm td.hh { color: #888; padding: 10px; }
+            .hm td.hz { color: inherit; text-align: right; padding: 10px; font-weight: bold; }
+            .hm-box { margin-bottom: 30px; }
+            .c { text-align: center; }
+            .lbl { font-size: 9px; color: #555; }
+            .split { display: flex; gap: 10px; justify-content: center; }
+            .split > div { flex: 1; }
+            .split > div:first-child { border-right: 1px solid #333; }
+""" + _heat_css()
+
+HEATMAP_OPEN_COMPACT = "<div class='hm-box'><h4>{} - Пиковая Загрузка</h4><table class='hm'>".format
+HEATMAP_HOURS_COMPACT = "<tr><td class='hh' style='width:100px;'></td>" + "".join([f"<td class='hh'>{h:02d}</td>" for h in range(24)]) + "</tr>"
+HEATMAP_ROW_COMPACT = "<tr><td class='hz'>{}</td>".format
+HEATMAP_CELL_COMPACT = "<td class='{}'>{}</td>".format
+PRICE_CELL_COMPACT = "<div class='c'></div>"
+SPLIT_COMPACT = "<td><div class='split'><div>{}</div><div>{}</div></div></td>".format
+
+# Fills every .c placeholder from FLYER_CELLS: [price, peak %, bonus %, fair or null, action, new price, label]
+FLYER_CELLS_SCRIPT = """
+        <script>
+            const FLYER_CELLS = {cells};
+            const BADGE = {{
+                UP: p => `<div class='rec-up'>▲ ${{p}}</div>`,
+                PROMO: p => `<div class='rec-promo'>▼ ${{p}}</div>`,
+                BONUS_UP: p => `<div class='rec-bonus'>★ BONUS</div>`,
+                WARN: p => `<div class='rec-warn'>⚠ РЫНОК</div>`,
+            }};
+            document.querySelectorAll('.c').forEach((el, i) => {{
+                const [price, peak, bonus, fair, action, newPrice, label] = FLYER_CELLS[i];
+                el.innerHTML = (label ? `<div class='lbl'>${{label}}</div>` : '')
+                    + (BADGE[action] ? BADGE[action](newPrice) : '')
+                    + `<span class='price-tag'>${{price}}</span>`
+                    + `<span class='stats'>Pk:${{peak}}% <span style='color:#ff6384'>B:${{bonus}}%</span></span>`
+                    + (fair !== null ? `<div class='mkt-info'>Fair: ${{fair}}</div>` : '');
+            }});
+        </script>""".format
+
+def heat_color(intensity):
+    if intensity >= 0.9: return f"rgba(255, 0, 0, {intensity})"
+    if intensity > 0.7: return f"rgba(255, 77, 77, {intensity})"
+    if intensity > 0.4: return f"rgba(255, 234, 0, {intensity})"
+    if intensity > 0: return f"rgba(0, 230, 118, {intensity})"
+    return "#222"
+
+def write_heatmap(out, price_grid, group_hourly_stats, zone_capacities, compact=False):
+    for d_type in ['будни', 'выходные']:
+        out.write((HEATMAP_OPEN_COMPACT if compact else HEATMAP_OPEN)(d_type.upper()))
+        out.write(HEATMAP_HOURS_COMPACT if compact else HEATMAP_HOURS)
+
+        for z_name in sorted(price_grid.keys()):
+            stats = group_hourly_stats.get(d_type, {}).get(z_name, {})
+            z_cap = zone_capacities.get(z_name, 1)
+
+            out.write((HEATMAP_ROW_COMPACT if compact else HEATMAP_ROW)(z_name))
+            for h in range(24):
+                val = stats.get(h, {}).get('max', 0)
+                intensity = min(val/z_cap, 1.0) if z_cap > 0 else 0
+                if compact:
+                    out.write(HEATMAP_CELL_COMPACT(heat_class(intensity), int(val)))
+                else:
+                    out.write(HEATMAP_CELL(heat_color(intensity), int(val)))
+            out.write("</tr>")
+        out.write("</table></div>")
+
+def write_worst_pcs(out, pc_revenue, n=15):
+    worst_pcs = sorted(pc_revenue.items(), key=lambda x: (x[1]['cash'] + x[1]['bonus']))[:n]
+    out.write(WORST_PC_OPEN)
+    for pc, d in worst_pcs:
+        out.write(WORST_PC_ROW(pc, d['zone'], int(d['cash']), int(d['bonus'])))
+    out.write(WORST_PC_CLOSE)
+
+def slot_hours(t_code, slot):
+    if slot == 'day':
+        return range(4, get_cutoff_hour(t_code))
+    if slot == 'evening':
+        return list(range(get_cutoff_hour(t_code), 24)) + list(range(0,4))
+    if slot == 'night':
+        return list(range(22, 24)) + list(range(0,8))
+    return range(0,24)
+
+def price_cell_data(p_data, z_name, t_code, d_type, slot, sales_cube, zone_capacities, group_hourly_stats, market_data):
+    """[price, peak %, bonus %, fair price (text) or None, action, new price] of one price cell; None without a price."""
+    price = int(p_data.get(slot, 0))
+    if price == 0 and slot == 'all_day':
+        for k, v in p_data.items():
+            if v > 0: price = int(v); break
+
+    if price == 0: return None
+
+    bucket = sales_cube.cell(z_name, t_code, d_type, slot)
+    cash = bucket['cash']
+    bonus = bucket['bonus']
+    z_cap = zone_capacities.get(z_name, 1)
+
+    stats_z = group_hourly_stats.get(d_type, {}).get(z_name, {})
+    max_conc = max([stats_z.get(h, {}).get('max', 0) for h in slot_hours(t_code, slot)], default=0)
+    peak_pct = int(max_conc / z_cap * 100) if z_cap > 0 else 0
+
+    tot_rev_cell = cash + bonus
+    bon_pct = int(bonus / tot_rev_cell * 100) if tot_rev_cell > 0 else 0
+
+    # Smart Market Match
+    mkt_entry = market_data.fair(z_name, t_code, d_type, slot)
+
+    rec_action, rec_price, rec_reason = get_recommendation(peak_pct, price, bon_pct, mkt_entry)
+    return [price, peak_pct, bon_pct, str(mkt_entry['fair']) if mkt_entry else None, rec_action, rec_price]
+
+def render_price_cell(data, label=None):
+    if data is None: return EMPTY_CELL
+    price, peak_pct, bon_pct, fair, rec_action, rec_price = data
+    return PRICE_CELL(
+        label=f"<div style='font-size:9px; color:#555;'>{label}</div>" if label else "",
+        badge=BADGES[rec_action](rec_price) if rec_action in BADGES else "",
+        price=price, peak=peak_pct, bonus=bon_pct,
+        market=f"<div class='mkt-info'>Fair: {fair}</div>" if fair is not None else "",
+    )
+
+def compact_cell(data, label=None):
+    """FLYER_CELLS entry. Non-integer prices go as text so the browser prints them like Python does."""
+    price, peak_pct, bon_pct, fair, rec_action, rec_price = data
+    if rec_action not in ('UP', 'PROMO'): rec_price = None
+    elif not isinstance(rec_price, int): rec_price = str(rec_price)
+    return [price, peak_pct, bon_pct, fair, rec_action, rec_price, label]
+
+@instrument.staged()
+def generate_flyer_with_stats(price_grid, sales_stats, zone_capacities, group_hourly_stats, retention_rate, pc_revenue, market_data,
+                              range_index=None, date_range=None, out_path="FLYER_WITH_STATS.html",
+                              compact=FLYER_COMPACT, gzip_copy=FLYER_GZIP):
+    """
+    range_index/date_range: render a (start, end) window (inclusive dates, None = open end)
+    from a range_index.RangeIndex instead of the passed statistics.
+    compact: heatmap colors as CSS classes and price cells filled client-side from one JSON
+    array; gzip_copy: also write out_path + '.gz'.
+    """
+    print("🎨 Рисуем отчет...")
+
+    period_html = ""
+    if range_index is not None:
+        start, end = date_range or (None, None)
+        sales_stats, _, group_hourly_stats, _, retention_rate, pc_revenue = range_index.results(start, end)
+        if start or end:
+            period_html = FLYER_PERIOD(start or '…', end or '…')
+
+    if not isinstance(market_data, MarketData):
+        market_data = MarketData(market_data).build_index()
+
+    sales_cube = SalesCube.from_dict(sales_stats)
+    total_sales = sales_cube.total('count')
+    total_rev_c = sales_cube.total('cash')
+    total_rev_b = sales_cube.total('bonus')
+
+    total_rev = total_rev_c + total_rev_b
+    bonus_share = (total_rev_b / total_rev * 100) if total_rev else 0
+
+    col_order_std = [('1 ЧАС', '1_HOUR'), ('3 ЧАСА', '3_HOURS'), ('5 ЧАСОВ', '5_HOURS'), ('НОЧЬ', 'NIGHT')]
+    col_order_auto = [('1 ЧАС', '1_HOUR'), ('2 ЧАСА', '2_HOURS'), ('3 ЧАСА', '3_HOURS')]
+
+    cells = []  # compact mode: data of every price cell, in document order
+
+    with ReportWriter(out_path, gzip_copy=gzip_copy) as out:
+        out.write(FLYER_TOP(period=period_html, sales=int(total_sales), revenue=int(total_rev),
+                            bonus_share=int(bonus_share), retention=int(retention_rate),
+                            extra_css=COMPACT_CSS if compact else ""))
+        write_heatmap(out, price_grid, group_hourly_stats, zone_capacities, compact)
+        out.write(FLYER_AFTER_HEATMAP)
+        write_worst_pcs(out, pc_revenue)
+        out.write("\n            <br>\n    ")
+
+        for z_name in sorted(price_grid.keys()):
+            is_autosim = 'авто' in z_name.lower() or 'auto' in z_name.lower()
+            col_list = col_order_auto if is_autosim else col_order_std
+            out.write(ZONE_OPEN(z_name=z_name, headers="".join([f"<th>{lbl}</th>" for lbl, _ in col_list])))
+
+            active_days = set()
+            for t in price_grid[z_name].values():
+                active_days.update(t.keys())
+
+            for d_type in sorted(active_days, reverse=True):
+                out.write(ZONE_DAY(d_type.capitalize()))
+
+                for lbl, t_code in col_list:
+                    p_data = price_grid[z_name].get(t_code, {}).get(d_type, {})
+
+                    def cell(slot, label=None):
+                        data = price_cell_data(p_data, z_name, t_code, d_type, slot,
+                                               sales_cube, zone_capacities, group_hourly_stats, market_data)
+                        if not compact or data is None:
+                            return render_price_cell(data, label)
+                        cells.append(compact_cell(data, label))
+                        return PRICE_CELL_COMPACT
+
+                    if is_autosim:
+                        out.write(f"<td>{cell('all_day')}</td>")
+                    elif t_code == 'NIGHT':
+                        out.write(f"<td>{cell('night')}</td>")
+                    elif compact:
+                        out.write(SPLIT_COMPACT(cell('day', 'День'), cell('evening', 'Вечер')))
+                    else:
+                        out.writelines([SPLIT_OPEN, SPLIT_DAY(cell('day', 'День')),
+                                        SPLIT_EVENING(cell('evening', 'Вечер')), SPLIT_CLOSE])
+
+                out.write("</tr>")
+            out.write("</tbody></table></div>")
+
+        if compact:
+            payload = json.dumps(cells, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+            out.write(FLYER_CELLS_SCRIPT(cells=payload))
+        out.writelines([FLYER_SCRIPT_OPEN, str(total_rev_c), ",", str(total_rev_b), FLYER_SCRIPT_CLOSE])
+
     print("✅ Отчет готов.")
 
 if __name__ == "__main__":
+    # python anal.py [--memory] [--profile classify_sales]
+    instrument.cli_run('anal')
     pc_map, price_grid, zone_capacities = load_config(PRICE_FILE)
     market_data = load_competitors(COMPETITORS_FILE)
 
@@ -656,4 +1176,6 @@ if __name__ == "__main__":
         if stats:
             generate_flyer_with_stats(price_grid, stats, zone_capacities, group_stats, ret, pc_rev, market_data)
     else:
-        print("❌ Не удалось загрузить конфигурацию.")
\ No newline at end of file
+        print("❌ Не удалось загрузить конфигурацию.")
+
+    instrument.finish_run()
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ingest import CACHE_DIR
+
+# --- НАСТРОЙКИ ---
+API_TIMEOUT = (3.05, 10)     # (connect, read) секунды на одну попытку
+API_RETRIES = 3              # повторы при таймауте, обрыве, 429 и 5xx
+API_BACKOFF = 0.5            # пауза 0.5, 1, 2... с между повторами
+API_CACHE_TTL = 6 * 3600     # метаданные (зоны, привязки ПК) считаются свежими 6 часов
+API_CACHE_DIR = os.path.join(CACHE_DIR, 'api')
+API_WORKERS = 4
+
+def extract_items(raw):
+    """Langame list payloads come either as a bare list or wrapped in 'data' / 'items'."""
+    if isinstance(raw, list): return raw
+    if isinstance(raw, dict): return raw.get('data', raw.get('items', []))
+    return []
+
+class LangameClient:
+    """
+    Pooled HTTP client for one public_api base URL.
+    GET responses are cached on disk: within ttl no request is made at all, after it the
+    cached ETag / Last-Modified are sent and a 304 answer just renews the entry.
+    If the API is unreachable, a stale cached copy is used instead of failing the run.
+    """
+
+    def __init__(self, base_url, api_key, timeout=API_TIMEOUT, retries=API_RETRIES, backoff=API_BACKOFF,
+                 ttl=API_CACHE_TTL, cache_dir=API_CACHE_DIR, max_workers=API_WORKERS):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries, backoff_factor=backoff,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=('GET',),
+                      respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'X-API-KEY': api_key, 'accept': 'application/json'})
+
+    def close(self):
+        self.session.close()
+
+    # --- disk cache ---
+    def _cache_file(self, endpoint):
+        key = hashlib.sha256(f"{self.base_url}{endpoint}".encode('utf-8')).hexdigest()[:24]
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_cache(self, endpoint):
+        try:
+            with open(self._cache_file(endpoint), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, endpoint, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_file(endpoint)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    # --- requests ---
+    def get_json(self, endpoint, force=False):
+        """
+        Decoded JSON body of GET base_url + endpoint, or None if it could not be obtained.
+        force=True skips the freshness check (still revalidates conditionally).
+        """
+        cached = self._read_cache(endpoint)
+        if cached and not force and time.time() - cached['fetched_at'] < self.ttl:
+            return cached['body']
+
+        headers = {}
+        if cached:
+            if cached.get('etag'): headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'): headers['If-Modified-Since'] = cached['last_modified']
+
+        try:
+            r = self.session.get(f"{self.base_url}{endpoint}", headers=headers, timeout=self.timeout)
+            if r.status_code == 304 and cached:
+                cached['fetched_at'] = time.time()
+                self._write_cache(endpoint, cached)
+                return cached['body']
+            if r.status_code != 200:
+                print(f"⚠️ Error {r.status_code} on {endpoint}")
+                return cached['body'] if cached else None
+            body = r.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"⚠️ Exception on {endpoint}: {e}")
+            if cached: print(f"♻️ Используем сохраненную копию {endpoint}")
+            return cached['body'] if cached else None
+
+        self._write_cache(endpoint, {
+            'url': f"{self.base_url}{endpoint}",
+            'fetched_at': time.time(),
+            'etag': r.headers.get('ETag'),
+            'last_modified': r.headers.get('Last-Modified'),
+            'body': body,
+        })
+        return body
+
+    def get_page(self, endpoint, params=None):
+        """Uncached GET for paged data. Raises requests.RequestException if the page cannot be fetched."""
+        r = self.session.get(f"{self.base_url}{endpoint}", params=params, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def get_list(self, endpoint, force=False):
+        return extract_items(self.get_json(endpoint, force))
+
+    def get_lists(self, endpoints, force=False):
+        """Fetches independent list endpoints concurrently; returns {endpoint: items}."""
+        endpoints = list(endpoints)
+        if len(endpoints) <= 1:
+            return {e: self.get_list(e, force) for e in endpoints}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(endpoints))) as pool:
+            results = pool.map(lambda e: self.get_list(e, force), endpoints)
+            return dict(zip(endpoints, results))
+
+# One pooled client per (base URL, key) for the whole process
+_clients = {}
+
+def get_client(base_url, api_key, **kwargs):
+    key = (base_url, api_key)
+    if key not in _clients:
+        _clients[key] = LangameClient(base_url, api_key, **kwargs)
+    return _clients[key]
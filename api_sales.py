@@ -0,0 +1,188 @@
+import datetime
+import glob
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import instrument
+from api_client import extract_items, get_client
+from ingest import CACHE_DIR, CATEGORY_COLUMNS, DATE_COLUMNS, SALES_COLUMNS, normalize_sales_frame
+
+# --- НАСТРОЙКИ ---
+SALES_ENDPOINT = '/global/packets_sales/list'
+PAGE_SIZE = 500        # записей на страницу (per_page)
+PAGE_WORKERS = 4       # одновременных запросов страниц
+# Запрашивать с запасом от курсора: сессии, которые еще шли при прошлой загрузке,
+# придут повторно уже со временем завершения (дубли по id отбрасываются при чтении)
+LOOKBACK = datetime.timedelta(days=1)
+COMPACT_PARTS = 30     # больше файлов-частей -> слить их в один
+
+# API record field -> column of the 'Покупка пакетов.xlsx' export.
+# Сверьте с ответом public_api своего клуба, если поля называются иначе.
+RECORD_ID = 'id'
+FIELD_MAP = {
+    'pc_number': 'ПК',
+    'packet_name': 'Название тарифа',
+    'date_buy': 'Дата покупки тарифа',
+    'date_start': 'Дата активации сессии',
+    'date_end': 'Дата завершения сессии',
+    'sum_rub': 'Списано рублей',
+    'sum_bonus': 'Списано бонусов',
+    'phone': 'Номер телефона гостя',
+}
+CURSOR_COLUMN = 'Дата покупки тарифа'
+
+# Store layout: .cache/api_sales_<key>/part-00001.parquet ... + state.json with the cursor.
+# Every sync window becomes one new part file; once there are more than COMPACT_PARTS
+# of them they are merged into one deduplicated part (compact_parts).
+
+def store_dir(base_url, cache_dir=CACHE_DIR):
+    key = hashlib.sha256(base_url.rstrip('/').encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f"api_sales_{key}")
+
+def load_state(path):
+    try:
+        with open(os.path.join(path, 'state.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_state(path, state):
+    file = os.path.join(path, 'state.json')
+    tmp = f"{file}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, file)
+
+def records_frame(records):
+    """API purchase records -> normalized sales frame (export columns) plus the record id."""
+    raw = pd.DataFrame.from_records(records)
+    df = pd.DataFrame({col: raw[key] if key in raw.columns else None for key, col in FIELD_MAP.items()},
+                      index=raw.index)
+    for c in DATE_COLUMNS:
+        # ISO timestamps from the API; normalize_sales_frame would read them day-first
+        s = pd.to_datetime(df[c], errors='coerce', format='ISO8601')
+        df[c] = s.dt.tz_localize(None) if s.dt.tz is not None else s
+    ids = raw[RECORD_ID].astype(str) if RECORD_ID in raw.columns else pd.Series(None, index=raw.index, dtype=object)
+
+    df = normalize_sales_frame(df)
+    # Parts are written with plain strings: categories with different dictionaries do not concat
+    for c in CATEGORY_COLUMNS:
+        df[c] = df[c].astype(object)
+    df.insert(0, RECORD_ID, ids)
+    return df
+
+def _parts(path):
+    return sorted(glob.glob(os.path.join(path, 'part-*.parquet')))
+
+def _write_part(path, df):
+    # Numbered after the last part, so read order stays write order even after a compaction
+    parts = _parts(path)
+    n = int(os.path.basename(parts[-1])[5:10]) + 1 if parts else 1
+    file = os.path.join(path, f"part-{n:05d}.parquet")
+    tmp = f"{file}.{os.getpid()}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, file)
+
+def _fetch_page(client, endpoint, params, page, page_size):
+    """(items, total pages or None) of one page."""
+    raw = client.get_page(endpoint, {**params, 'page': page, 'per_page': page_size})
+    total = None
+    if isinstance(raw, dict):
+        total = raw.get('pages', raw.get('last_page'))
+    return extract_items(raw), total
+
+@instrument.staged(rows_out=lambda r: r['fetched'])
+def sync_sales(base_url, api_key, endpoint=SALES_ENDPOINT, page_size=PAGE_SIZE, workers=PAGE_WORKERS,
+               cache_dir=CACHE_DIR, client=None):
+    """
+    Pulls new purchases from public_api into the local store.
+    Pages after the stored cursor (date of the last stored purchase) are requested
+    `workers` at a time; each window is written as a part file and the cursor advances,
+    so an interrupted sync resumes from the last finished window. Records are expected
+    in ascending purchase order; the overlap at the cursor is removed by record id on read.
+    Returns {'fetched', 'pages', 'cursor'}.
+    """
+    client = client or get_client(base_url, api_key)
+    path = store_dir(base_url, cache_dir)
+    os.makedirs(path, exist_ok=True)
+    state = load_state(path)
+    params = {}
+    if state.get('cursor'):
+        params['date_from'] = (datetime.datetime.fromisoformat(state['cursor']) - LOOKBACK).isoformat()
+    print(f"🌐 Загрузка продаж из API{' с ' + params['date_from'] if params else ''}...")
+
+    fetched, page, total, requested = 0, 1, None, 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while total is None or page <= total:
+            window = range(page, page + workers if total is None else min(page + workers, total + 1))
+            results = list(pool.map(lambda p: _fetch_page(client, endpoint, params, p, page_size), window))
+            requested += len(window)
+            items = [r for rs, _ in results for r in rs]
+            total = next((t for _, t in results if t), total)
+
+            if items:
+                df = records_frame(items)
+                _write_part(path, df)
+                fetched += len(df)
+                last = df[CURSOR_COLUMN].max()
+                if pd.notna(last) and (not state.get('cursor') or last.isoformat() > state['cursor']):
+                    state['cursor'] = last.isoformat()
+                state['updated'] = datetime.datetime.now().isoformat(timespec='seconds')
+                _save_state(path, state)
+
+            # No page count in the answer: a short page is the last one
+            if total is None and any(len(rs) < page_size for rs, _ in results):
+                break
+            page += len(window)
+
+    instrument.count('api_sales_pages', requested)
+    if len(_parts(path)) > COMPACT_PARTS:
+        compact_parts(path)
+    print(f"✅ Получено записей: {fetched}")
+    return {'fetched': fetched, 'pages': total, 'cursor': state.get('cursor')}
+
+def _read_parts(parts):
+    """All parts in write order; duplicates from overlapping windows are dropped by record id, the latest copy wins."""
+    df = pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+    has_id = df[RECORD_ID].notna()
+    return pd.concat([df[has_id].drop_duplicates(RECORD_ID, keep='last'), df[~has_id]]).sort_index()
+
+def compact_parts(path):
+    """
+    Merges all parts into the first one. The merged file replaces it before the others
+    are removed, so an interrupted compaction only leaves duplicates that reads drop.
+    """
+    parts = _parts(path)
+    if len(parts) < 2: return
+    df = _read_parts(parts)
+    tmp = f"{parts[0]}.{os.getpid()}.tmp"
+    df.reset_index(drop=True).to_parquet(tmp, index=False)
+    os.replace(tmp, parts[0])
+    for p in parts[1:]:
+        os.remove(p)
+    print(f"🗜️ Части продаж объединены: {len(parts)} -> 1 ({len(df)} записей)")
+
+def read_api_sales(base_url, columns=None, cache_dir=CACHE_DIR):
+    """The synced purchases as a read_sales-compatible frame (same columns and dtypes)."""
+    columns = columns or SALES_COLUMNS
+    parts = _parts(store_dir(base_url, cache_dir))
+    if not parts:
+        return normalize_sales_frame(pd.DataFrame(columns=columns))
+
+    df = _read_parts(parts)
+    for c in CATEGORY_COLUMNS:
+        df[c] = df[c].astype('category')
+    return df[[c for c in columns if c in df.columns]].reset_index(drop=True)
+
+if __name__ == "__main__":
+    # python api_sales.py [BASE_URL]
+    import time_anal
+    url = sys.argv[1] if len(sys.argv) > 1 else time_anal.BASE_URL
+    instrument.cli_run('api_sales')
+    sync_sales(url, time_anal.API_KEY)
+    instrument.finish_run()
@@ -0,0 +1,149 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import anal
+import time_anal
+from create_mock_sales import write_workload
+
+# --- НАСТРОЙКИ ---
+BENCH_DIR = '.bench'
+RESULTS_FILE = os.path.join(BENCH_DIR, 'results.jsonl')
+
+# Workload presets: PCs, zones, days, sessions per day (rows ~ days * sessions per day)
+SIZES = {
+    '10k': dict(n_pcs=40, n_zones=4, n_days=100, sessions_per_day=100),
+    '100k': dict(n_pcs=80, n_zones=5, n_days=365, sessions_per_day=275),
+    '1m': dict(n_pcs=200, n_zones=6, n_days=730, sessions_per_day=1370),
+    '10m': dict(n_pcs=1000, n_zones=9, n_days=1095, sessions_per_day=9130),
+}
+
+def code_version():
+    """Commit of the code being measured (plus '-dirty' for uncommitted changes)."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def measure(stages, name, func, *args, memory=True, **kwargs):
+    """Runs func, appends {'stage', 'seconds', 'cpu_seconds', 'peak_mb'} to stages, returns its result."""
+    if memory: tracemalloc.start()
+    t0, c0 = time.perf_counter(), time.process_time()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        seconds, cpu = time.perf_counter() - t0, time.process_time() - c0
+        peak = tracemalloc.get_traced_memory()[1] / 2**20 if memory else None
+        if memory: tracemalloc.stop()
+    stages.append({'stage': name, 'seconds': round(seconds, 4), 'cpu_seconds': round(cpu, 4),
+                   'peak_mb': round(peak, 1) if peak is not None else None})
+    print(f"⏱️ {name:<32}{seconds:>9.3f} с" + (f"{peak:>10.1f} МБ" if peak is not None else ""))
+    return result
+
+def workload_dir(size, seed=0):
+    return os.path.join(BENCH_DIR, 'workloads', f'{size}_seed{seed}')
+
+def ensure_workload(size, seed=0):
+    """Generates the synthetic export once per size/seed; returns (directory, sales file name)."""
+    out = workload_dir(size, seed)
+    for name in ('Покупка пакетов.xlsx', 'Покупка пакетов.parquet'):
+        if os.path.exists(os.path.join(out, name)):
+            return out, name
+    print(f"🏭 Генерация нагрузки {size}...")
+    return out, os.path.basename(write_workload(out, seed=seed, **SIZES[size]))
+
+def run_suite(size, seed=0, memory=True):
+    """
+    Times every pipeline stage on one workload. Runs inside the workload directory with an
+    empty cache, so cold (first parse) and warm (cached) timings are both recorded.
+    """
+    out, sales_file = ensure_workload(size, seed)
+    cwd = os.getcwd()
+    os.chdir(out)
+    shutil.rmtree(anal.CACHE_DIR, ignore_errors=True)
+    stages = []
+    try:
+        m = lambda name, func, *a, **kw: measure(stages, name, func, *a, memory=memory, **kw)
+
+        m('load_config (cold)', anal.load_config, 'price.xlsx')
+        pc_map, price_grid, zone_caps = m('load_config', anal.load_config, 'price.xlsx')
+        market_data = m('load_competitors', anal.load_competitors, 'competitors.xlsx')
+
+        m('analyze_excel (cold)', anal.analyze_excel, sales_file, pc_map, price_grid)
+        results = m('analyze_excel', anal.analyze_excel, sales_file, pc_map, price_grid)
+        stats, _, group_stats, _, retention, pc_revenue = results
+
+        time_stats = m('analyze_time_distribution', time_anal.analyze_time_distribution, sales_file, {}, {})
+        recs = m('generate_recommendations', time_anal.generate_recommendations, time_stats, price_grid)
+        m('generate_flyer_with_stats', anal.generate_flyer_with_stats,
+          price_grid, stats, zone_caps, group_stats, retention, pc_revenue, market_data)
+        m('generate_report', time_anal.generate_report, time_stats, recs)
+
+        rows = len(anal.read_sales(sales_file, columns=['ПК']))
+    finally:
+        os.chdir(cwd)
+
+    return {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'version': code_version(),
+        'size': size,
+        'seed': seed,
+        'rows': rows,
+        'memory_profiled': memory,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'stages': stages,
+    }
+
+def save_result(result, path=RESULTS_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+def load_results(path=RESULTS_FILE):
+    if not os.path.exists(path): return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(result, previous):
+    """Stage-by-stage comparison with an earlier run of the same workload."""
+    before = {s['stage']: s for s in previous['stages']}
+    print(f"\n📊 {result['size']}: {previous['version']} ({previous['time']}) -> {result['version']}")
+    for s in result['stages']:
+        old = before.get(s['stage'])
+        if not old: continue
+        ratio = s['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        mark = '🟢' if ratio < 0.9 else '🔴' if ratio > 1.1 else '⚪'
+        print(f"{mark} {s['stage']:<32}{old['seconds']:>9.3f} -> {s['seconds']:>9.3f} с  x{ratio:.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк anal.py / time_anal.py на синтетических выгрузках")
+    parser.add_argument('sizes', nargs='*', default=['10k'], choices=list(SIZES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="без tracemalloc (точнее по времени)")
+    args = parser.parse_args()
+
+    history = load_results()
+    for size in args.sizes:
+        result = run_suite(size, args.seed, memory=not args.no_memory)
+        save_result(result)
+        same = [r for r in history if r['size'] == size and r['seed'] == args.seed
+                and r['memory_profiled'] == result['memory_profiled']]
+        if same:
+            compare(result, same[-1])
+    print(f"✅ Результаты сохранены: {RESULTS_FILE}")
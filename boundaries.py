@@ -0,0 +1,136 @@
+import numpy as np
+
+# --- НАСТРОЙКИ ---
+# Насколько далеко (минут) от текущей границы искать новую
+MAX_SHIFT = 180
+# Оптимум ближе этого (минут) к краю окна поиска: граница упирается в окно, а не в реальный максимум
+EDGE_MINUTES = 15
+# Минимальный эффект переноса, о котором стоит сообщать: рублей за период выгрузки и чеков по другой цене
+MIN_GAIN = 100
+MIN_MOVED = 3
+# Эластичность спроса в самые тихие минуты зоны; в пиковые минуты гости цену не замечают.
+# Доля гостей, которые уйдут при росте цены на x%: ELASTICITY * (1 - загрузка) * x%
+ELASTICITY = 2.0
+# Окно сглаживания загрузки зоны (минут)
+LOAD_WINDOW = 60
+# Пакет, который гости покупают вместо ночи вне ночного окна
+NIGHT_ALTERNATIVE = '5_HOURS'
+
+MINUTES = 1440
+
+def zone_load(hists, window=LOAD_WINDOW):
+    """Purchase rate of a zone per minute (all tariffs), circular moving average, scaled to [0, 1]."""
+    total = np.sum(hists, axis=0).astype(float)
+    prefix = np.concatenate([[0.0], np.cumsum(np.concatenate([total[-window:], total]))])
+    smooth = (prefix[window:window + MINUTES] - prefix[:MINUTES]) / window
+    # centre the window on the minute instead of trailing it
+    smooth = np.roll(smooth, -(window // 2))
+    peak = smooth.max()
+    return smooth / peak if peak > 0 else smooth
+
+def switch_gain(counts, p_from, p_to, eps):
+    """
+    Revenue change per minute if the purchases of that minute paid p_to instead of p_from.
+    Demand reacts linearly: a price rise of x% loses eps * x% of the guests, a cut gains them.
+    """
+    factor = np.clip(1 - eps * (p_to / p_from - 1)[:, None], 0, None)
+    return counts * (p_to[:, None] * factor - p_from[:, None])
+
+def _prefix3(values):
+    """Prefix sums over three laps of the day, so any window within +-720 min of a cutoff is one slice."""
+    tiled = np.tile(values, 3)
+    return np.concatenate([np.zeros((len(values), 1)), np.cumsum(tiled, axis=1)], axis=1)
+
+def shift_order(max_shift):
+    """Shifts 0, -1, +1, -2, +2, ...: argmax over them picks the smallest shift among equal scores."""
+    steps = np.arange(1, max_shift + 1)
+    return np.concatenate([[0], np.column_stack([-steps, steps]).ravel()])
+
+def scan(cutoffs, earlier, later, max_shift=MAX_SHIFT):
+    """
+    Sum of per-minute values over the minutes that change side for every candidate cutoff.
+    cutoffs: (K,) current cutoffs in minutes; earlier/later: (K, 1440) values of a minute when the
+    cutoff moves before it ([c, c0) changes side) or past it ([c0, c) changes side).
+    Returns (shifts, totals) with totals of shape (K, len(shifts)).
+    """
+    if not 0 <= max_shift <= MINUTES // 2:
+        raise ValueError("max_shift must be within half a day")
+    shifts = shift_order(max_shift)
+    base = np.asarray(cutoffs, dtype=np.int64) % MINUTES + MINUTES
+    idx = base[:, None] + shifts[None, :]
+    rows = np.arange(len(base))[:, None]
+    pe, pl = _prefix3(earlier), _prefix3(later)
+    at_base = base[:, None]
+    totals = np.where(shifts < 0, pe[rows, at_base] - pe[rows, idx], pl[rows, idx] - pl[rows, at_base])
+    return shifts, totals
+
+def optimize(rows, max_shift=MAX_SHIFT):
+    """
+    Best cutoff of every row in one vectorized pass.
+    rows: dicts with 'cutoff' (minutes), 'eps' (1440,), and for both directions the purchases
+    per minute and the prices they switch between:
+      'earlier': (counts, p_from, p_to) for minutes that fall behind an earlier cutoff,
+      'later': (counts, p_from, p_to) for minutes a later cutoff takes in.
+    Returns the rows with 'best' (minutes), 'shift', 'gain' (rubles), 'moved' (purchases) and
+    'at_edge' (the optimum sits within EDGE_MINUTES of the search window: the real one lies beyond).
+    """
+    if not rows: return []
+    cutoffs = np.array([r['cutoff'] for r in rows])
+    eps = np.array([r['eps'] for r in rows])
+
+    gains, counts = {}, {}
+    for side in ('earlier', 'later'):
+        n = np.array([r[side][0] for r in rows], dtype=float)
+        p_from = np.array([r[side][1] for r in rows], dtype=float)
+        p_to = np.array([r[side][2] for r in rows], dtype=float)
+        gains[side], counts[side] = switch_gain(n, p_from, p_to, eps), n
+
+    shifts, gain = scan(cutoffs, gains['earlier'], gains['later'], max_shift)
+    _, moved = scan(cutoffs, counts['earlier'], counts['later'], max_shift)
+    best = gain.argmax(axis=1)
+
+    return [{**r, 'best': int((r['cutoff'] + shifts[b]) % MINUTES), 'shift': int(shifts[b]),
+             'gain': float(gain[i, b]), 'moved': int(round(moved[i, b])),
+             'at_edge': bool(abs(shifts[b]) > max_shift - EDGE_MINUTES)}
+            for i, (r, b) in enumerate(zip(rows, best))]
+
+def significant(r, min_gain=MIN_GAIN, min_moved=MIN_MOVED):
+    """An optimize() row worth reporting: the cutoff moves and both the gain and the moved checks clear the minimums."""
+    return r['shift'] != 0 and r['gain'] >= min_gain and r['moved'] >= min_moved
+
+def _price(prices, t_code, d_type, slot):
+    p = prices.get(t_code, {}).get(d_type, {}).get(slot, 0)
+    return p if p and p > 0 else None
+
+def boundary_rows(zone, d_type, hists, prices, rules, elasticity=ELASTICITY):
+    """
+    Scan rows of one zone and day type.
+    hists: {t_code: purchases per minute (1440,)}; prices: price_grid[zone] with slots
+    'day'/'evening'/'night'; rules: RULES of the zone type (morning_end / start / end in hours).
+    """
+    eps = elasticity * (1 - zone_load(list(hists.values())))
+    rows = []
+
+    for t_code, rule in rules.items():
+        hist = hists.get(t_code)
+        meta = {'zone': zone, 'd_type': d_type, 'tariff': t_code, 'eps': eps}
+
+        if 'morning_end' in rule and hist is not None and hist.sum() > 0:
+            day, evening = _price(prices, t_code, d_type, 'day'), _price(prices, t_code, d_type, 'evening')
+            if day and evening:
+                rows.append({**meta, 'boundary': 'morning_end', 'cutoff': int(rule['morning_end'] * 60),
+                             'earlier': (hist, day, evening), 'later': (hist, evening, day)})
+
+        if 'start' in rule:
+            alt = hists.get(NIGHT_ALTERNATIVE)
+            night = _price(prices, t_code, d_type, 'night')
+            alt_eve = _price(prices, NIGHT_ALTERNATIVE, d_type, 'evening')
+            alt_day = _price(prices, NIGHT_ALTERNATIVE, d_type, 'day')
+            if hist is None or alt is None or not night or hist.sum() == 0: continue
+            if alt_eve:
+                rows.append({**meta, 'boundary': 'night_start', 'cutoff': int(rule['start'] * 60),
+                             'earlier': (alt, alt_eve, night), 'later': (hist, night, alt_eve)})
+            if alt_day:
+                rows.append({**meta, 'boundary': 'night_end', 'cutoff': int(rule['end'] * 60),
+                             'earlier': (hist, night, alt_day), 'later': (alt, alt_day, night)})
+    return rows
@@ -0,0 +1,204 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Excel sheet limit (1 048 576 rows including the header)
+XLSX_MAX_ROWS = 1048575
+
+STANDARD_ZONES = ['ОБЩИЙ ЗАЛ', 'VIP', 'ДУО', 'BOOTCAMP', 'ТУРНИРНЫЙ', 'СТРИМ', 'ЛАУНЖ', 'PRO']
+AUTOSIM_ZONE = 'АВТОСИМУЛЯТОР'
+
+# Purchase-hour profile of the real export (share of purchases per hour of day)
+HOUR_PROFILE = np.array([
+    .052, .035, .022, .017, .011, .005, .005, .011, .011, .011, .017, .020,
+    .029, .033, .046, .047, .058, .072, .075, .082, .086, .095, .089, .071])
+
+# (tariff name, package type, hours, share) for regular PCs; names as in the real export.
+# Names the analysis does not map ('Day Boost 2 ч', 'Сутки') are kept on purpose.
+PC_TARIFFS = [
+    ('Базовый тариф', 'Базовый тариф', 1, 0.64),
+    ('3 часа', 'Пакет', 3, 0.14),
+    ('5 часов', 'Пакет', 5, 0.065),
+    ('Ночь (22:00-8:00)', 'Пакет', 10, 0.06),
+    ('Day Boost 2 ч', 'Пакет', 2, 0.015),
+    ('Ночь лайт 4 ч', 'Пакет', 4, 0.011),
+    ('Полуночник · 2,5 ч', 'Пакет', 2.5, 0.004),
+    ('Рассвет 3 ч', 'Пакет', 3, 0.002),
+    ('Сутки', 'Абонемент', 24, 0.001),
+]
+AUTOSIM_TARIFFS = [
+    ('Автосим 1 час', 'Пакет', 1, 0.57),
+    ('Автосим 2 часа', 'Пакет', 2, 0.32),
+    ('Автосим 3 часа', 'Пакет', 3, 0.11),
+]
+# price.xlsx rows: tariff -> [(time range, weekday price, weekend price)]
+PRICE_ROWS = {
+    'Базовый тариф': [('08:00-17:00', 150, 170), ('17:00-08:00', 170, 190)],
+    '3 часа': [('08:00-16:00', 410, 470), ('16:00-08:00', 470, 530)],
+    '5 часов': [('08:00-15:00', 620, 720), ('15:00-08:00', 710, 810)],
+    'Ночь (22:00-8:00)': [('22:00-08:00', 600, 700)],
+    'Автосим 1 час': [('00:00-23:59', 500, 550)],
+    'Автосим 2 часа': [('00:00-23:59', 900, 1000)],
+    'Автосим 3 часа': [('00:00-23:59', 1300, 1450)],
+}
+ZONE_PRICE_FACTOR = [1.0, 1.4, 1.2, 1.3, 1.5, 1.3, 1.2, 1.6]
+
+def zone_layout(n_pcs, n_zones):
+    """{zone: [pc names]}. The last zone is the autosim zone when there are at least three zones."""
+    n_std = n_zones - 1 if n_zones >= 3 else n_zones
+    n_sim = max(2, n_pcs // 10) if n_std < n_zones else 0
+    layout = {}
+    first = 1
+    for i, size in enumerate(np.array_split(np.arange(n_pcs - n_sim), n_std)):
+        name = STANDARD_ZONES[i] if i < len(STANDARD_ZONES) else f'ЗОНА {i + 1}'
+        layout[name] = [str(first + j) for j in range(len(size))]
+        first += len(size)
+    if n_sim:
+        layout[AUTOSIM_ZONE] = [f'AUTOSIM{j + 1}' for j in range(n_sim)]
+    return layout
+
+def generate_price(layout):
+    """price.xlsx frame matching the layout (same columns and row structure as the real file)."""
+    rows = []
+    for z_idx, (zone, pcs) in enumerate(layout.items()):
+        factor = ZONE_PRICE_FACTOR[z_idx % len(ZONE_PRICE_FACTOR)]
+        tariffs = AUTOSIM_TARIFFS if zone == AUTOSIM_ZONE else PC_TARIFFS
+        for name, _, _, _ in tariffs:
+            for d_type, col in (('будни', 1), ('выходные', 2)):
+                for row in PRICE_ROWS.get(name, []):
+                    rows.append({
+                        'Название': zone, 'номера ПК': ','.join(pcs), 'Тариф': name,
+                        'тип дня недели': d_type, 'Время цены': row[0],
+                        'Цена': int(round(row[col] * factor / 10) * 10),
+                    })
+    return pd.DataFrame(rows)
+
+def generate_competitors(price, n_competitors=5, seed=0):
+    """competitors.xlsx frame: one row per zone/tariff with n_competitors price columns (some missing)."""
+    rng = np.random.default_rng(seed)
+    base = price.groupby(['Название', 'Тариф'], sort=False)['Цена'].mean().reset_index()
+    df = pd.DataFrame({'Ваша Зона': base['Название'], 'Тариф': base['Тариф']})
+    for i in range(n_competitors):
+        prices = base['Цена'].to_numpy() * rng.uniform(0.8, 1.2, len(base))
+        df[f'Цена Конкурента {i + 1}'] = np.where(rng.random(len(base)) < 0.15, np.nan, np.round(prices, -1))
+    df['Ваш Коэффициент'] = 1.1
+    return df
+
+def _format_times(ns):
+    return pd.to_datetime(ns, unit='ns').strftime('%d.%m.%Y %H:%M')
+
+def generate_sales(layout, n_days, sessions_per_day, start='2025-01-01', seed=0, n_guests=None):
+    """
+    Synthetic 'Покупка пакетов.xlsx' frame. Purchases follow the real hourly profile with
+    busier weekends; night packages are bought in the evening; sessions often end early.
+    """
+    rng = np.random.default_rng(seed)
+    price = generate_price(layout)
+    price_of = price.groupby(['Название', 'Тариф', 'тип дня недели'])['Цена'].max()
+
+    # Sessions per day: weekends (Fri-Sun) are ~40% busier
+    days = pd.date_range(start, periods=n_days, freq='D')
+    weight = np.where(days.weekday >= 4, 1.4, 1.0)
+    per_day = rng.poisson(sessions_per_day * weight / weight.mean())
+    n = int(per_day.sum())
+    day_ns = np.repeat(days.to_numpy(dtype='datetime64[ns]').astype(np.int64), per_day)
+
+    # PCs: the autosim zone gets ~4% of the sessions, the rest spread with a few hot zones
+    zones = list(layout)
+    is_sim_zone = np.array([z == AUTOSIM_ZONE for z in zones])
+    z_weight = np.where(is_sim_zone, 0.04 * len(zones), 1.0) / np.arange(1, len(zones) + 1) ** 0.5
+    zone_ids = rng.choice(len(zones), size=n, p=z_weight / z_weight.sum())
+    pc_counts = np.array([len(layout[z]) for z in zones])
+    pc_idx = (rng.random(n) * pc_counts[zone_ids]).astype(np.int64)
+    pc_names = np.array([pc for z in zones for pc in layout[z]], dtype=object)
+    pcs = pc_names[np.concatenate([[0], np.cumsum(pc_counts)[:-1]])[zone_ids] + pc_idx]
+
+    # Tariffs: separate mixes for autosims and regular PCs
+    tariff = np.empty(n, dtype=object)
+    kind = np.empty(n, dtype=object)
+    hours = np.empty(n)
+    for table, mask in ((AUTOSIM_TARIFFS, is_sim_zone[zone_ids]), (PC_TARIFFS, ~is_sim_zone[zone_ids])):
+        share = np.array([t[3] for t in table])
+        pick = rng.choice(len(table), size=int(mask.sum()), p=share / share.sum())
+        tariff[mask] = np.array([t[0] for t in table], dtype=object)[pick]
+        kind[mask] = np.array([t[1] for t in table], dtype=object)[pick]
+        hours[mask] = np.array([t[2] for t in table])[pick]
+
+    # Purchase time: real hourly profile; night packages between 21:00 and 23:59
+    hour = rng.choice(24, size=n, p=HOUR_PROFILE / HOUR_PROFILE.sum())
+    night = np.isin(tariff, ['Ночь (22:00-8:00)', 'Ночь лайт 4 ч', 'Полуночник · 2,5 ч'])
+    hour[night] = rng.integers(21, 24, int(night.sum()))
+    minute = rng.integers(0, 60, n)
+    buy = day_ns + (hour * 60 + minute) * 60 * 10**9
+
+    # Session end: most guests play the whole package, a third leave early
+    played = np.where(rng.random(n) < 0.33, rng.uniform(0.1, 1.0, n), 1.0) * hours
+    end = buy + (played * 60).astype(np.int64) * 60 * 10**9
+    no_end = rng.random(n) < 0.001
+
+    # Money: package price of the zone/day type, ~24% of checks paid partly with bonuses
+    weekend = pd.DatetimeIndex(buy).weekday >= 5
+    d_type = np.where(weekend, 'выходные', 'будни')
+    zone_names = np.array(zones, dtype=object)[zone_ids]
+    keys = pd.MultiIndex.from_arrays([zone_names, tariff, d_type])
+    full = price_of.reindex(keys).to_numpy(dtype=float)
+    full = np.where(np.isnan(full), 200 * hours, full)
+    bonus = np.where(rng.random(n) < 0.24, np.round(full * rng.uniform(0.05, 0.5, n)), 0)
+    cash = full - bonus
+
+    # Guests: a small core of regulars makes most of the visits
+    n_guests = n_guests or max(50, n // 6)
+    guest = np.minimum(rng.zipf(1.6, n) - 1, n_guests - 1)
+    phones = (9000000000 + (guest * 7919 + 1234567) % 999999999).astype(np.int64)
+
+    end_str = _format_times(end).to_numpy(dtype=object)
+    end_str[no_end] = None
+    buy_str = _format_times(buy)
+    return pd.DataFrame({
+        'Название тарифа': tariff,
+        'Тип тарифа': kind,
+        'Дата покупки тарифа': buy_str,
+        'Дата активации сессии': buy_str,
+        'Дата завершения сессии': end_str,
+        'Номер телефона гостя': phones,
+        'Клуб': 'Мой центр',
+        'ПК': pcs,
+        'Списано рублей': cash.astype(np.int64),
+        'Списано бонусов': bonus.astype(np.int64),
+    })
+
+def write_workload(out_dir, n_pcs=40, n_zones=4, n_days=90, sessions_per_day=100, n_competitors=5, seed=0):
+    """
+    Writes price.xlsx, competitors.xlsx and the sales export into out_dir.
+    Exports above the Excel row limit are written as 'Покупка пакетов.parquet' instead.
+    Returns the path of the sales file.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    layout = zone_layout(n_pcs, n_zones)
+    price = generate_price(layout)
+    price.to_excel(os.path.join(out_dir, 'price.xlsx'), index=False)
+    generate_competitors(price, n_competitors, seed).to_excel(os.path.join(out_dir, 'competitors.xlsx'), index=False)
+
+    sales = generate_sales(layout, n_days, sessions_per_day, seed=seed)
+    if len(sales) > XLSX_MAX_ROWS:
+        path = os.path.join(out_dir, 'Покупка пакетов.parquet')
+        sales.to_parquet(path, index=False)
+    else:
+        path = os.path.join(out_dir, 'Покупка пакетов.xlsx')
+        sales.to_excel(path, index=False)
+    print(f"✅ {path}: {len(sales)} строк, {n_pcs} ПК, {len(layout)} зон, {n_days} дней")
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Синтетическая выгрузка продаж + price.xlsx")
+    parser.add_argument('--out', default='mock_data')
+    parser.add_argument('--pcs', type=int, default=40)
+    parser.add_argument('--zones', type=int, default=4)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--per-day', type=int, default=100)
+    parser.add_argument('--competitors', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_workload(args.out, args.pcs, args.zones, args.days, args.per_day, args.competitors, args.seed)
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import anal
+from ingest import CACHE_DIR, SALES_COLUMNS, read_sales
+from occupancy import align_cube, merge_cubes
+
+# --- НАСТРОЙКИ ---
+STATE_FILE = os.path.join(CACHE_DIR, 'anal_state.pkl')
+STATE_VERSION = 1
+
+def empty_state(config_key=None):
+    return {
+        'version': STATE_VERSION,
+        'config_key': config_key,
+        'hwm': None,                 # max 'Дата покупки тарифа' already processed
+        'hwm_rows': {},              # row hash -> count for rows exactly at hwm (same-minute purchases)
+        **anal.empty_rollups(),      # per-day sales, pc_revenue, phone_counts, occupancy cube
+        'peaks': (np.array([], dtype='datetime64[D]'), [], np.zeros((0, 0, 24), dtype=np.int64)),
+        'tail': None,                # zone, dt_start, dt_end of sessions still running after hwm
+    }
+
+def config_key(pc_map):
+    """Fingerprint of the PC -> zone mapping; a different mapping invalidates the state."""
+    return hashlib.sha256(json.dumps(pc_map, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path): return None
+    state = pd.read_pickle(path)
+    if state.get('version') != STATE_VERSION: return None
+    return state
+
+def save_state(state, path=STATE_FILE):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    pd.to_pickle(state, tmp)
+    os.replace(tmp, path)
+
+def _watermarks(df):
+    if 'dt_buy' in df.columns:
+        return df['dt_buy'].fillna(df['dt_start'])
+    return df['dt_start']
+
+def _row_hashes(df):
+    cols = [c for c in SALES_COLUMNS if c in df.columns]
+    return pd.util.hash_pandas_object(df[cols], index=False)
+
+def select_new_rows(df, state):
+    """Rows after the high-water mark, plus same-minute rows not seen at the mark yet."""
+    if state['hwm'] is None: return df
+
+    wm = _watermarks(df)
+    newer = df[wm > state['hwm']]
+
+    at_mark = df[wm == state['hwm']]
+    if len(at_mark) and state['hwm_rows']:
+        hashes = _row_hashes(at_mark)
+        seen = hashes.map(state['hwm_rows']).fillna(0)
+        at_mark = at_mark[hashes.groupby(hashes).cumcount() >= seen]
+
+    return pd.concat([at_mark, newer])
+
+def _advance_mark(state, df):
+    wm = _watermarks(df)
+    if wm.empty: return
+    hwm = wm.max()
+    hashes = _row_hashes(df[wm == hwm])
+    counts = hashes.value_counts().to_dict()
+    if hwm == state['hwm']:
+        for h, c in state['hwm_rows'].items():
+            counts[h] = counts.get(h, 0) + c
+    state['hwm'] = hwm
+    state['hwm_rows'] = {int(h): int(c) for h, c in counts.items()}
+
+def merge_sessions(state, sessions):
+    """Folds a batch of classified sessions (anal.classify_sales) into the aggregate state."""
+    anal.merge_rollups(state, sessions)
+
+    # Peaks are not additive: re-sweep the new sessions together with the old ones still
+    # running after the previous mark; everything before it is already final.
+    window = sessions[['zone', 'dt_start', 'dt_end']]
+    if state['tail'] is not None:
+        window = pd.concat([state['tail'], window], ignore_index=True)
+    dates, zones, _ = anal.build_occupancy_cube(window)
+    peaks = anal.build_peak_cube(window, dates, zones)
+    state['peaks'] = merge_cubes(state['peaks'], (dates, zones, peaks), op=np.maximum)
+
+    return window
+
+def update_state(state, df, pc_map):
+    """Ingests rows newer than the high-water mark. Returns the number of new rows."""
+    df = anal.parse_sales_dates(df)
+    new_rows = select_new_rows(df, state)
+    if new_rows.empty: return 0
+
+    sessions = anal.classify_sales(new_rows, pc_map)
+    window = merge_sessions(state, sessions)
+    _advance_mark(state, new_rows)
+
+    state['tail'] = window[window['dt_end'] > state['hwm']].reset_index(drop=True)
+    return len(new_rows)
+
+def state_results(state, peak_mode=anal.PEAK_MODE):
+    """Same tuple as anal.analyze_excel, rebuilt from the aggregate state."""
+    dates, zones, _ = state['occupancy']
+    peaks = align_cube(state['peaks'], dates, zones) if peak_mode == 'sweep' else None
+    return anal.rollup_results(state, peaks)
+
+def run_incremental(file_path, pc_map, rebuild=False, state_path=STATE_FILE):
+    """
+    Daily entry point: loads the state, merges only the new rows, saves it back.
+    rebuild=True (or a changed pc_map) starts from an empty state.
+    """
+    key = config_key(pc_map)
+    state = None if rebuild else load_state(state_path)
+    if state is not None and state['config_key'] != key:
+        print("⚠️ Конфигурация ПК изменилась, полный пересчет.")
+        state = None
+    if state is None:
+        state = empty_state(key)
+
+    print("📂 Инкрементальный анализ продаж...")
+    try:
+        df = read_sales(file_path)
+    except Exception as e:
+        print(f"❌ Ошибка чтения Excel: {e}")
+        return None
+
+    added = update_state(state, df, pc_map)
+    save_state(state, state_path)
+    print(f"➕ Новых строк: {added}. Обработано до {state['hwm']}.")
+    return state
+
+if __name__ == "__main__":
+    rebuild = '--rebuild' in sys.argv
+
+    pc_map, price_grid, zone_capacities = anal.load_config(anal.PRICE_FILE)
+    market_data = anal.load_competitors(anal.COMPETITORS_FILE)
+
+    if pc_map:
+        state = run_incremental(anal.FILE_NAME, pc_map, rebuild=rebuild)
+        if state and state['sales'] is not None:
+            stats, day_counts, group_stats, glob_max, ret, pc_rev = state_results(state)
+            anal.generate_flyer_with_stats(price_grid, stats, zone_capacities, group_stats, ret, pc_rev, market_data)
+    else:
+        print("❌ Не удалось загрузить конфигурацию.")
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+# --- НАСТРОЙКИ ---
+CACHE_DIR = '.cache'
+CACHE_VERSION = 3  # bump when normalize_sales_frame changes the stored layout
+
+# Columns the analyses actually use; everything else in the export is dropped at ingest
+SALES_COLUMNS = [
+    'ПК', 'Название тарифа',
+    'Дата покупки тарифа', 'Дата активации сессии', 'Дата завершения сессии',
+    'Списано рублей', 'Списано бонусов', 'Номер телефона гостя',
+]
+DATE_COLUMNS = ['Дата покупки тарифа', 'Дата активации сессии', 'Дата завершения сессии']
+TEXT_COLUMNS = ['ПК', 'Название тарифа', 'Номер телефона гостя']
+# Low-cardinality columns stored dictionary-encoded (a few dozen tariffs, a few hundred PCs)
+CATEGORY_COLUMNS = ['ПК', 'Название тарифа']
+
+# Rows per chunk for the streaming reader
+CHUNK_SIZE = 50000
+
+def file_sha256(file_path):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _manifest_path(cache_dir):
+    return os.path.join(cache_dir, 'manifest.json')
+
+def _load_manifest(cache_dir):
+    try:
+        with open(_manifest_path(cache_dir), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(cache_dir, manifest):
+    tmp = f"{_manifest_path(cache_dir)}.{os.getpid()}.tmp"  # clubs may share one cache across processes
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, _manifest_path(cache_dir))
+
+def source_key(file_path, cache_dir=CACHE_DIR):
+    """
+    Content hash of the source file. The hash is only recomputed when size/mtime
+    differ from what the manifest remembers for this path.
+    """
+    st = os.stat(file_path)
+    manifest = _load_manifest(cache_dir)
+    entry = manifest.get(os.path.abspath(file_path))
+    if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+        return entry['sha256']
+
+    sha = file_sha256(file_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest[os.path.abspath(file_path)] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': sha}
+    _save_manifest(cache_dir, manifest)
+    return sha
+
+def normalize_sales_frame(df):
+    """Keeps the used columns, parses dates once and gives object columns a stable string dtype."""
+    df = df[[c for c in SALES_COLUMNS if c in df.columns]].copy()
+
+    for c in DATE_COLUMNS:
+        if c in df.columns:
+            df[c] = pd.to_datetime(df[c], dayfirst=True, errors='coerce')
+
+    for c in df.columns:
+        if c in TEXT_COLUMNS or (c not in DATE_COLUMNS and not pd.api.types.is_numeric_dtype(df[c])):
+            df[c] = _as_text(df[c])
+
+    for c in CATEGORY_COLUMNS:
+        if c in df.columns:
+            df[c] = df[c].astype('category')
+
+    return df
+
+def _as_text(s):
+    """Strings with NaN kept; integral floats (int column with gaps) lose their '.0'."""
+    if pd.api.types.is_float_dtype(s) and (s.dropna() % 1 == 0).all():
+        s = s.astype('Int64')
+    return s.astype(str).mask(s.isna())
+
+def _value_codes(values):
+    """(codes, uniques) of a column; categoricals reuse their dictionary, NaN maps to the last unique."""
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        uniques = list(values.cat.categories) + [float('nan')]
+        return values.cat.codes.to_numpy(), uniques
+    return pd.factorize(values, use_na_sentinel=False)
+
+def decode_column(values, func):
+    """Applies func once per distinct value and broadcasts the result back by integer codes."""
+    codes, uniques = _value_codes(values)
+    decoded = np.empty(len(uniques), dtype=object)
+    decoded[:] = [func(u) for u in uniques]
+    return decoded[codes]
+
+def decode_pairs(values, func):
+    """decode_column for a func returning a pair; returns two object arrays."""
+    codes, uniques = _value_codes(values)
+    first = np.empty(len(uniques), dtype=object)
+    second = np.empty(len(uniques), dtype=object)
+    for i, u in enumerate(uniques):
+        first[i], second[i] = func(u)
+    return first[codes], second[codes]
+
+def read_source(file_path):
+    """Raw export: the xlsx from the CRM, or a Parquet file with the same columns (large synthetic exports)."""
+    if str(file_path).endswith('.parquet'):
+        return pd.read_parquet(file_path)
+    return pd.read_excel(file_path)
+
+def cache_path(file_path, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"sales_v{CACHE_VERSION}_{source_key(file_path, cache_dir)[:16]}.parquet")
+
+def build_cache(file_path, cache_dir=CACHE_DIR):
+    """Converts the Excel export into a typed Parquet file. Returns the cache path."""
+    path = cache_path(file_path, cache_dir)
+    df = normalize_sales_frame(read_source(file_path))
+    tmp = f"{path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+def read_sales(file_path, columns=None, cache_dir=CACHE_DIR):
+    """
+    Loads the sales export through the columnar cache.
+    The first run for a given file content parses the xlsx and writes Parquet;
+    later runs read only the requested columns with dates already typed.
+    """
+    columns = columns or SALES_COLUMNS
+    if not HAS_PARQUET:
+        print("⚠️ pyarrow не установлен, кэш отключен. Читаем Excel напрямую.")
+        df = normalize_sales_frame(read_source(file_path))
+        return df[[c for c in columns if c in df.columns]]
+
+    path = cache_path(file_path, cache_dir)
+    if not os.path.exists(path):
+        print(f"💾 Создание кэша {path}...")
+        build_cache(file_path, cache_dir)
+
+    available = pq.read_schema(path).names
+    return pd.read_parquet(path, columns=[c for c in columns if c in available])
+
+def iter_sales_chunks(file_path, chunk_size=CHUNK_SIZE, columns=None):
+    """
+    Streams the sales sheet through openpyxl's read-only iterator.
+    Yields normalized DataFrames of at most chunk_size rows, so memory depends on the
+    chunk size rather than on the length of the export.
+    """
+    from openpyxl import load_workbook
+
+    columns = columns or SALES_COLUMNS
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else '' for h in next(rows, ())]
+        picked = [(i, h) for i, h in enumerate(header) if h in columns]
+        names = [h for _, h in picked]
+
+        batch = []
+        for row in rows:
+            batch.append([row[i] if i < len(row) else None for i, _ in picked])
+            if len(batch) >= chunk_size:
+                yield normalize_sales_frame(pd.DataFrame(batch, columns=names))
+                batch = []
+        if batch:
+            yield normalize_sales_frame(pd.DataFrame(batch, columns=names))
+    finally:
+        wb.close()
@@ -0,0 +1,172 @@
+import cProfile
+import datetime
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# --- НАСТРОЙКИ ---
+LOG_DIR = 'logs'
+
+def max_rss_mb():
+    """Peak resident set size of the process so far (None where the platform does not report it)."""
+    if resource is None: return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 2**10
+
+class RunLog:
+    """
+    Stage records of one pipeline run: wall/CPU time, peak memory, rows in/out,
+    plus counters for dropped rows. Stages nest; each record names its parent.
+    """
+
+    def __init__(self, pipeline, memory=False, profile_stage=None, log_dir=LOG_DIR):
+        self.pipeline = pipeline
+        self.memory = memory
+        self.profile_stage = profile_stage
+        self.log_dir = log_dir
+        self.started = datetime.datetime.now()
+        self.stages = []
+        self.counters = {}
+        self._stack = []
+        self._t0, self._c0 = time.perf_counter(), time.process_time()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stamp(self):
+        return self.started.strftime('%Y%m%d_%H%M%S')
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        rec = {'stage': name, 'parent': self._stack[-1]['stage'] if self._stack else None,
+               'rows_in': rows_in, 'rows_out': None}
+        self.stages.append(rec)
+
+        if self.memory:
+            # tracemalloc has one global peak: fold it into the parent before resetting it
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack: self._stack[-1]['_peak'] = max(self._stack[-1].get('_peak', 0), peak)
+            tracemalloc.reset_peak()
+            rec['_base'] = current
+
+        profiler = None
+        if name == self.profile_stage:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        self._stack.append(rec)
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield rec
+        finally:
+            rec['seconds'] = round(time.perf_counter() - t0, 6)
+            rec['cpu_seconds'] = round(time.process_time() - c0, 6)
+            self._stack.pop()
+
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(self.log_dir, exist_ok=True)
+                rec['profile'] = os.path.join(self.log_dir, f"{self.pipeline}_{self._stamp()}_{name}.prof")
+                profiler.dump_stats(rec['profile'])
+
+            if self.memory:
+                peak = max(rec.pop('_peak', 0), tracemalloc.get_traced_memory()[1])
+                rec['peak_mb'] = round((peak - rec.pop('_base')) / 2**20, 3)
+                if self._stack: self._stack[-1]['_peak'] = max(self._stack[-1].get('_peak', 0), peak)
+            rss = max_rss_mb()
+            rec['max_rss_mb'] = round(rss, 1) if rss is not None else None
+
+    def count(self, key, n=1):
+        self.counters[key] = self.counters.get(key, 0) + int(n)
+
+    def to_dict(self):
+        rss = max_rss_mb()
+        return {
+            'pipeline': self.pipeline,
+            'started': self.started.isoformat(timespec='seconds'),
+            'argv': sys.argv,
+            'seconds': round(time.perf_counter() - self._t0, 6),
+            'cpu_seconds': round(time.process_time() - self._c0, 6),
+            'max_rss_mb': round(rss, 1) if rss is not None else None,
+            'memory_traced': self.memory,
+            'stages': self.stages,
+            'dropped': self.counters,
+        }
+
+    def save(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        path = os.path.join(self.log_dir, f"{self.pipeline}_{self._stamp()}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1, default=str)
+        return path
+
+# Run of the current process; stages and counters are no-ops while it is None
+_run = None
+
+def start_run(pipeline, memory=False, profile_stage=None, log_dir=LOG_DIR):
+    global _run
+    _run = RunLog(pipeline, memory, profile_stage, log_dir)
+    return _run
+
+def finish_run():
+    """Writes the JSON run log and ends the run. Returns the log path (None without a run)."""
+    global _run
+    if _run is None: return None
+    run, _run = _run, None
+    path = run.save()
+    if run.memory: tracemalloc.stop()
+    print(f"📝 Журнал запуска: {path}")
+    return path
+
+def current_run():
+    return _run
+
+@contextmanager
+def _no_stage():
+    yield {}
+
+def stage(name, rows_in=None):
+    """with stage('classify_sales', rows_in=len(df)) as st: ...; st['rows_out'] = len(out)"""
+    if _run is None: return _no_stage()
+    return _run.stage(name, rows_in)
+
+def staged(name=None, rows_in=None, rows_out=None):
+    """
+    Decorator form of stage(). rows_in(*args, **kwargs) and rows_out(result) are optional
+    callables that extract row counts.
+    """
+    def wrap(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            if _run is None: return func(*args, **kwargs)
+            with _run.stage(label, rows_in(*args, **kwargs) if rows_in else None) as rec:
+                result = func(*args, **kwargs)
+                if rows_out:
+                    try:
+                        rec['rows_out'] = rows_out(result)
+                    except (TypeError, KeyError, IndexError):
+                        pass
+                return result
+        return inner
+    return wrap
+
+def count(key, n=1):
+    """Adds n to a run counter (e.g. dropped_unmapped_pc)."""
+    if _run is not None:
+        _run.count(key, n)
+
+def cli_run(pipeline, argv=None):
+    """start_run from command-line flags: --memory (tracemalloc), --profile STAGE (cProfile dump)."""
+    argv = sys.argv if argv is None else argv
+    profile = argv[argv.index('--profile') + 1] if '--profile' in argv[:-1] else None
+    return start_run(pipeline, memory='--memory' in argv, profile_stage=profile)
@@ -0,0 +1,168 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import anal
+import time_anal
+from ingest import read_sales
+from pipeline import build_session_table
+from sales_cube import SalesCube
+
+# --- НАСТРОЙКИ ---
+MANIFEST_FILE = 'clubs.json'
+SUMMARY_FILE = 'NETWORK_SUMMARY.json'
+# Процессов в пуле (None = по числу ядер, но не больше числа клубов)
+MAX_WORKERS = None
+
+# clubs.json:
+# [
+#   {"club": "cyberx165", "sales": "club165/Покупка пакетов.xlsx", "price": "club165/price.xlsx",
+#    "competitors": "club165/competitors.xlsx", "base_url": "https://cyberx165.langame-pr.ru/public_api",
+#    "api_key": "..."},
+#   ...
+# ]
+# Paths are relative to the manifest; "competitors", "base_url" and "api_key" are optional
+# (without "api_key" the club uses LANGAME_API_KEY, see time_anal.API_KEY).
+
+def load_manifest(path=MANIFEST_FILE):
+    with open(path, encoding='utf-8') as f:
+        clubs = json.load(f)
+
+    root = os.path.dirname(os.path.abspath(path))
+    seen = set()
+    for club in clubs:
+        if club['club'] in seen:
+            raise ValueError(f"Клуб {club['club']} указан в манифесте дважды")
+        seen.add(club['club'])
+        for key in ('sales', 'price', 'competitors'):
+            if club.get(key):
+                club[key] = os.path.join(root, club[key])
+    return clubs
+
+def club_summary(results, phone_counts, n_sessions):
+    """Headline numbers of one analyze_excel tuple."""
+    sales_stats, _, _, global_max_stats, retention_rate, _ = results
+    cube = SalesCube.from_dict(sales_stats)
+    checks = cube.total('count')
+    cash, bonus = cube.total('cash'), cube.total('bonus')
+    revenue = cash + bonus
+    return {
+        'sessions': n_sessions,
+        'checks': int(checks),
+        'hours': cube.total('hours'),
+        'cash': cash,
+        'bonus': bonus,
+        'revenue': revenue,
+        'avg_check': revenue / checks if checks else 0,
+        'bonus_share': bonus / revenue * 100 if revenue else 0,
+        'retention': retention_rate,
+        'guests': len(phone_counts),
+        'tariffs': {t: {'checks': int(cube.sum('count', t_code=t)), 'revenue': cube.sum('cash', t_code=t) + cube.sum('bonus', t_code=t)}
+                    for t in anal.DURATION_MAP},
+        'peak_load': {z: max(hours.values()) for z, hours in global_max_stats.items()},
+    }
+
+def run_club(club):
+    """
+    Load + analyze stages of one club; runs inside a worker process.
+    Returns (club name, summary, phone_counts, seconds) or (club name, None, error, seconds).
+    """
+    t0 = time.perf_counter()
+    name = club['club']
+    try:
+        pc_map, _, _ = anal.load_config(club['price'])
+        if not pc_map:
+            raise ValueError(f"нет конфигурации ПК в {club['price']}")
+        api_zones, api_pc_map = (time_anal.fetch_metadata(club['base_url'], club.get('api_key'))
+                                 if club.get('base_url') else ({}, {}))
+
+        df = read_sales(club['sales'])
+        table = build_session_table(df, pc_map, api_zones, api_pc_map)
+        sessions = table[table['in_price']]
+        results = anal.analyze_sessions(sessions)
+        phone_counts = anal.count_phones(sessions)
+
+        summary = club_summary(results, phone_counts, len(sessions))
+        if club.get('competitors'):
+            market_data = anal.load_competitors(club['competitors'])
+            summary['market_entries'] = sum(len(e) for tariffs in market_data.values() for e in tariffs.values())
+        return name, summary, phone_counts, time.perf_counter() - t0
+    except Exception as e:
+        return name, None, f"{type(e).__name__}: {e}", time.perf_counter() - t0
+
+def network_summary(club_results):
+    """
+    Merges per-club results into network totals. Guests are matched by phone across clubs,
+    so a guest seen in two clubs counts as a repeat visitor of the network.
+    """
+    totals = {'checks': 0, 'hours': 0.0, 'cash': 0.0, 'bonus': 0.0, 'revenue': 0.0}
+    tariffs = {t: {'checks': 0, 'revenue': 0.0} for t in anal.DURATION_MAP}
+    phones, clubs_per_phone = {}, {}
+
+    for name, (summary, phone_counts) in club_results.items():
+        for k in totals: totals[k] += summary[k]
+        for t, v in summary['tariffs'].items():
+            tariffs[t]['checks'] += v['checks']
+            tariffs[t]['revenue'] += v['revenue']
+        for p, c in phone_counts.items():
+            phones[p] = phones.get(p, 0) + c
+            clubs_per_phone[p] = clubs_per_phone.get(p, 0) + 1
+
+    repeats = sum(1 for c in phones.values() if c > 1)
+    return {
+        **totals,
+        'clubs': len(club_results),
+        'avg_check': totals['revenue'] / totals['checks'] if totals['checks'] else 0,
+        'bonus_share': totals['bonus'] / totals['revenue'] * 100 if totals['revenue'] else 0,
+        'retention': repeats / len(phones) * 100 if phones else 0,
+        'guests': len(phones),
+        'cross_club_guests': sum(1 for c in clubs_per_phone.values() if c > 1),
+        'tariffs': tariffs,
+    }
+
+def run_network(clubs, max_workers=MAX_WORKERS):
+    """
+    Runs run_club for every club in a process pool.
+    Returns {'clubs': {name: summary}, 'network': {...}, 'errors': {name: message}}.
+    """
+    workers = max_workers or min(len(clubs), os.cpu_count() or 1)
+    print(f"🏢 Клубов: {len(clubs)}, процессов: {workers}")
+
+    club_results, errors = {}, {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_club, club) for club in clubs]
+        for future in as_completed(futures):
+            name, summary, payload, seconds = future.result()
+            if summary is None:
+                print(f"❌ {name}: {payload}")
+                errors[name] = payload
+            else:
+                print(f"✅ {name}: {summary['checks']} чеков, {int(summary['revenue']):,} ₽ ({seconds:.1f} с)")
+                club_results[name] = (summary, payload)
+
+    # Manifest order, independent of completion order
+    order = [c['club'] for c in clubs if c['club'] in club_results]
+    return {
+        'clubs': {name: club_results[name][0] for name in order},
+        'network': network_summary({name: club_results[name] for name in order}),
+        'errors': errors,
+    }
+
+def print_summary(report):
+    print(f"\n{'Клуб':<20}{'Чеки':>8}{'Выручка':>14}{'Ср. чек':>10}{'Бонусы':>8}{'Retention':>11}")
+    rows = list(report['clubs'].items()) + [('СЕТЬ', report['network'])]
+    for name, s in rows:
+        print(f"{name:<20}{s['checks']:>8}{int(s['revenue']):>14,}{int(s['avg_check']):>10}"
+              f"{int(s['bonus_share']):>7}%{int(s['retention']):>10}%")
+    print(f"Гостей в нескольких клубах: {report['network']['cross_club_guests']}")
+
+if __name__ == "__main__":
+    manifest = sys.argv[1] if len(sys.argv) > 1 else MANIFEST_FILE
+    report = run_network(load_manifest(manifest))
+    print_summary(report)
+
+    with open(SUMMARY_FILE, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"✅ Сводка сохранена: {SUMMARY_FILE}")
@@ -0,0 +1,246 @@
+import numpy as np
+
+MINUTE_NS = 60 * 10**9
+HOUR_NS = 60 * MINUTE_NS
+DAY_TYPES = ['будни', 'выходные']
+
+def _to_ns(values):
+    return np.asarray(values, dtype='datetime64[ns]').astype(np.int64)
+
+def occupancy_cube(starts, ends, zone_ids, n_zones):
+    """
+    Interval -> hour-bin kernel.
+    starts/ends: datetime64 arrays, zone_ids: int array in [0, n_zones).
+    Returns (dates, cube) where cube[date, zone, hour] holds occupied minutes.
+    """
+    s = _to_ns(starts)
+    e = _to_ns(ends)
+    zone_ids = np.asarray(zone_ids, dtype=np.int64)
+
+    # Hour bins touched by each session: floor(start) .. first bin starting at/after end
+    first_bin = s // HOUR_NS
+    n_bins = np.maximum(-(-(e - first_bin * HOUR_NS) // HOUR_NS), 0)
+
+    if n_bins.sum() == 0:
+        return np.array([], dtype='datetime64[D]'), np.zeros((0, n_zones, 24))
+
+    sess = np.repeat(np.arange(len(s)), n_bins)
+    offsets = np.arange(len(sess)) - np.repeat(np.cumsum(n_bins) - n_bins, n_bins)
+    bins = first_bin[sess] + offsets
+
+    overlap = np.minimum(e[sess], (bins + 1) * HOUR_NS) - np.maximum(s[sess], bins * HOUR_NS)
+    keep = overlap > 0
+    bins, sess, mins = bins[keep], sess[keep], overlap[keep] / MINUTE_NS
+    if len(bins) == 0:
+        return np.array([], dtype='datetime64[D]'), np.zeros((0, n_zones, 24))
+
+    days = bins // 24
+    day0 = days.min()
+    n_days = int(days.max() - day0 + 1)
+
+    flat = ((days - day0) * n_zones + zone_ids[sess]) * 24 + bins % 24
+    cube = np.bincount(flat, weights=mins, minlength=n_days * n_zones * 24).reshape(n_days, n_zones, 24)
+
+    dates = (day0 + np.arange(n_days)).astype('datetime64[D]')
+    return dates, cube
+
+def weekend_mask(dates):
+    """[date, hour] bool grid, True where get_day_type() would return 'выходные'."""
+    weekday = ((np.asarray(dates, dtype='datetime64[D]').astype(np.int64) + 3) % 7)[:, None]
+    hour = np.arange(24)[None, :]
+    return (weekday > 4) | ((weekday == 4) & (hour >= 17)) | ((weekday == 0) & (hour < 8))
+
+def occupancy_partials(dates, cube, peaks=None):
+    """
+    Array form of reduce_occupancy_cube over one block of days: per zone and hour the running
+    'max', 'sum' and 'count' of both day types ([d_type, zone, hour]), the global max ('glob')
+    and whether the zone had any day ('seen'). Blocks of days fold with combine_partials.
+    """
+    present = cube.sum(axis=2) > 0              # [date, zone]: the day has an entry for the zone
+    conc = cube / 60.0
+    peak = conc if peaks is None else peaks
+    weekend = weekend_mask(dates)                # [date, hour]
+
+    parts = {'glob': np.where(present[:, :, None], peak, 0).max(axis=0, initial=0), 'seen': present.any(axis=0)}
+    masks = [present[:, :, None] & mask[:, None, :] for mask in (~weekend, weekend)]
+    parts['max'] = np.stack([np.where(m, peak, 0).max(axis=0, initial=0) for m in masks])
+    parts['sum'] = np.stack([np.where(m, conc, 0).sum(axis=0) for m in masks])
+    parts['count'] = np.stack([m.sum(axis=0) for m in masks])
+    return parts
+
+def combine_partials(a, b):
+    """Folds two occupancy_partials of the same zones (None acts as empty)."""
+    if a is None: return b
+    if b is None: return a
+    return {
+        'glob': np.maximum(a['glob'], b['glob']), 'seen': a['seen'] | b['seen'],
+        'max': np.maximum(a['max'], b['max']), 'sum': a['sum'] + b['sum'], 'count': a['count'] + b['count'],
+    }
+
+def partials_to_stats(zones, parts):
+    """occupancy_partials -> (group_hourly_stats, global_max_stats) dicts."""
+    group_hourly_stats = {d_type: {} for d_type in DAY_TYPES}
+    global_max_stats = {}
+    if parts is None: return group_hourly_stats, global_max_stats
+
+    for z_idx, z in enumerate(zones):
+        if parts['seen'][z_idx]:
+            global_max_stats[z] = {h: float(parts['glob'][z_idx, h]) for h in range(24)}
+
+    for d_idx, d_type in enumerate(DAY_TYPES):
+        h_max, h_sum, h_cnt = parts['max'][d_idx], parts['sum'][d_idx], parts['count'][d_idx]
+        for z_idx, z in enumerate(zones):
+            if not h_cnt[z_idx].any(): continue
+            group_hourly_stats[d_type][z] = {
+                h: {'max': float(h_max[z_idx, h]), 'sum': float(h_sum[z_idx, h]), 'count': int(h_cnt[z_idx, h])}
+                for h in range(24)
+            }
+
+    return group_hourly_stats, global_max_stats
+
+def reduce_occupancy_cube(dates, zones, cube, peaks=None):
+    """
+    Cube equivalent of the daily_occupancy reduction.
+    Returns (group_hourly_stats, global_max_stats) in the same dict shape.
+    peaks: optional [date, zone, hour] true concurrency (see peak_concurrency); when given,
+    'max' and global_max_stats report it instead of occupied minutes / 60.
+    """
+    if len(dates) == 0: return partials_to_stats(zones, None)
+    return partials_to_stats(zones, occupancy_partials(dates, cube, peaks))
+
+def peak_concurrency(starts, ends, zone_ids, n_zones, dates):
+    """
+    Sweep-line over sorted start/end events per zone at minute resolution.
+    Returns peaks[date, zone, hour] = max number of simultaneously running sessions,
+    aligned with the given dates axis (e.g. the one returned by occupancy_cube).
+    """
+    n_days = len(dates)
+    peaks = np.zeros((n_days, n_zones, 24), dtype=np.int64)
+    if n_days == 0: return peaks
+
+    t0 = np.asarray(dates, dtype='datetime64[D]')[0].astype('datetime64[m]').astype(np.int64)
+    n_mins = n_days * 24 * 60
+    span = n_mins + 1
+
+    s = np.clip(_to_ns(starts) // MINUTE_NS - t0, 0, n_mins)
+    e = np.clip(_to_ns(ends) // MINUTE_NS - t0, 0, n_mins)
+    zone_ids = np.asarray(zone_ids, dtype=np.int64)
+    valid = e > s
+    s, e, zone_ids = s[valid], e[valid], zone_ids[valid]
+
+    # One global timeline: each zone gets its own [z * span, z * span + n_mins] window.
+    # Every zone's events net to zero, so a single cumsum yields per-zone concurrency.
+    times = np.concatenate([zone_ids * span + s, zone_ids * span + e])
+    deltas = np.concatenate([np.ones(len(s), dtype=np.int64), -np.ones(len(e), dtype=np.int64)])
+    order = np.lexsort((deltas, times))  # ends before starts at the same minute
+    times, level = times[order], np.cumsum(deltas[order])
+
+    # Level carried into each hour (state at its first minute) ...
+    bounds = (np.arange(n_zones)[:, None] * span + np.arange(n_days * 24)[None, :] * 60).ravel()
+    idx = np.searchsorted(times, bounds, side='right') - 1
+    carried = np.where(idx >= 0, level[np.maximum(idx, 0)], 0)
+
+    # ... and the max level reached by any event inside the hour
+    in_hour = np.zeros(n_zones * n_days * 24, dtype=np.int64)
+    ev_zone, ev_min = times // span, times % span
+    inside = ev_min < n_mins
+    np.maximum.at(in_hour, (ev_zone * (n_days * 24) + ev_min // 60)[inside], level[inside])
+
+    peaks_zdh = np.maximum(carried, in_hour).reshape(n_zones, n_days, 24)
+    return peaks_zdh.transpose(1, 0, 2).copy()
+
+def merge_cubes(a, b, op=np.add):
+    """
+    Merges two (dates, zones, cube) triples onto the union of their date and zone axes
+    (trailing axes, e.g. 24 hours or 1440 minutes, must match).
+    op=np.add for occupied minutes, np.maximum for peaks.
+    """
+    dates_a, zones_a, cube_a = a
+    dates_b, zones_b, cube_b = b
+    if len(dates_a) == 0: return np.asarray(dates_b, dtype='datetime64[D]'), list(zones_b), cube_b
+    if len(dates_b) == 0: return np.asarray(dates_a, dtype='datetime64[D]'), list(zones_a), cube_a
+
+    zones = list(zones_a) + [z for z in zones_b if z not in zones_a]
+    day0 = min(dates_a[0], dates_b[0])
+    n_days = int((max(dates_a[-1], dates_b[-1]) - day0).astype(np.int64)) + 1
+    dates = (day0 + np.arange(n_days)).astype('datetime64[D]')
+
+    out = np.zeros((n_days, len(zones)) + cube_a.shape[2:], dtype=np.result_type(cube_a, cube_b))
+    for d, zs, c in ((dates_a, zones_a, cube_a), (dates_b, zones_b, cube_b)):
+        d_off = int((d[0] - day0).astype(np.int64))
+        z_idx = [zones.index(z) for z in zs]
+        view = out[d_off:d_off + len(d)][:, z_idx]
+        out[d_off:d_off + len(d), z_idx] = op(view, c)
+    return dates, zones, out
+
+def sum_cubes(parts, tail=(1440,)):
+    """
+    merge_cubes(..., np.add) for a list of (dates, zones, cube) triples: the union of the
+    axes is allocated once and every part is added into it, instead of copying the history
+    on each merge. tail: trailing shape of the empty result.
+    """
+    parts = [p for p in parts if len(p[0])]
+    if not parts: return np.array([], dtype='datetime64[D]'), [], np.zeros((0, 0) + tail, dtype=np.int32)
+
+    zones = list(dict.fromkeys(z for _, zs, _ in parts for z in zs))
+    pos = {z: i for i, z in enumerate(zones)}
+    day0 = min(np.asarray(d, dtype='datetime64[D]')[0] for d, _, _ in parts)
+    day1 = max(np.asarray(d, dtype='datetime64[D]')[-1] for d, _, _ in parts)
+    n_days = int((day1 - day0).astype(np.int64)) + 1
+    dates = (day0 + np.arange(n_days)).astype('datetime64[D]')
+
+    out = np.zeros((n_days, len(zones)) + parts[0][2].shape[2:], dtype=np.result_type(*[c for _, _, c in parts]))
+    for d, zs, c in parts:
+        d_off = int((np.asarray(d, dtype='datetime64[D]')[0] - day0).astype(np.int64))
+        out[d_off:d_off + len(d), [pos[z] for z in zs]] += c
+    return dates, zones, out
+
+def align_cube(src, dates, zones):
+    """Reindexes a (dates, zones, cube) triple onto the given axes; cells outside them are dropped."""
+    src_dates, src_zones, src_cube = src
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    out = np.zeros((len(dates), len(zones)) + src_cube.shape[2:], dtype=src_cube.dtype)
+    if len(dates) == 0 or len(src_dates) == 0: return out
+
+    d_idx = (np.asarray(src_dates, dtype='datetime64[D]') - dates[0]).astype(np.int64)
+    d_ok = (d_idx >= 0) & (d_idx < len(dates))
+    for z_src, z in enumerate(src_zones):
+        if z in zones:
+            out[d_idx[d_ok], zones.index(z)] = src_cube[d_ok, z_src]
+    return out
+
+def minute_deltas(starts, ends, zone_ids, n_zones):
+    """
+    Additive form of the sweep-line: +1/-1 per session at its start/end minute in a
+    [date, zone, minute] difference array. Deltas of separate batches can simply be
+    merged with merge_cubes(..., np.add), so rows can arrive in any order.
+    Returns (dates, deltas).
+    """
+    s = _to_ns(starts) // MINUTE_NS
+    e = _to_ns(ends) // MINUTE_NS
+    zone_ids = np.asarray(zone_ids, dtype=np.int64)
+    valid = e > s
+    s, e, zone_ids = s[valid], e[valid], zone_ids[valid]
+    if len(s) == 0:
+        return np.array([], dtype='datetime64[D]'), np.zeros((0, n_zones, 1440), dtype=np.int32)
+
+    m0 = (s.min() // 1440) * 1440
+    n_days = int((e.max() - m0) // 1440) + 1
+    flat_s = ((s - m0) // 1440 * n_zones + zone_ids) * 1440 + (s - m0) % 1440
+    flat_e = ((e - m0) // 1440 * n_zones + zone_ids) * 1440 + (e - m0) % 1440
+    size = n_days * n_zones * 1440
+    deltas = np.bincount(flat_s, minlength=size) - np.bincount(flat_e, minlength=size)
+
+    dates = (np.datetime64(int(m0 // 1440), 'D') + np.arange(n_days)).astype('datetime64[D]')
+    return dates, deltas.reshape(n_days, n_zones, 1440).astype(np.int32)
+
+def levels_from_deltas(deltas):
+    """[date, zone, minute] deltas -> [date, zone, minute] number of sessions running in that minute."""
+    n_days, n_zones, _ = deltas.shape
+    level = np.cumsum(deltas.transpose(1, 0, 2).reshape(n_zones, -1), axis=1)
+    return level.reshape(n_zones, n_days, 1440).transpose(1, 0, 2)
+
+def peaks_from_deltas(deltas):
+    """[date, zone, minute] deltas -> peaks[date, zone, hour] (max concurrency per hour)."""
+    n_days, n_zones, _ = deltas.shape
+    return levels_from_deltas(deltas).reshape(n_days, n_zones, 24, 60).max(axis=3)
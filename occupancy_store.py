@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import instrument
+from ingest import CACHE_DIR
+from occupancy import (combine_partials, levels_from_deltas, minute_deltas, occupancy_cube, occupancy_partials,
+                       partials_to_stats, peak_concurrency)
+
+# --- НАСТРОЙКИ ---
+CUBE_DIR = os.path.join(CACHE_DIR, 'occupancy')
+CUBE_VERSION = 1
+CUBE_BINS = 24         # столбцов в сутках: 24 (по часам) или 1440 (по минутам); задается при создании куба
+CHUNK_DAYS = 31        # дней в одном блоке при записи и свертках (ограничивает память)
+# Свободные места в индексах зон и ПК: пока они есть, новая зона или ПК не требуют перезаписи файлов
+ZONE_SLOTS = 32
+PC_SLOTS = 256
+
+# One directory per club (cube_dir):
+#   meta.json   header: version, origin (date of day 0), days, bins, zone/PC index tables, slots
+#   zones.f32   occupied minutes per zone   [day, zone slot, bin]
+#   peaks.i16   peak concurrency per zone   [day, zone slot, bin]
+#   pcs.f32     occupied minutes per PC     [day, PC slot, bin]
+# Day is the leading axis: a new day is appended to the end of every file, a rewritten day
+# is overwritten in place, and any range of days is one contiguous memory-mapped slice.
+ARRAYS = {
+    'zones': ('zones.f32', np.float32, 'zone_slots'),
+    'peaks': ('peaks.i16', np.int16, 'zone_slots'),
+    'pcs': ('pcs.f32', np.float32, 'pc_slots'),
+}
+
+def cube_dir(club, root=CUBE_DIR):
+    return os.path.join(root, str(club))
+
+def read_meta(path):
+    try:
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == CUBE_VERSION else None
+
+def _save_meta(path, meta):
+    file = os.path.join(path, 'meta.json')
+    tmp = f"{file}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, file)
+
+def new_meta(bins=CUBE_BINS):
+    if bins not in (24, 1440):
+        raise ValueError("bins must be 24 or 1440")
+    return {'version': CUBE_VERSION, 'origin': None, 'days': 0, 'bins': bins,
+            'zones': [], 'pcs': [], 'pc_zone': {}, 'zone_slots': ZONE_SLOTS, 'pc_slots': PC_SLOTS}
+
+def _open(path, meta, kind, mode='r'):
+    """Memory map of one array over the stored days."""
+    file, dtype, slots = ARRAYS[kind]
+    shape = (meta['days'], meta[slots], meta['bins'])
+    if meta['days'] == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(os.path.join(path, file), dtype=dtype, mode=mode, shape=shape)
+
+def _resize(path, meta, slot_key, slots):
+    """Rewrites the arrays of one index with more slots, CHUNK_DAYS days at a time."""
+    for kind, (file, dtype, key) in ARRAYS.items():
+        if key != slot_key or meta['days'] == 0: continue
+        old = _open(path, meta, kind)
+        tmp = os.path.join(path, f"{file}.{os.getpid()}.tmp")
+        with open(tmp, 'wb') as f:
+            for i in range(0, meta['days'], CHUNK_DAYS):
+                block = np.zeros((min(CHUNK_DAYS, meta['days'] - i), slots, meta['bins']), dtype=dtype)
+                block[:, :meta[slot_key]] = old[i:i + CHUNK_DAYS]
+                f.write(block.tobytes())
+        del old
+        os.replace(tmp, os.path.join(path, file))
+    meta[slot_key] = slots
+
+def _register(path, meta, sessions):
+    """Adds new zones and PCs to the index tables, growing the slot count when it runs out."""
+    for name, slot_key in (('zones', 'zone_slots'), ('pcs', 'pc_slots')):
+        column = sessions['zone' if name == 'zones' else 'pc']
+        known = set(meta[name])
+        meta[name] += [v for v in pd.unique(column) if v not in known]
+        if len(meta[name]) > meta[slot_key]:
+            slots = meta[slot_key]
+            while slots < len(meta[name]): slots *= 2
+            print(f"♻️ Расширение индекса {name}: {meta[slot_key]} -> {slots}")
+            _resize(path, meta, slot_key, slots)
+            _save_meta(path, meta)
+    meta['pc_zone'].update(sessions.drop_duplicates('pc', keep='last').set_index('pc')['zone'].to_dict())
+
+def _on_days(src, dates):
+    """(src_dates, cube) kernel output restricted to the given days (zeros where it has none)."""
+    src_dates, cube = src
+    out = np.zeros((len(dates),) + cube.shape[1:], dtype=cube.dtype)
+    if len(src_dates) == 0: return out
+    d_idx = (np.asarray(src_dates, dtype='datetime64[D]') - dates[0]).astype(np.int64)
+    ok = (d_idx >= 0) & (d_idx < len(dates))
+    out[d_idx[ok]] = cube[ok]
+    return out
+
+def _minute_levels(starts, ends, ids, n, dates):
+    """Minute bins: sessions running in each minute (= occupied minutes of that minute)."""
+    src_dates, deltas = minute_deltas(starts, ends, ids, n)
+    return _on_days((src_dates, levels_from_deltas(deltas)), dates)
+
+def day_slabs(sessions, dates, meta):
+    """
+    Arrays of the given consecutive days, computed from every session overlapping them.
+    Returns {kind: [day, slot, bin]} for all ARRAYS.
+    """
+    starts, ends = sessions['dt_start'], sessions['dt_end']
+    z_ids = pd.Categorical(sessions['zone'], categories=meta['zones']).codes
+    p_ids = pd.Categorical(sessions['pc'], categories=meta['pcs']).codes
+    n_z, n_p = meta['zone_slots'], meta['pc_slots']
+
+    if meta['bins'] == 24:
+        slabs = {
+            'zones': _on_days(occupancy_cube(starts, ends, z_ids, n_z), dates),
+            'peaks': peak_concurrency(starts, ends, z_ids, n_z, dates),
+            'pcs': _on_days(occupancy_cube(starts, ends, p_ids, n_p), dates),
+        }
+    else:
+        zones = _minute_levels(starts, ends, z_ids, n_z, dates)
+        slabs = {'zones': zones, 'peaks': zones, 'pcs': _minute_levels(starts, ends, p_ids, n_p, dates)}
+    return {kind: slabs[kind].astype(ARRAYS[kind][1]) for kind in ARRAYS}
+
+def _write_days(path, meta, offset, slabs):
+    for kind, (file, dtype, _) in ARRAYS.items():
+        file = os.path.join(path, file)
+        day_bytes = meta[ARRAYS[kind][2]] * meta['bins'] * np.dtype(dtype).itemsize
+        with open(file, 'r+b' if os.path.exists(file) else 'w+b') as f:
+            # Seeking past the end leaves a zero-filled gap for days without data
+            f.seek(offset * day_bytes)
+            f.write(np.ascontiguousarray(slabs[kind]).tobytes())
+
+@instrument.staged(rows_in=lambda sessions, *a, **kw: len(sessions), rows_out=lambda r: r['days'])
+def append_sessions(sessions, path=CUBE_DIR, since=None, until=None, bins=CUBE_BINS, rebuild=False):
+    """
+    Writes the days [since, until] of the occupancy cube at path.
+    sessions: session table with pc, zone, dt_start, dt_end (e.g. the priced rows of
+    pipeline.build_session_table). Every written day is recomputed from all sessions
+    overlapping it, so a day can be written again once more sessions are known.
+    Defaults: since = the last stored day (it may have been written while sessions were
+    still running), until = the day the last session ends. bins only applies to a new cube.
+    Returns {'days', 'from', 'to'}.
+    """
+    if rebuild and os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path, exist_ok=True)
+    meta = read_meta(path) or new_meta(bins)
+
+    sessions = sessions.dropna(subset=['zone', 'dt_start', 'dt_end'])
+    sessions = sessions[sessions['dt_end'] > sessions['dt_start']]
+    if sessions.empty:
+        return {'days': 0, 'from': None, 'to': None}
+
+    if since is None:
+        since = meta['origin'] and np.datetime64(meta['origin'], 'D') + max(meta['days'] - 1, 0)
+    if since is None:
+        since = sessions['dt_start'].min()
+    since = np.datetime64(pd.Timestamp(since).date(), 'D')
+    until = np.datetime64(pd.Timestamp(sessions['dt_end'].max() if until is None else until).date(), 'D')
+    until = max(until, since)
+
+    origin = np.datetime64(meta['origin'], 'D') if meta['origin'] else since
+    if since < origin:
+        raise ValueError(f"Куб начинается с {origin}; для более ранних дней нужен rebuild=True")
+
+    starts = sessions['dt_start'].to_numpy(dtype='datetime64[ns]')
+    ends = sessions['dt_end'].to_numpy(dtype='datetime64[ns]')
+    window = sessions[(ends > since.astype('datetime64[ns]')) & (starts < (until + 1).astype('datetime64[ns]'))]
+    _register(path, meta, window)
+    meta['origin'] = str(origin)
+
+    print(f"🧊 Куб загрузки {path}: {since} .. {until}")
+    n_days = int((until - since).astype(np.int64)) + 1
+    for i in range(0, n_days, CHUNK_DAYS):
+        dates = since + np.arange(i, min(i + CHUNK_DAYS, n_days))
+        lo, hi = dates[0].astype('datetime64[ns]'), (dates[-1] + 1).astype('datetime64[ns]')
+        s, e = window['dt_start'].to_numpy(dtype='datetime64[ns]'), window['dt_end'].to_numpy(dtype='datetime64[ns]')
+        offset = int((dates[0] - origin).astype(np.int64))
+        _write_days(path, meta, offset, day_slabs(window[(e > lo) & (s < hi)], dates, meta))
+        meta['days'] = max(meta['days'], offset + len(dates))
+        _save_meta(path, meta)
+
+    return {'days': n_days, 'from': str(since), 'to': str(until)}
+
+class OccupancyCube:
+    """
+    Read-only access to a cube directory. Arrays are memory-mapped: slicing a range of days
+    touches only those days on disk, and reductions walk the cube CHUNK_DAYS days at a time.
+    """
+
+    def __init__(self, path=CUBE_DIR):
+        self.path = path
+        self.meta = read_meta(path)
+        if self.meta is None or not self.meta['origin']:
+            raise FileNotFoundError(f"Нет куба загрузки в {path}")
+        self.origin = np.datetime64(self.meta['origin'], 'D')
+        self.bins = self.meta['bins']
+        self.zones = self.meta['zones']
+        self.pcs = self.meta['pcs']
+        self._arrays = {}
+
+    @property
+    def dates(self):
+        return self.origin + np.arange(self.meta['days'])
+
+    def array(self, kind):
+        if kind not in self._arrays:
+            self._arrays[kind] = _open(self.path, self.meta, kind)
+        return self._arrays[kind]
+
+    def day_range(self, start=None, end=None):
+        """Day indices [i0, i1) of the inclusive dates start..end ('YYYY-MM-DD' or None)."""
+        i0 = 0 if start is None else int((np.datetime64(start, 'D') - self.origin).astype(np.int64))
+        i1 = self.meta['days'] if end is None else int((np.datetime64(end, 'D') - self.origin).astype(np.int64)) + 1
+        return max(i0, 0), min(max(i1, 0), self.meta['days'])
+
+    def slice(self, kind, start=None, end=None, names=None):
+        """
+        (dates, [day, entity, bin]) of one array. Without names the result is a view of the
+        memory map (entities in index order); with names only those zones / PCs are read.
+        """
+        i0, i1 = self.day_range(start, end)
+        index = self.pcs if kind == 'pcs' else self.zones
+        block = self.array(kind)[i0:i1]
+        if names is None:
+            return self.dates[i0:i1], block[:, :len(index)]
+        return self.dates[i0:i1], np.asarray(block[:, [index.index(n) for n in names]])
+
+    def chunks(self, kinds, start=None, end=None, chunk_days=CHUNK_DAYS):
+        """Yields (dates, {kind: [day, entity, bin]}) blocks of at most chunk_days days."""
+        i0, i1 = self.day_range(start, end)
+        for i in range(i0, i1, chunk_days):
+            j = min(i + chunk_days, i1)
+            yield self.dates[i:j], {k: np.asarray(self.slice(k)[1][i:j]) for k in kinds}
+
+def to_hours(block, kind, bins):
+    """[day, entity, bin] -> [day, entity, hour]: minutes add up, peaks take the max."""
+    if bins == 24: return block
+    hours = block.reshape(block.shape[0], block.shape[1], 24, bins // 24)
+    return hours.max(axis=3) if kind == 'peaks' else hours.sum(axis=3, dtype=np.float64)
+
+def reduce_cube(cube, start=None, end=None, peaks=True, chunk_days=CHUNK_DAYS):
+    """
+    (group_hourly_stats, global_max_stats) of the stored days start..end, the same dicts as
+    anal.analyze_sessions builds; peaks=False reports occupied minutes / 60 as 'max'.
+    """
+    parts = None
+    for dates, block in cube.chunks(('zones', 'peaks'), start, end, chunk_days):
+        minutes = to_hours(block['zones'], 'zones', cube.bins).astype(np.float64)
+        peak = to_hours(block['peaks'], 'peaks', cube.bins) if peaks else None
+        parts = combine_partials(parts, occupancy_partials(dates, minutes, peak))
+    return partials_to_stats(cube.zones, parts)
+
+def pc_hours(cube, start=None, end=None, chunk_days=CHUNK_DAYS):
+    """Occupied hours per PC over the stored days start..end."""
+    total = np.zeros(len(cube.pcs))
+    for _, block in cube.chunks(('pcs',), start, end, chunk_days):
+        total += block['pcs'].sum(axis=(0, 2), dtype=np.float64)
+    return {pc: float(h) / 60 for pc, h in zip(cube.pcs, total)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Куб загрузки зон и ПК")
+    parser.add_argument('--cube', default=CUBE_DIR)
+    parser.add_argument('--from', dest='start')
+    parser.add_argument('--to', dest='end')
+    args = parser.parse_args(argv)
+
+    cube = OccupancyCube(args.cube)
+    print(f"🧊 {cube.path}: {cube.meta['days']} дн. с {cube.origin}, {len(cube.zones)} зон, {len(cube.pcs)} ПК, "
+          f"{cube.bins} столбцов в сутках")
+    group_stats, glob_max = reduce_cube(cube, args.start, args.end)
+    for z, hours in glob_max.items():
+        avg = [s['sum'] / s['count'] for d in group_stats.values() if z in d for s in d[z].values() if s['count']]
+        print(f"  {z}: пик {max(hours.values()):.0f}, средняя загрузка {np.mean(avg) if avg else 0:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import sys
+
+import anal
+import api_sales
+import instrument
+import occupancy_store
+import time_anal
+from ingest import decode_column, read_sales
+
+@instrument.staged(rows_in=lambda df, *a, **kw: len(df), rows_out=len)
+def build_session_table(df, pc_map, api_zones=None, api_pc_map=None):
+    """
+    Shared ingestion stage: one normalized session table for both reports.
+    PCs resolve through price.xlsx first, then the Langame API links, then the name-based
+    fallback of time_anal. Columns: pc, zone, zone_type, in_price, t_code, is_autosim,
+    dt_buy, dt_start, dt_end, d_type, slot, dur, cash, bonus, phone.
+    """
+    api_zones = api_zones or {}
+    api_pc_map = api_pc_map or {}
+
+    df = anal.parse_sales_dates(df)
+    table = anal.classify_sales(df, pc_map, resolve_zone=lambda pc: time_anal.resolve_zone(pc, api_zones, api_pc_map))
+    if 'dt_buy' not in table.columns:
+        table['dt_buy'] = table['dt_start']
+
+    priced = table['in_price'].to_numpy(dtype=bool)
+    table.loc[priced, 'zone_type'] = decode_column(table.loc[priced, 'zone'], time_anal.classify_zone)
+    return table
+
+def run_reports(file_path=anal.FILE_NAME, price_file=anal.PRICE_FILE, competitors_file=anal.COMPETITORS_FILE,
+                from_api=False, base_url=time_anal.BASE_URL, cube=False):
+    """
+    Reads the export once and produces FLYER_WITH_STATS.html and TIME_REPORT.html.
+    from_api=True takes the sales from public_api instead of the xlsx (only new records are downloaded).
+    cube=True also appends the new days to the on-disk occupancy cube (occupancy_store).
+    """
+    pc_map, price_grid, zone_capacities = anal.load_config(price_file)
+    if not pc_map:
+        print("❌ Не удалось загрузить конфигурацию.")
+        return
+    market_data = anal.load_competitors(competitors_file)
+    api_zones, api_pc_map = time_anal.fetch_metadata(base_url)
+
+    print("📂 Чтение продаж (общий проход)...")
+    try:
+        if from_api:
+            api_sales.sync_sales(base_url, time_anal.API_KEY)
+        with instrument.stage('read_sales') as st:
+            df = api_sales.read_api_sales(base_url) if from_api else read_sales(file_path)
+            st['rows_out'] = len(df)
+    except Exception as e:
+        print(f"❌ Ошибка чтения {'API' if from_api else 'Excel'}: {e}")
+        return
+
+    table = build_session_table(df, pc_map, api_zones, api_pc_map)
+
+    sessions = table[table['in_price']]
+    with instrument.stage('analyze_sessions', rows_in=len(sessions)):
+        stats, day_counts, group_stats, glob_max, ret, pc_rev = anal.analyze_sessions(sessions)
+    if stats:
+        anal.generate_flyer_with_stats(price_grid, stats, zone_capacities, group_stats, ret, pc_rev, market_data)
+    if cube:
+        occupancy_store.append_sessions(sessions)
+
+    time_stats = time_anal.time_stats_from_sessions(table)
+    if time_stats:
+        recs = time_anal.generate_recommendations(time_stats, price_grid)
+        time_anal.generate_report(time_stats, recs)
+
+if __name__ == "__main__":
+    # python pipeline.py [--api] [--cube] [--memory] [--profile build_session_table]
+    instrument.cli_run('pipeline')
+    run_reports(from_api='--api' in sys.argv, cube='--cube' in sys.argv)
+    instrument.finish_run()
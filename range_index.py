@@ -0,0 +1,218 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import anal
+from incremental import config_key
+from ingest import CACHE_DIR, read_sales, source_key
+from occupancy import DAY_TYPES, align_cube, weekend_mask
+from sales_cube import METRICS, SLOTS, TARIFF_CODES, SalesCube
+
+# --- НАСТРОЙКИ ---
+RANGE_INDEX_VERSION = 1
+
+def _prefix(values):
+    """Cumulative sums along the day axis with a leading zero row: sum(values[i:j]) = out[j] - out[i]."""
+    out = np.zeros((len(values) + 1,) + values.shape[1:], dtype=values.dtype)
+    np.cumsum(values, axis=0, out=out[1:])
+    return out
+
+def sparse_max(values):
+    """Sparse table over axis 0: level k holds max(values[i:i + 2**k]) for every i."""
+    levels = [values]
+    while (1 << len(levels)) <= len(values):
+        prev, half = levels[-1], 1 << (len(levels) - 1)
+        levels.append(np.maximum(prev[:-half], prev[half:]))
+    return levels
+
+def range_max(levels, i, j):
+    """max(values[i:j]) for j > i in O(1) from two overlapping power-of-two blocks."""
+    k = (j - i).bit_length() - 1
+    return np.maximum(levels[k][i], levels[k][j - (1 << k)])
+
+class RangeIndex:
+    """
+    Per-day cumulative aggregates of classified sessions. Any [start, end] window of days is
+    answered from prefix-sum differences (sales, occupied minutes, PC revenue) and sparse-table
+    range max (peaks), without touching the sessions again.
+    """
+
+    def __init__(self, day0, n_days, zones):
+        self.day0 = day0                 # datetime64[D] of day index 0
+        self.n_days = n_days
+        self.zones = zones
+
+    @classmethod
+    def from_sessions(cls, sessions, peak_mode=anal.PEAK_MODE):
+        sessions = sessions.assign(day=sessions['dt_start'].dt.normalize())
+        dates, occ_zones, cube = anal.build_occupancy_cube(sessions)
+
+        zones = list(dict.fromkeys(sessions['zone']))
+        days = sessions['day'].to_numpy(dtype='datetime64[D]')
+        day0 = min(days.min(), dates[0]) if len(dates) else days.min()
+        day1 = max(days.max(), dates[-1]) if len(dates) else days.max()
+        n_days = int((day1 - day0).astype(np.int64)) + 1
+        index = cls(day0, n_days, zones)
+        axis = day0 + np.arange(n_days)
+
+        # Sales: [day, zone, tariff, day type, slot, metric]
+        rollup = anal.rollup_sales(sessions, ['day'] + anal.SALES_KEYS)
+        sales = np.zeros((n_days, len(zones), len(TARIFF_CODES), len(DAY_TYPES), len(SLOTS), len(METRICS)))
+        idx = (
+            (rollup['day'].to_numpy(dtype='datetime64[D]') - day0).astype(np.int64),
+            rollup['zone'].map({z: i for i, z in enumerate(zones)}).to_numpy(),
+            rollup['t_code'].map({t: i for i, t in enumerate(TARIFF_CODES)}).to_numpy(),
+            rollup['d_type'].map({d: i for i, d in enumerate(DAY_TYPES)}).to_numpy(),
+            rollup['slot'].map({s: i for i, s in enumerate(SLOTS)}).to_numpy(),
+        )
+        np.add.at(sales, idx, rollup[METRICS].to_numpy(dtype=float))
+        index.sales = _prefix(sales)
+
+        # Occupancy: the reduce_occupancy_cube terms per day, summed / maxed over the window
+        minutes = align_cube((dates, occ_zones, cube), axis, zones)
+        if peak_mode == 'sweep':
+            peaks = align_cube((dates, occ_zones, anal.build_peak_cube(sessions, dates, occ_zones)), axis, zones)
+        else:
+            peaks = minutes / 60.0
+        present = minutes.sum(axis=2) > 0                  # [day, zone]
+        weekend = weekend_mask(axis)                       # [day, hour]
+
+        index.present = _prefix(present.astype(np.int64))
+        index.glob_max = sparse_max(np.where(present[:, :, None], peaks, 0))
+        index.occupancy = {}
+        for d_type, mask in (('будни', ~weekend), ('выходные', weekend)):
+            m = present[:, :, None] & mask[:, None, :]
+            index.occupancy[d_type] = (
+                _prefix(np.where(m, minutes, 0)),
+                _prefix(m.astype(np.int64)),
+                sparse_max(np.where(m, peaks, 0)),
+            )
+
+        # PC revenue: [day, pc, (cash, bonus, sessions)]
+        pcs = sessions[sessions['pc'] != '']
+        pc_ids, index.pcs = pd.factorize(pcs['pc'])
+        index.pc_zones = pcs.groupby(pc_ids)['zone'].first().to_numpy()
+        pc_days = (pcs['day'].to_numpy(dtype='datetime64[D]') - day0).astype(np.int64)
+        pc_rev = np.zeros((n_days, len(index.pcs), 3))
+        np.add.at(pc_rev, (pc_days, pc_ids), np.column_stack([pcs['cash'], pcs['bonus'], np.ones(len(pcs))]))
+        index.pc_revenue = _prefix(pc_rev)
+
+        # Phones: visit codes sorted by day, with per-day offsets into that array
+        phones = sessions[sessions['phone'].str.len() > 5]
+        phone_ids, index.phones = pd.factorize(phones['phone'])
+        phone_days = (phones['day'].to_numpy(dtype='datetime64[D]') - day0).astype(np.int64)
+        order = np.argsort(phone_days, kind='stable')
+        index.phone_ids = phone_ids[order]
+        index.phone_offsets = np.searchsorted(phone_days[order], np.arange(n_days + 1))
+
+        return index
+
+    def _window(self, start=None, end=None):
+        """Inclusive [start, end] dates -> half-open day index range, clipped to the index."""
+        i = 0 if start is None else int((np.datetime64(pd.Timestamp(start).date(), 'D') - self.day0).astype(np.int64))
+        j = self.n_days if end is None else int((np.datetime64(pd.Timestamp(end).date(), 'D') - self.day0).astype(np.int64)) + 1
+        return max(i, 0), min(j, self.n_days)
+
+    def sales_stats(self, start=None, end=None):
+        i, j = self._window(start, end)
+        if j <= i: return SalesCube([])
+        data = self.sales[j] - self.sales[i]
+        present = data[..., METRICS.index('count')].sum(axis=3) > 0
+        return SalesCube(self.zones, data, present)
+
+    def occupancy_stats(self, start=None, end=None):
+        """(group_hourly_stats, global_max_stats) of reduce_occupancy_cube over the window."""
+        group_hourly_stats = {d_type: {} for d_type in DAY_TYPES}
+        global_max_stats = {}
+        i, j = self._window(start, end)
+        if j <= i: return group_hourly_stats, global_max_stats
+
+        present = self.present[j] - self.present[i]
+        glob = range_max(self.glob_max, i, j)
+        for z_idx, z in enumerate(self.zones):
+            if present[z_idx]:
+                global_max_stats[z] = {h: float(glob[z_idx, h]) for h in range(24)}
+
+        for d_type, (sums, counts, maxes) in self.occupancy.items():
+            h_sum = (sums[j] - sums[i]) / 60.0
+            h_cnt = counts[j] - counts[i]
+            h_max = range_max(maxes, i, j)
+            for z_idx, z in enumerate(self.zones):
+                if not h_cnt[z_idx].any(): continue
+                group_hourly_stats[d_type][z] = {
+                    h: {'max': float(h_max[z_idx, h]), 'sum': float(h_sum[z_idx, h]), 'count': int(h_cnt[z_idx, h])}
+                    for h in range(24)
+                }
+        return group_hourly_stats, global_max_stats
+
+    def pc_revenue_stats(self, start=None, end=None):
+        i, j = self._window(start, end)
+        if j <= i: return {}
+        rev = self.pc_revenue[j] - self.pc_revenue[i]
+        return {self.pcs[p]: {'cash': float(rev[p, 0]), 'bonus': float(rev[p, 1]), 'zone': self.pc_zones[p]}
+                for p in np.flatnonzero(rev[:, 2] > 0)}
+
+    def phone_counts(self, start=None, end=None):
+        i, j = self._window(start, end)
+        if j <= i: return {}
+        visits = self.phone_ids[self.phone_offsets[i]:self.phone_offsets[j]]
+        counts = np.bincount(visits, minlength=len(self.phones))
+        return {self.phones[p]: int(counts[p]) for p in np.flatnonzero(counts)}
+
+    def results(self, start=None, end=None):
+        """analyze_excel tuple for sessions started within [start, end] (inclusive dates)."""
+        group_hourly_stats, global_max_stats = self.occupancy_stats(start, end)
+        return anal.build_results(
+            self.sales_stats(start, end),
+            group_hourly_stats, global_max_stats,
+            self.phone_counts(start, end),
+            self.pc_revenue_stats(start, end),
+        )
+
+def index_path(file_path, pc_map, peak_mode, cache_dir=CACHE_DIR):
+    key = f"{source_key(file_path, cache_dir)[:16]}_{config_key(pc_map)[:8]}_{peak_mode}"
+    return os.path.join(cache_dir, f"range_v{RANGE_INDEX_VERSION}_{key}.pkl")
+
+def load_range_index(file_path, pc_map, peak_mode=anal.PEAK_MODE, cache_dir=CACHE_DIR):
+    """RangeIndex of the export, stored in the cache next to the Parquet copy of the file."""
+    path = index_path(file_path, pc_map, peak_mode, cache_dir)
+    if os.path.exists(path):
+        return pd.read_pickle(path)
+
+    print("🗂️ Построение индекса по датам...")
+    try:
+        df = read_sales(file_path, cache_dir=cache_dir)
+    except Exception as e:
+        print(f"❌ Ошибка чтения Excel: {e}")
+        return None
+    sessions = anal.classify_sales(anal.parse_sales_dates(df), pc_map)
+    if sessions.empty: return None
+
+    index = RangeIndex.from_sessions(sessions, peak_mode)
+    tmp = path + '.tmp'
+    pd.to_pickle(index, tmp)
+    os.replace(tmp, path)
+    return index
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Флаер за период (индекс по дням)")
+    parser.add_argument('--from', dest='start', help="первый день, YYYY-MM-DD")
+    parser.add_argument('--to', dest='end', help="последний день, YYYY-MM-DD")
+    args = parser.parse_args(argv)
+
+    pc_map, price_grid, zone_capacities = anal.load_config(anal.PRICE_FILE)
+    market_data = anal.load_competitors(anal.COMPETITORS_FILE)
+
+    if pc_map:
+        index = load_range_index(anal.FILE_NAME, pc_map)
+        if index is not None:
+            anal.generate_flyer_with_stats(price_grid, None, zone_capacities, None, None, None, market_data,
+                                           range_index=index, date_range=(args.start, args.end))
+    else:
+        print("❌ Не удалось загрузить конфигурацию.")
+
+if __name__ == "__main__":
+    # python range_index.py [--from 2025-12-01] [--to 2025-12-14]
+    main()
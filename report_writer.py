@@ -0,0 +1,65 @@
+import gzip
+import os
+
+# --- НАСТРОЙКИ ---
+BUFFER_CHARS = 1 << 16  # символов в буфере до записи на диск
+
+class ReportWriter:
+    """
+    Incremental HTML output. Pieces are collected in a list and flushed to the file every
+    buffer_chars characters, so a report never exists as one string in memory.
+    The file is written under a temporary name and renamed on success; a failed render
+    leaves the previous report untouched. gzip_copy=True also streams a precompressed
+    path + '.gz' for servers that send it as Content-Encoding: gzip.
+    """
+
+    def __init__(self, path, buffer_chars=BUFFER_CHARS, gzip_copy=False):
+        self.path = path
+        self.tmp = f"{path}.{os.getpid()}.tmp"
+        self.buffer_chars = buffer_chars
+        self._parts = []
+        self._size = 0
+        self._f = open(self.tmp, 'w', encoding='utf-8')
+        self._gz = None
+        if gzip_copy:
+            # mtime=0: identical reports give identical .gz files
+            self._gz = gzip.GzipFile(f"{self.tmp}.gz", 'wb', compresslevel=9, mtime=0)
+
+    def write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_chars:
+            self.flush()
+
+    def writelines(self, parts):
+        for text in parts:
+            self.write(text)
+
+    def flush(self):
+        text = ''.join(self._parts)
+        self._f.write(text)
+        if self._gz is not None:
+            self._gz.write(text.encode('utf-8'))
+        self._parts.clear()
+        self._size = 0
+
+    def __enter__(self):
+        return self
+
+    def _close(self):
+        self._f.close()
+        if self._gz is not None:
+            self._gz.close()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+            self._close()
+            os.replace(self.tmp, self.path)
+            if self._gz is not None:
+                os.replace(f"{self.tmp}.gz", f"{self.path}.gz")
+        else:
+            self._close()
+            os.remove(self.tmp)
+            if self._gz is not None:
+                os.remove(f"{self.tmp}.gz")
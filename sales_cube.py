@@ -0,0 +1,107 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+# Fixed axes of the sales tensor
+TARIFF_CODES = ['1_HOUR', '2_HOURS', '3_HOURS', '5_HOURS', 'NIGHT']
+DAY_TYPES = ['будни', 'выходные']
+SLOTS = ['day', 'evening', 'night', 'all_day']
+METRICS = ['count', 'hours', 'cash', 'bonus']
+
+class SalesCube(Mapping):
+    """
+    Array-backed sales_stats: data[zone, tariff, day type, slot, metric].
+    Reads like the old nested dict (zone -> tariff -> day type -> slot -> metrics),
+    but totals, slices and cell lookups are array operations.
+    """
+
+    def __init__(self, zones, data=None, present=None):
+        self.zones = list(zones)
+        self.zone_index = {z: i for i, z in enumerate(self.zones)}
+        shape = (len(self.zones), len(TARIFF_CODES), len(DAY_TYPES), len(SLOTS))
+        self.data = np.zeros(shape + (len(METRICS),)) if data is None else data
+        # (zone, tariff, day type) combinations that had sales; the dict view only shows these
+        self.present = np.zeros(shape[:3], dtype=bool) if present is None else present
+        self._view = None
+
+    @classmethod
+    def from_rollup(cls, rollup):
+        """rollup: DataFrame with zone, t_code, d_type, slot + METRICS columns (extra keys are summed)."""
+        zones = list(dict.fromkeys(rollup['zone']))
+        cube = cls(zones)
+        if rollup.empty: return cube
+        idx = (
+            rollup['zone'].map(cube.zone_index).to_numpy().astype(np.int64),
+            rollup['t_code'].map({t: i for i, t in enumerate(TARIFF_CODES)}).to_numpy().astype(np.int64),
+            rollup['d_type'].map({d: i for i, d in enumerate(DAY_TYPES)}).to_numpy().astype(np.int64),
+            rollup['slot'].map({s: i for i, s in enumerate(SLOTS)}).to_numpy().astype(np.int64),
+        )
+        np.add.at(cube.data, idx, rollup[METRICS].to_numpy(dtype=float))
+        cube.present[idx[:3]] = True
+        return cube
+
+    @classmethod
+    def from_dict(cls, sales_stats):
+        if isinstance(sales_stats, SalesCube): return sales_stats
+        cube = cls(sales_stats.keys())
+        for z, tariffs in sales_stats.items():
+            for t, d_types in tariffs.items():
+                for d, slots in d_types.items():
+                    key = (cube.zone_index[z], TARIFF_CODES.index(t), DAY_TYPES.index(d))
+                    cube.present[key] = True
+                    for s, bucket in slots.items():
+                        cube.data[key + (SLOTS.index(s),)] = [bucket[m] for m in METRICS]
+        return cube
+
+    def _axis_index(self, labels, value):
+        if value is None: return slice(None)
+        if labels is self.zones: return self.zone_index.get(value)
+        return labels.index(value) if value in labels else None
+
+    def select(self, metric=None, zone=None, t_code=None, d_type=None, slot=None):
+        """Array slice; None on an axis keeps the whole axis. Unknown labels give zeros."""
+        key = (
+            self._axis_index(self.zones, zone),
+            self._axis_index(TARIFF_CODES, t_code),
+            self._axis_index(DAY_TYPES, d_type),
+            self._axis_index(SLOTS, slot),
+            self._axis_index(METRICS, metric),
+        )
+        if any(k is None for k in key): return np.zeros(0)
+        return self.data[key]
+
+    def sum(self, metric, **selectors):
+        return float(np.sum(self.select(metric, **selectors)))
+
+    def total(self, metric):
+        return float(self.data[..., METRICS.index(metric)].sum())
+
+    def cell(self, zone, t_code, d_type, slot):
+        """{'count', 'hours', 'cash', 'bonus'} of one cell; zeros when there were no sales."""
+        vals = self.select(None, zone, t_code, d_type, slot)
+        if len(vals) == 0: vals = np.zeros(len(METRICS))
+        return {'count': int(vals[0]), 'hours': int(vals[1]), 'cash': float(vals[2]), 'bonus': float(vals[3])}
+
+    def to_dict(self):
+        """Nested sales_stats dict (the pre-cube format)."""
+        sales_stats = {}
+        for zi, ti, di in zip(*np.nonzero(self.present)):
+            z, t, d = self.zones[zi], TARIFF_CODES[ti], DAY_TYPES[di]
+            sales_stats.setdefault(z, {}).setdefault(t, {})[d] = {
+                s: self.cell(z, t, d, s) for s in SLOTS
+            }
+        return sales_stats
+
+    # Mapping protocol: behaves like the nested dict for existing callers
+    def _dict_view(self):
+        if self._view is None: self._view = self.to_dict()
+        return self._view
+
+    def __getitem__(self, zone):
+        return self._dict_view()[zone]
+
+    def __iter__(self):
+        return iter(self._dict_view())
+
+    def __len__(self):
+        return len(self._dict_view())
@@ -0,0 +1,247 @@
+import argparse
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import anal
+import time_anal
+from incremental import config_key
+from ingest import CACHE_DIR, read_sales, source_key
+from occupancy import weekend_mask
+from pipeline import build_session_table
+
+# --- НАСТРОЙКИ ---
+STORE_FILE = os.path.join(CACHE_DIR, 'anal.sqlite')
+STORE_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE sessions (
+    pc TEXT, zone TEXT, zone_type TEXT, in_price INTEGER, t_code TEXT, is_autosim INTEGER,
+    dt_buy TEXT, dt_start TEXT, dt_end TEXT, date TEXT, hour INTEGER,
+    d_type TEXT, slot TEXT, dur INTEGER, cash REAL, bonus REAL, phone TEXT
+);
+CREATE TABLE sales_daily (
+    date TEXT, zone TEXT, t_code TEXT, d_type TEXT, slot TEXT,
+    count INTEGER, hours REAL, cash REAL, bonus REAL
+);
+CREATE TABLE occupancy_hourly (
+    date TEXT, zone TEXT, hour INTEGER, d_type TEXT, minutes REAL, peak INTEGER
+);
+CREATE INDEX sessions_zone_date_hour ON sessions (zone, date, hour);
+CREATE INDEX sessions_pc ON sessions (pc, dt_start);
+CREATE INDEX sessions_phone ON sessions (phone);
+CREATE INDEX sales_daily_zone_date ON sales_daily (zone, date);
+CREATE INDEX occupancy_zone_date_hour ON occupancy_hourly (zone, date, hour);
+"""
+
+def connect(db_path=STORE_FILE):
+    return sqlite3.connect(db_path)
+
+def _as_text_times(s):
+    return s.dt.strftime('%Y-%m-%d %H:%M:%S').where(s.notna(), None)
+
+def session_rows(table):
+    """Session table -> sessions rows (timestamps as ISO text, date/hour of the session start)."""
+    rows = table[['pc', 'zone', 'zone_type', 'in_price', 't_code', 'is_autosim', 'd_type', 'slot',
+                  'dur', 'cash', 'bonus', 'phone']].copy()
+    for c in ['dt_buy', 'dt_start', 'dt_end']:
+        rows[c] = _as_text_times(table[c])
+    rows['date'] = table['dt_start'].dt.strftime('%Y-%m-%d')
+    rows['hour'] = table['dt_start'].dt.hour
+    rows[['in_price', 'is_autosim']] = rows[['in_price', 'is_autosim']].astype(int)
+    return rows
+
+def sales_daily_rows(sales):
+    """Per-day sales rollup of anal.merge_rollups -> sales_daily rows."""
+    rows = sales.rename(columns={'day': 'date'})
+    rows['date'] = rows['date'].dt.strftime('%Y-%m-%d')
+    return rows[['date', 'zone', 't_code', 'd_type', 'slot'] + anal.METRICS]
+
+def occupancy_rows(dates, zones, cube, peaks):
+    """[date, zone, hour] cubes -> occupancy_hourly rows (only zone-days that had sessions)."""
+    d_idx, z_idx = np.nonzero(cube.sum(axis=2) > 0)
+    n = len(d_idx)
+    hours = np.tile(np.arange(24), n)
+    day = np.repeat(np.asarray(dates)[d_idx], 24)
+    weekend = weekend_mask(dates)[np.repeat(d_idx, 24), hours]
+    return pd.DataFrame({
+        'date': pd.to_datetime(day).strftime('%Y-%m-%d'),
+        'zone': np.repeat(np.asarray(zones, dtype=object)[z_idx], 24),
+        'hour': hours,
+        'd_type': np.where(weekend, 'выходные', 'будни'),
+        'minutes': cube[d_idx, z_idx].ravel(),
+        'peak': peaks[d_idx, z_idx].ravel(),
+    })
+
+def write_store(db_path, table, meta):
+    """Replaces the database with the given session table and the rollups built from its priced rows."""
+    sessions = table[table['in_price']]
+    acc = anal.empty_rollups()
+    if not sessions.empty:
+        anal.merge_rollups(acc, sessions)
+    dates, zones, cube = acc['occupancy']
+    peaks = anal.build_peak_cube(sessions, dates, zones)
+
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    tmp = db_path + '.tmp'
+    if os.path.exists(tmp): os.remove(tmp)
+
+    con = connect(tmp)
+    try:
+        con.executescript(SCHEMA)
+        session_rows(table).to_sql('sessions', con, if_exists='append', index=False)
+        if acc['sales'] is not None:
+            sales_daily_rows(acc['sales']).to_sql('sales_daily', con, if_exists='append', index=False)
+        occupancy_rows(dates, zones, cube, peaks).to_sql('occupancy_hourly', con, if_exists='append', index=False)
+        con.executemany("INSERT INTO meta VALUES (?, ?)", [(k, str(v)) for k, v in meta.items()])
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp, db_path)
+
+def read_meta(db_path=STORE_FILE):
+    if not os.path.exists(db_path): return {}
+    con = connect(db_path)
+    try:
+        return dict(con.execute("SELECT key, value FROM meta").fetchall())
+    except sqlite3.DatabaseError:
+        return {}
+    finally:
+        con.close()
+
+def export_store(file_path=anal.FILE_NAME, price_file=anal.PRICE_FILE, db_path=STORE_FILE, force=False, use_api=True):
+    """
+    Loads the normalized session table and the daily/hourly rollups into SQLite.
+    Skipped when the database was already built from the same export and PC mapping.
+    """
+    pc_map, _, _ = anal.load_config(price_file)
+    if not pc_map:
+        print("❌ Не удалось загрузить конфигурацию.")
+        return False
+
+    try:
+        meta = {
+            'version': STORE_VERSION,
+            'source': source_key(file_path),
+            'config': config_key(pc_map),
+        }
+    except OSError as e:
+        print(f"❌ Ошибка чтения Excel: {e}")
+        return False
+    if not force and all(read_meta(db_path).get(k) == str(v) for k, v in meta.items()):
+        print(f"✅ База {db_path} актуальна.")
+        return True
+
+    api_zones, api_pc_map = time_anal.fetch_metadata() if use_api else ({}, {})
+    print("📂 Чтение продаж для базы...")
+    try:
+        df = read_sales(file_path)
+    except Exception as e:
+        print(f"❌ Ошибка чтения Excel: {e}")
+        return False
+
+    table = build_session_table(df, pc_map, api_zones, api_pc_map)
+    write_store(db_path, table, meta)
+    print(f"💾 База {db_path}: {len(table)} сессий.")
+    return True
+
+# --- ЗАПРОСЫ ---
+def query(sql, params=(), db_path=STORE_FILE):
+    """Ad hoc SQL against the store; returns a DataFrame."""
+    con = connect(db_path)
+    try:
+        return pd.read_sql_query(sql, con, params=params)
+    finally:
+        con.close()
+
+def _where(**conds):
+    """('zone = ? AND date >= ?', params) for the conditions that are not None."""
+    ops = {'start': ('date', '>='), 'end': ('date', '<=')}
+    clauses, params = [], []
+    for key, value in conds.items():
+        if value is None: continue
+        col, op = ops.get(key, (key, '='))
+        clauses.append(f"{col} {op} ?")
+        params.append(value)
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+def zone_revenue(zone=None, start=None, end=None, d_type=None, db_path=STORE_FILE):
+    """Sales, hours, cash and bonus per zone and tariff; dates are inclusive 'YYYY-MM-DD'."""
+    where, params = _where(zone=zone, start=start, end=end, d_type=d_type)
+    return query(
+        "SELECT zone, t_code, SUM(count) AS count, SUM(hours) AS hours, SUM(cash) AS cash, SUM(bonus) AS bonus"
+        f" FROM sales_daily{where} GROUP BY zone, t_code ORDER BY zone, t_code", params, db_path)
+
+def zone_occupancy(zone=None, start=None, end=None, d_type=None, db_path=STORE_FILE):
+    """Average occupied seats and peak concurrency per zone and hour."""
+    where, params = _where(zone=zone, start=start, end=end, d_type=d_type)
+    return query(
+        "SELECT zone, hour, AVG(minutes) / 60.0 AS avg_load, MAX(peak) AS peak"
+        f" FROM occupancy_hourly{where} GROUP BY zone, hour ORDER BY zone, hour", params, db_path)
+
+def pc_occupancy(pc, start, end, db_path=STORE_FILE):
+    """
+    Minutes PC pc was busy within [start, end] ('YYYY-MM-DD', inclusive) per session start date,
+    clipping sessions that cross the window edges.
+    """
+    lo, hi = f"{start} 00:00:00", f"{pd.Timestamp(end) + pd.Timedelta(days=1):%Y-%m-%d} 00:00:00"
+    return query(
+        "SELECT date, COUNT(*) AS sessions,"
+        " SUM(MAX(0, strftime('%s', MIN(dt_end, ?)) - strftime('%s', MAX(dt_start, ?))) / 60.0) AS minutes"
+        " FROM sessions WHERE pc = ? AND dt_start < ? AND dt_end > ?"
+        " GROUP BY date ORDER BY date", (hi, lo, anal.normalize_name(pc), hi, lo), db_path)
+
+def phone_history(phone, db_path=STORE_FILE):
+    return query("SELECT * FROM sessions WHERE phone = ? ORDER BY dt_start", (str(phone),), db_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальная база продаж (SQLite)")
+    parser.add_argument('--db', default=STORE_FILE)
+    sub = parser.add_subparsers(dest='cmd', required=True)
+
+    p = sub.add_parser('export', help="Загрузить выгрузку в базу")
+    p.add_argument('--file', default=anal.FILE_NAME)
+    p.add_argument('--price', default=anal.PRICE_FILE)
+    p.add_argument('--force', action='store_true')
+    p.add_argument('--no-api', action='store_true')
+
+    for name in ('revenue', 'occupancy'):
+        p = sub.add_parser(name)
+        p.add_argument('--zone')
+        p.add_argument('--from', dest='start')
+        p.add_argument('--to', dest='end')
+        p.add_argument('--day-type', choices=anal.DAY_TYPES)
+
+    p = sub.add_parser('pc', help="Загрузка одного ПК по дням")
+    p.add_argument('pc')
+    p.add_argument('--from', dest='start', required=True)
+    p.add_argument('--to', dest='end', required=True)
+
+    p = sub.add_parser('phone')
+    p.add_argument('phone')
+
+    p = sub.add_parser('sql')
+    p.add_argument('sql')
+
+    args = parser.parse_args(argv)
+    if args.cmd == 'export':
+        export_store(args.file, args.price, args.db, force=args.force, use_api=not args.no_api)
+        return
+
+    if args.cmd == 'revenue':
+        result = zone_revenue(args.zone, args.start, args.end, args.day_type, db_path=args.db)
+    elif args.cmd == 'occupancy':
+        result = zone_occupancy(args.zone, args.start, args.end, args.day_type, db_path=args.db)
+    elif args.cmd == 'pc':
+        result = pc_occupancy(args.pc, args.start, args.end, db_path=args.db)
+    elif args.cmd == 'phone':
+        result = phone_history(args.phone, db_path=args.db)
+    else:
+        result = query(args.sql, db_path=args.db)
+    print(result.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
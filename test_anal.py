@@ -0,0 +1,204 @@
+import contextlib
+import gzip
+import io
+import json
+import math
+import os
+import re
+import tempfile
+from collections.abc import Mapping
+import pandas as pd
+
+import anal
+from anal import (MarketData, analyze_sales, compile_config, get_day_type, get_day_types, get_fair_price,
+                  get_market_tags, load_competitors, load_config, parse_market_tags, parse_pc_list)
+from sales_cube import SalesCube
+
+PC_MAP = {'1': 'ОБЩИЙ ЗАЛ', '2': 'ОБЩИЙ ЗАЛ', 'autosim1': 'АВТОСИМУЛЯТОР'}
+
+def make_sales():
+    rows = [
+        ('Базовый тариф', '06.10.2025 10:15', '06.10.2025 11:40', '1', 150, 0, 9990000001),
+        ('3 часа', '06.10.2025 16:30', None, '2', 400, 50, 9990000002),
+        ('Ночь (22:00-8:00)', '10.10.2025 22:05', '11.10.2025 07:55', '1', 600, 0, 9990000001),
+        ('Автосим 1 час', '11.10.2025 12:00', '11.10.2025 13:00', 'AUTOSIM1', 500, 100, 9990000003),
+        ('5 часов', '13.10.2025 07:30', None, ' 2 ', 700, 0, 123),
+        ('Неизвестный', '13.10.2025 09:00', None, '1', 100, 0, 9990000004),
+        ('Базовый тариф', '13.10.2025 09:00', None, '99', 100, 0, 9990000004),
+        ('Базовый тариф', None, None, '1', 100, 0, 9990000004),
+    ]
+    df = pd.DataFrame(rows, columns=['Название тарифа', 'Дата покупки тарифа', 'Дата завершения сессии',
+                                     'ПК', 'Списано рублей', 'Списано бонусов', 'Номер телефона гостя'])
+    df['Дата активации сессии'] = df['Дата покупки тарифа']
+    return df
+
+def assert_close(a, b, path=''):
+    if isinstance(a, Mapping):
+        assert set(a) == set(b), f"{path}: {set(a) ^ set(b)}"
+        for k in a: assert_close(a[k], b[k], f"{path}/{k}")
+    elif isinstance(a, str):
+        assert a == b, f"{path}: {a} != {b}"
+    else:
+        assert math.isclose(a, b, abs_tol=1e-9), f"{path}: {a} != {b}"
+
+def test_day_types_match_scalar():
+    dts = pd.Series(pd.date_range('2025-10-06', periods=24 * 7, freq='h'))
+    assert list(get_day_types(dts)) == [get_day_type(d) for d in dts]
+
+def test_columnar_matches_rows():
+    ref = analyze_sales(make_sales(), PC_MAP, mode='rows')
+    res = analyze_sales(make_sales(), PC_MAP, mode='columnar', peak_mode='bucket')
+    for a, b in zip(res, ref):
+        assert_close(a, b)
+    assert list(res[5]) == list(ref[5])
+
+def test_columnar_buckets():
+    stats, _, _, _, retention, pc_rev = analyze_sales(make_sales(), PC_MAP)
+    assert stats['ОБЩИЙ ЗАЛ']['3_HOURS']['будни']['evening']['count'] == 1
+    assert stats['ОБЩИЙ ЗАЛ']['NIGHT']['выходные']['night']['hours'] == 10
+    assert stats['АВТОСИМУЛЯТОР']['1_HOUR']['выходные']['all_day']['bonus'] == 100
+    assert pc_rev['2']['cash'] == 1100
+    assert math.isclose(retention, 100 / 3)
+
+def test_sales_cube_reductions():
+    stats = analyze_sales(make_sales(), PC_MAP)[0]
+    assert isinstance(stats, SalesCube)
+    assert stats.total('count') == 5
+    assert stats.total('cash') == 2350
+    assert stats.sum('bonus', zone='ОБЩИЙ ЗАЛ') == 50
+    assert stats.cell('ОБЩИЙ ЗАЛ', '3_HOURS', 'будни', 'evening')['cash'] == 400
+    assert stats.cell('Нет зоны', '3_HOURS', 'будни', 'day')['count'] == 0
+
+    ref = analyze_sales(make_sales(), PC_MAP, mode='rows')[0]
+    assert SalesCube.from_dict(ref).to_dict() == ref == stats
+
+def test_market_fair_index():
+    entries = [
+        {'tags': {}, 'fair': 100},
+        {'tags': {'day_type': 'выходные'}, 'fair': 150},
+        {'tags': {'day_type': 'выходные', 'slot': 'night'}, 'fair': 300},
+    ]
+    market = MarketData({'ОБЩИЙ ЗАЛ': {'NIGHT': entries}}).build_index()
+    for d_type in ['будни', 'выходные', 'праздник']:
+        for slot in ['day', 'evening', 'night', 'all_day']:
+            assert market.fair('ОБЩИЙ ЗАЛ', 'NIGHT', d_type, slot) is get_fair_price(entries, d_type, slot)
+    assert market.fair('ОБЩИЙ ЗАЛ', '1_HOUR', 'будни', 'day') is None
+    assert market.fair('VIP', 'NIGHT', 'будни', 'day') is None
+
+def test_market_tags_match_scalar():
+    names = ['Ночь выходные', ' 3 часа будни вечер ', 'Дневной', '1 час', None, 'ВЫХОДНОЙ день']
+    day_types, slots = get_market_tags(names)
+    for name, d, s in zip(names, day_types, slots):
+        tags = parse_market_tags(str(name).strip())
+        assert tags.get('day_type') == d and tags.get('slot') == s, name
+
+def test_load_competitors_stats():
+    df = pd.DataFrame({
+        'Ваша Зона': ['ОБЩИЙ ЗАЛ', 'ОБЩИЙ ЗАЛ', 'VIP', 'VIP'],
+        'Тариф': ['3 часа', 'Ночь выходные', '1 час', 'Абонемент'],
+        'Цена Конкурента 1': [300, 'abc', None, 100],
+        'Цена Конкурента 2': [400, 0, None, 100],
+        'Цена Конкурента 3': [800, 900, None, 100],
+        'Ваш Коэффициент': [1.1, None, 1.0, 1.0],
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'competitors.xlsx')
+        df.to_excel(path, index=False)
+        market = load_competitors(path)
+
+    assert list(market) == ['ОБЩИЙ ЗАЛ']
+    three = market['ОБЩИЙ ЗАЛ']['3_HOURS'][0]
+    assert (three['avg'], three['median'], three['min'], three['max'], three['spread'], three['n']) == (500, 400, 300, 800, 500, 3)
+    assert three['fair'] == 550 and three['tags'] == {}
+    night = market['ОБЩИЙ ЗАЛ']['NIGHT'][0]
+    assert night['fair'] == 900 and night['n'] == 1 and night['tags'] == {'day_type': 'выходные'}
+    assert market.fair('ОБЩИЙ ЗАЛ', 'NIGHT', 'выходные', 'night') is night
+
+def test_pc_ranges():
+    assert parse_pc_list('1-3, 7') == ['1', '2', '3', '7']
+    assert parse_pc_list('PS1-PS3') == ['PS1', 'PS2', 'PS3']
+    assert parse_pc_list('PS STD,AUTOSIM1') == ['PS STD', 'AUTOSIM1']
+    assert parse_pc_list('5-2') == ['5-2']
+    assert parse_pc_list(float('nan')) is None
+
+def test_compiled_config_cache():
+    df = pd.DataFrame({
+        'Название': ['ОБЩИЙ ЗАЛ', 'ОБЩИЙ ЗАЛ', 'VIP'],
+        'номера ПК': ['1-10', '1-10', '10-12'],
+        'Тариф': ['1 час', '3 часа', '1 час'],
+        'тип дня недели': ['Будни', 'Будни', 'Выходные'],
+        'Время цены': ['08:00-17:00', '17:00-23:00', '08:00-17:00'],
+        'Цена': [100, 400, 250],
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'price.xlsx')
+        df.to_excel(path, index=False)
+        config = compile_config(path)
+        assert config['duplicates'] == {'10': ['ОБЩИЙ ЗАЛ', 'VIP']}
+        assert config['zone_capacity'] == {'ОБЩИЙ ЗАЛ': 10, 'VIP': 3}
+
+        pc_map, price_grid, zone_capacity = load_config(path, cache_dir=tmp)
+        assert (pc_map, price_grid, zone_capacity) == (config['pc_map'], config['price_grid'], config['zone_capacity'])
+        assert pc_map['10'] == 'VIP' and price_grid['ОБЩИЙ ЗАЛ']['3_HOURS']['будни']['evening'] == 400
+
+        # Second load comes from the artifact, not from the xlsx
+        assert [f for f in os.listdir(tmp) if f.startswith('config_')]
+        compile_orig, anal.compile_config = anal.compile_config, None
+        try:
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                assert load_config(path, cache_dir=tmp)[0] == pc_map
+            # The duplicate PC is still reported on a cached load
+            assert "ПК '10'" in out.getvalue()
+        finally:
+            anal.compile_config = compile_orig
+
+        # A truncated artifact is rebuilt instead of failing the load
+        artifact = anal.config_cache_path(path, tmp)
+        with open(artifact, 'r+', encoding='utf-8') as f:
+            f.truncate(10)
+        assert load_config(path, cache_dir=tmp)[0] == pc_map
+        with open(artifact, encoding='utf-8') as f:
+            assert json.load(f)['pc_map'] == pc_map
+
+def test_compact_flyer():
+    stats, _, group_stats, _, retention, pc_rev = analyze_sales(make_sales(), PC_MAP)
+    with tempfile.TemporaryDirectory() as tmp:
+        _, price_grid, caps = anal.load_config('price.xlsx', cache_dir=tmp)
+        paths = {mode: os.path.join(tmp, f'{mode}.html') for mode in ('full', 'compact')}
+        for mode, path in paths.items():
+            anal.generate_flyer_with_stats(price_grid, stats, caps, group_stats, retention, pc_rev, {},
+                                           out_path=path, compact=mode == 'compact', gzip_copy=mode == 'compact')
+        with open(paths['full'], encoding='utf-8') as f: full = f.read()
+        with open(paths['compact'], encoding='utf-8') as f: compact = f.read()
+        with gzip.open(paths['compact'] + '.gz', 'rt', encoding='utf-8') as f:
+            assert f.read() == compact
+        assert not os.path.exists(paths['full'] + '.gz')
+
+    assert len(compact) < len(full) / 2 and "style='background:rgba" not in compact
+    cells = json.loads(re.search(r"const FLYER_CELLS = (.*);", compact).group(1))
+    assert len(cells) == compact.count("<div class='c'></div>") == full.count("<div style='text-align:center;'>")
+    assert all(c[6] in (None, 'День', 'Вечер') for c in cells)
+
+def test_unmapped_export():
+    # No PC of the export is in price.xlsx: empty results instead of a crash
+    for mode in ('rows', 'columnar'):
+        stats, _, group_stats, glob_max, _, _ = analyze_sales(make_sales(), {'zzz': 'X'}, mode=mode)
+        assert len(stats) == 0 and glob_max == {} and group_stats == {'будни': {}, 'выходные': {}}
+
+    sessions = anal.classify_sales(anal.parse_sales_dates(make_sales()), {'zzz': 'X'})
+    assert sessions.empty and len(anal.analyze_sessions(sessions)[0]) == 0
+
+if __name__ == "__main__":
+    test_day_types_match_scalar()
+    test_columnar_matches_rows()
+    test_columnar_buckets()
+    test_sales_cube_reductions()
+    test_unmapped_export()
+    test_market_fair_index()
+    test_market_tags_match_scalar()
+    test_load_competitors_stats()
+    test_pc_ranges()
+    test_compiled_config_cache()
+    test_compact_flyer()
+    print("✅ All tests passed")
@@ -0,0 +1,142 @@
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import time_anal
+from api_client import LangameClient, get_client
+
+class FakeLangame:
+    """
+    Local stand-in for public_api. routes: {path: payload or callable(query) -> payload};
+    a callable returning None answers 503. The ETag of a route is its version number.
+    delay (seconds) and failures (5xx answers before success) are per path.
+    hits: (path, time, If-None-Match, query).
+    """
+
+    def __init__(self, routes, delay=None, failures=None):
+        self.routes = routes
+        self.versions = {path: 1 for path in routes}
+        self.delay = delay or {}
+        self.failures = dict(failures or {})
+        self.hits = []
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                path, query = url.path, {k: v[-1] for k, v in parse_qs(url.query).items()}
+                with fake.lock:
+                    fake.hits.append((path, time.perf_counter(), self.headers.get('If-None-Match'), query,
+                                      self.headers.get('X-API-KEY')))
+                    fail = fake.failures.get(path, 0)
+                    if fail: fake.failures[path] = fail - 1
+                time.sleep(fake.delay.get(path, 0))
+                payload = fake.routes.get(path)
+                if callable(payload): payload = payload(query)
+                if payload is None or fail:
+                    self.send_response(404 if path not in fake.routes else 503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = f'"{fake.versions[path]}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, path):
+        return sum(1 for h in self.hits if h[0] == path)
+
+ZONES = {'data': [{'id': 1, 'name': 'VIP'}, {'id': 2, 'name': 'Общий зал'}]}
+LINKS = [{'pc_number': 'PC1', 'packets_type_PC': 1}, {'name': ' 7 ', 'packets_type_PC': 2},
+         {'pc_number': '9', 'packets_type_PC': 99}]
+ROUTES = {time_anal.ZONES_ENDPOINT: ZONES, time_anal.LINKS_ENDPOINT: LINKS}
+
+def test_fetch_metadata_concurrent_and_cached():
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeLangame(ROUTES, delay={p: 0.3 for p in ROUTES}) as api:
+        # Registered as the process-wide client of this URL, so fetch_metadata reuses it
+        time_anal.API_KEY = 'key'
+        client = get_client(api.url, 'key', cache_dir=tmp)
+        t0 = time.perf_counter()
+        lists = client.get_lists(list(ROUTES))
+        assert time.perf_counter() - t0 < 0.55  # two 0.3 s endpoints in parallel, not in sequence
+        assert lists[time_anal.ZONES_ENDPOINT] == ZONES['data'] and lists[time_anal.LINKS_ENDPOINT] == LINKS
+
+        # Fresh cache: the second run does not touch the network at all
+        hits = len(api.hits)
+        assert client.get_lists(list(ROUTES)) == lists and len(api.hits) == hits
+
+        # Through time_anal: same result shape as before
+        zones, pc_map = time_anal.fetch_metadata(api.url)
+        assert zones == {1: 'VIP', 2: 'Общий зал'} and pc_map == {'pc1': 1, '7': 2}
+        assert len(api.hits) == hits
+
+    # A club on another Langame account sends its own key
+    with tempfile.TemporaryDirectory() as tmp, FakeLangame(ROUTES) as api:
+        get_client(api.url, 'club-key', cache_dir=tmp)
+        assert time_anal.fetch_metadata(api.url, api_key='club-key') == (zones, pc_map)
+        assert {h[4] for h in api.hits} == {'club-key'}
+
+def test_revalidation_and_stale_fallback():
+    with tempfile.TemporaryDirectory() as tmp:
+        with FakeLangame(ROUTES) as api:
+            client = LangameClient(api.url, 'key', cache_dir=tmp, ttl=0)
+            path = time_anal.ZONES_ENDPOINT
+            assert client.get_list(path) == ZONES['data']
+            # Expired entry: conditional request, 304 keeps the cached body
+            assert client.get_list(path) == ZONES['data']
+            assert api.hits[-1][2] == '"1"'
+            # Changed upstream: new ETag, new body
+            api.routes[path] = {'data': [{'id': 3, 'name': 'PRO'}]}
+            api.versions[path] = 2
+            assert client.get_list(path) == [{'id': 3, 'name': 'PRO'}]
+            url = api.url
+        # Server gone: the stale copy is used instead of an empty result
+        offline = LangameClient(url, 'key', cache_dir=tmp, ttl=0, retries=0, timeout=0.5)
+        assert offline.get_list(path) == [{'id': 3, 'name': 'PRO'}]
+        assert offline.get_list('/never/cached') == []
+
+def test_retry_and_timeout():
+    slow, flaky = '/slow', '/flaky'
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeLangame({slow: [1], flaky: [2]}, delay={slow: 1.5}, failures={flaky: 2}) as api:
+        client = LangameClient(api.url, 'key', cache_dir=tmp, retries=2, backoff=0.01, timeout=0.3)
+        # Two 503 answers, then success on the third attempt
+        assert client.get_list(flaky) == [2] and api.count(flaky) == 3
+        # A hung endpoint gives up after timeout * (retries + 1) instead of blocking the run
+        t0 = time.perf_counter()
+        assert client.get_list(slow) == []
+        assert time.perf_counter() - t0 < 1.5
+
+if __name__ == "__main__":
+    test_fetch_metadata_concurrent_and_cached()
+    test_revalidation_and_stale_fallback()
+    test_retry_and_timeout()
+    print("✅ All tests passed")
@@ -0,0 +1,115 @@
+import os
+import tempfile
+
+import pandas as pd
+import requests
+
+import api_sales
+from anal import analyze_sales
+from api_client import LangameClient
+from ingest import SALES_COLUMNS, normalize_sales_frame
+from test_anal import PC_MAP, assert_close, make_sales
+from test_api_client import FakeLangame
+
+def as_records(df, first_id=1):
+    """Export rows -> API purchase records with ISO dates."""
+    columns = {col: key for key, col in api_sales.FIELD_MAP.items()}
+    records = []
+    for i, row in enumerate(df.to_dict('records')):
+        rec = {'id': first_id + i}
+        for col, value in row.items():
+            if pd.isna(value):
+                value = None
+            elif col in api_sales.DATE_COLUMNS:
+                value = pd.to_datetime(value, dayfirst=True).isoformat()
+            rec[columns[col]] = value
+        records.append(rec)
+    return records
+
+def sales_route(records, fail_pages=()):
+    """Paged sales endpoint: date_from filter, page/per_page, 'pages' in the answer."""
+    fail_pages = set(fail_pages)
+
+    def route(query):
+        page, per_page = int(query['page']), int(query['per_page'])
+        if page in fail_pages:
+            fail_pages.discard(page)
+            return None
+        rows = [r for r in records if not query.get('date_from') or (r['date_buy'] or '') >= query['date_from']]
+        rows.sort(key=lambda r: r['date_buy'] or '')
+        return {'data': rows[(page - 1) * per_page:page * per_page], 'pages': max(1, -(-len(rows) // per_page))}
+    return route
+
+def analyze(df):
+    return analyze_sales(df, PC_MAP, mode='columnar')
+
+def test_sync_matches_export():
+    records = as_records(make_sales())
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeLangame({api_sales.SALES_ENDPOINT: sales_route(records)}) as api:
+        client = LangameClient(api.url, 'key', cache_dir=tmp)
+        result = api_sales.sync_sales(api.url, 'key', page_size=3, workers=2, cache_dir=tmp, client=client)
+        assert result['fetched'] == len(records) and result['pages'] == 3
+
+        df = api_sales.read_api_sales(api.url, cache_dir=tmp)
+        assert len(df) == len(records)
+        assert_close(analyze(df)[0], analyze(normalize_sales_frame(make_sales()))[0])
+
+        records += as_records(make_sales().iloc[:2].assign(**{
+            'Дата покупки тарифа': '20.10.2025 12:00', 'Дата активации сессии': '20.10.2025 12:00'}), first_id=100)
+        result = api_sales.sync_sales(api.url, 'key', page_size=3, workers=2, cache_dir=tmp, client=client)
+        # New purchases: requested from one LOOKBACK before the cursor
+        assert api.hits[-1][3]['date_from'] == '2025-10-12T09:00:00'
+        assert result['fetched'] == 3 + 2 and result['cursor'] == '2025-10-20T12:00:00'
+        assert len(api_sales.read_api_sales(api.url, cache_dir=tmp)) == len(records)
+
+def test_sync_resumes_after_failure():
+    records = as_records(make_sales())
+    route = sales_route(records, fail_pages=[2])
+    with tempfile.TemporaryDirectory() as tmp, FakeLangame({api_sales.SALES_ENDPOINT: route}) as api:
+        client = LangameClient(api.url, 'key', cache_dir=tmp, retries=0)
+        failed = False
+        try:
+            api_sales.sync_sales(api.url, 'key', page_size=3, workers=1, cache_dir=tmp, client=client)
+        except requests.RequestException:
+            failed = True
+        assert failed
+        # The first window is kept and the cursor points at its last purchase
+        state = api_sales.load_state(api_sales.store_dir(api.url, tmp))
+        assert state['cursor'] == '2025-10-06T16:30:00'
+
+        api_sales.sync_sales(api.url, 'key', page_size=3, workers=1, cache_dir=tmp, client=client)
+        assert api.hits[-1][3]['date_from'] == '2025-10-05T16:30:00'
+        df = api_sales.read_api_sales(api.url, cache_dir=tmp)
+        assert len(df) == len(records)
+
+def test_running_sessions_refresh_and_parts_compact():
+    records = as_records(make_sales())
+    columns = SALES_COLUMNS + [api_sales.RECORD_ID]
+    old_limit = api_sales.COMPACT_PARTS
+    api_sales.COMPACT_PARTS = 2
+    try:
+        with tempfile.TemporaryDirectory() as tmp, \
+                FakeLangame({api_sales.SALES_ENDPOINT: sales_route(records)}) as api:
+            client = LangameClient(api.url, 'key', cache_dir=tmp)
+            api_sales.sync_sales(api.url, 'key', page_size=1, workers=1, cache_dir=tmp, client=client)
+            path = api_sales.store_dir(api.url, tmp)
+            assert len(api_sales._parts(path)) == 1
+
+            # Bought 10.13 07:30, before the cursor; still running at the first sync, ended since
+            records[4]['date_end'] = '2025-10-13T11:00:00'
+            api_sales.sync_sales(api.url, 'key', page_size=10, workers=1, cache_dir=tmp, client=client)
+            assert [os.path.basename(p) for p in api_sales._parts(path)] == ['part-00001.parquet', 'part-00002.parquet']
+
+            df = api_sales.read_api_sales(api.url, columns, cache_dir=tmp)
+            assert len(df) == len(records)
+            end = df.loc[df[api_sales.RECORD_ID] == '5', 'Дата завершения сессии'].iloc[0]
+            assert end == pd.Timestamp('2025-10-13 11:00')
+    finally:
+        api_sales.COMPACT_PARTS = old_limit
+
+if __name__ == "__main__":
+    test_sync_matches_export()
+    test_sync_resumes_after_failure()
+    test_running_sessions_refresh_and_parts_compact()
+    print("✅ All tests passed")
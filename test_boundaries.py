@@ -0,0 +1,55 @@
+import numpy as np
+
+import boundaries
+from time_anal import TIME_TARIFFS, generate_recommendations, merge_by_rank, rebin
+
+def test_scan_matches_brute_force():
+    rng = np.random.default_rng(7)
+    earlier, later = rng.normal(size=(3, 1440)), rng.normal(size=(3, 1440))
+    cutoffs = [0, 17 * 60, 1439]
+    shifts, totals = boundaries.scan(cutoffs, earlier, later, max_shift=90)
+
+    for k, c in enumerate(cutoffs):
+        for j, s in enumerate(shifts):
+            minutes = np.arange(c + s, c) % 1440 if s < 0 else np.arange(c, c + s) % 1440
+            expected = (earlier if s < 0 else later)[k, minutes].sum()
+            assert abs(totals[k, j] - expected) < 1e-9
+
+def test_morning_end_moves_to_demand_step():
+    # Busy evenings from 18:00, quiet before (ten days alike): the evening price should start at the rush
+    hours = [h + m / 60 for h in range(10, 24) for m in range(0, 60, 2 if h >= 18 else 30)]
+    rush = 10 * np.bincount(np.rint(np.array(hours) * 60).astype(np.int64), minlength=1440)
+    assert rebin(rush, 24).tolist() == [0] * 10 + [20] * 8 + [300] * 6
+    minutes = {t: rush if t == '1_HOUR' else np.zeros(1440, dtype=np.int64) for t in TIME_TARIFFS}
+    stats = {'Зал': {'type': 'STANDARD', 'minutes': minutes, 'by_day': {'будни': minutes}}}
+    prices = {'зал ': {'1_HOUR': {'будни': {'day': 100.0, 'evening': 150.0}}}}
+
+    recs = generate_recommendations(stats, prices)
+    assert len(recs) == 1 and recs[0]['priority'] > 0
+    # The day price takes in the last quiet purchase (17:30) and stops before the rush
+    assert recs[0]['msg'].endswith("(будни)") and "17:30" < recs[0]['msg'].split("→ ")[1][:5] <= "18:00"
+
+def test_negligible_gain_not_reported():
+    # One weekday purchase at 16:59 in an empty zone: pulling the evening price onto it earns 50 ₽ from 1 check
+    minutes = {t: np.zeros(1440, dtype=np.int64) for t in TIME_TARIFFS}
+    minutes['1_HOUR'][16 * 60 + 59] = 1
+    stats = {'Зал': {'type': 'STANDARD', 'minutes': minutes,
+                     'by_day': {'будни': minutes, 'выходные': {t: np.zeros(1440, dtype=np.int64) for t in TIME_TARIFFS}}}}
+    prices = {'Зал': {'1_HOUR': {'будни': {'day': 100.0, 'evening': 150.0}}}}
+
+    best = boundaries.optimize(boundaries.boundary_rows('Зал', 'будни', minutes, prices['Зал'], {'1_HOUR': {'morning_end': 17}}))
+    assert best[0]['gain'] > 0 and not boundaries.significant(best[0])
+    assert generate_recommendations(stats, prices) == []
+
+def test_rubles_do_not_bury_check_counts():
+    boundary = [{'msg': f'b{p}', 'priority': p} for p in (5000.0, 300.0, 40.0)]
+    demand = [{'msg': f'd{p}', 'priority': p} for p in (3, 12)]
+    order = [r['msg'] for r in merge_by_rank(boundary, demand)]
+    assert order == ['b5000.0', 'd12', 'b300.0', 'b40.0', 'd3']
+
+if __name__ == "__main__":
+    test_scan_matches_brute_force()
+    test_morning_end_moves_to_demand_step()
+    test_negligible_gain_not_reported()
+    test_rubles_do_not_bury_check_counts()
+    print("✅ All tests passed")
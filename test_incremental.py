@@ -0,0 +1,34 @@
+import pandas as pd
+
+import incremental
+from anal import analyze_sales
+from test_anal import PC_MAP, assert_close, make_sales
+
+def test_incremental_matches_full_run():
+    full = make_sales()
+    first = full.iloc[:5]  # up to 13.10 07:30; one more row of that minute arrives later
+
+    extra = full.iloc[[4]].copy()
+    extra['ПК'] = '1'
+    full = pd.concat([full, extra], ignore_index=True)
+
+    state = incremental.empty_state()
+    assert incremental.update_state(state, first.copy(), PC_MAP) == 5
+    assert incremental.update_state(state, full.copy(), PC_MAP) == 3
+    assert incremental.update_state(state, full.copy(), PC_MAP) == 0
+    assert state['hwm'] == pd.Timestamp('2025-10-13 09:00')
+
+    for peak_mode in ('sweep', 'bucket'):
+        expected = analyze_sales(full.copy(), PC_MAP, peak_mode=peak_mode)
+        for a, b in zip(incremental.state_results(state, peak_mode), expected):
+            assert_close(a, b)
+
+def test_tail_keeps_running_sessions():
+    state = incremental.empty_state()
+    incremental.update_state(state, make_sales().iloc[[2]].copy(), PC_MAP)
+    assert len(state['tail']) == 1  # night session ends after its own purchase time
+
+if __name__ == "__main__":
+    test_incremental_matches_full_run()
+    test_tail_keeps_running_sessions()
+    print("✅ All tests passed")
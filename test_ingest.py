@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+import pandas as pd
+
+import ingest
+
+def make_export(path):
+    pd.DataFrame({
+        'Название тарифа': ['3 часа', 'Базовый тариф'],
+        'Тип тарифа': ['Пакет', 'Базовый тариф'],
+        'Дата покупки тарифа': ['21.12.2025 13:46', '01.10.2025 02:48'],
+        'Дата активации сессии': ['21.12.2025 13:46', '01.10.2025 02:48'],
+        'Дата завершения сессии': [None, '01.10.2025 03:24'],
+        'Номер телефона гостя': [9941485903, 9999024797],
+        'ПК': ['30', 'PS VIP'],
+        'Списано рублей': [493, 90],
+        'Списано бонусов': [87, 0],
+    }).to_excel(path, index=False)
+
+def test_cache_roundtrip():
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'sales.xlsx')
+        cache_dir = os.path.join(tmp, 'cache')
+        make_export(src)
+
+        df = ingest.read_sales(src, cache_dir=cache_dir)
+        assert 'Тип тарифа' not in df.columns
+        assert pd.api.types.is_datetime64_any_dtype(df['Дата покупки тарифа'])
+        assert df['Дата покупки тарифа'][1] == pd.Timestamp('2025-10-01 02:48')
+        assert pd.isna(df['Дата завершения сессии'][0])
+        assert list(df['ПК']) == ['30', 'PS VIP']
+        assert isinstance(df['Название тарифа'].dtype, pd.CategoricalDtype)
+
+        cached = [f for f in os.listdir(cache_dir) if f.endswith('.parquet')]
+        assert len(cached) == 1
+
+        part = ingest.read_sales(src, columns=['ПК', 'Списано рублей', 'Нет такой'], cache_dir=cache_dir)
+        assert list(part.columns) == ['ПК', 'Списано рублей']
+        assert [f for f in os.listdir(cache_dir) if f.endswith('.parquet')] == cached
+
+def test_chunks_match_cached_frame():
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'sales.xlsx')
+        make_export(src)
+
+        chunks = list(ingest.iter_sales_chunks(src, chunk_size=1))
+        assert len(chunks) == 2
+        streamed = pd.concat(chunks, ignore_index=True)
+        cached = ingest.read_sales(src, cache_dir=os.path.join(tmp, 'cache'))
+        pd.testing.assert_frame_equal(streamed, cached, check_dtype=False, check_categorical=False)
+
+def test_decode_column_once_per_value():
+    calls = []
+    def classify(v):
+        calls.append(v)
+        return str(v).upper()
+
+    values = pd.Series(['a', 'b', None, 'a', 'b', 'a'], dtype='category')
+    assert list(ingest.decode_column(values, classify)) == ['A', 'B', 'NAN', 'A', 'B', 'A']
+    assert len(calls) == 3
+
+    first, second = ingest.decode_pairs(pd.Series([1, 2, 1]), lambda v: (v, -v))
+    assert list(first) == [1, 2, 1] and list(second) == [-1, -2, -1]
+
+if __name__ == "__main__":
+    test_cache_roundtrip()
+    test_chunks_match_cached_frame()
+    test_decode_column_once_per_value()
+    print("✅ All tests passed")
@@ -0,0 +1,36 @@
+import json
+import os
+import tempfile
+
+import instrument
+from anal import analyze_sales
+from test_anal import PC_MAP, make_sales
+
+def test_run_log():
+    with tempfile.TemporaryDirectory() as tmp:
+        instrument.start_run('test', memory=True, profile_stage='classify_sales', log_dir=tmp)
+        analyze_sales(make_sales(), PC_MAP)
+        path = instrument.finish_run()
+        with open(path, encoding='utf-8') as f:
+            log = json.load(f)
+        stages = {s['stage']: s for s in log['stages']}
+        assert os.path.exists(stages['classify_sales']['profile'])
+
+    assert log['dropped'] == {'dropped_unparseable_date': 1, 'dropped_unmapped_pc': 1,
+                              'dropped_unknown_tariff': 1, 'defaulted_end_time': 2}
+    assert (stages['parse_sales_dates']['rows_in'], stages['parse_sales_dates']['rows_out']) == (8, 7)
+    assert (stages['classify_sales']['rows_in'], stages['classify_sales']['rows_out']) == (7, 5)
+    assert all(s['seconds'] >= 0 and s['peak_mb'] >= 0 for s in log['stages'])
+    assert instrument.current_run() is None
+
+def test_no_run_is_transparent():
+    assert instrument.current_run() is None
+    with instrument.stage('anything', rows_in=3) as st:
+        st['rows_out'] = 1
+    instrument.count('dropped_unmapped_pc', 5)
+    assert analyze_sales(make_sales(), PC_MAP)[0].total('count') == 5
+
+if __name__ == "__main__":
+    test_run_log()
+    test_no_run_is_transparent()
+    print("✅ All tests passed")
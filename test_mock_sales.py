@@ -0,0 +1,35 @@
+import pandas as pd
+
+from anal import analyze_sales, normalize_name
+from create_mock_sales import AUTOSIM_ZONE, generate_price, generate_sales, zone_layout
+
+def test_layout_and_price():
+    layout = zone_layout(40, 4)
+    assert list(layout)[-1] == AUTOSIM_ZONE
+    assert sum(len(pcs) for pcs in layout.values()) == 40
+
+    price = generate_price(layout)
+    assert set(price['тип дня недели']) == {'будни', 'выходные'}
+    assert set(price['Тариф'][price['Название'] == AUTOSIM_ZONE]) == {'Автосим 1 час', 'Автосим 2 часа', 'Автосим 3 часа'}
+
+def test_generated_sales_analyze():
+    layout = zone_layout(30, 3)
+    sales = generate_sales(layout, n_days=14, sessions_per_day=50, seed=1)
+    assert 500 < len(sales) < 900
+    assert sales['Название тарифа'].value_counts().index[0] == 'Базовый тариф'
+
+    buy = pd.to_datetime(sales['Дата покупки тарифа'], dayfirst=True)
+    end = pd.to_datetime(sales['Дата завершения сессии'], dayfirst=True)
+    night = sales['Название тарифа'] == 'Ночь (22:00-8:00)'
+    assert (buy[night].dt.hour >= 21).all()
+    assert (end[night].dt.date > buy[night].dt.date).any()
+
+    pc_map = {normalize_name(pc): zone for zone, pcs in layout.items() for pc in pcs}
+    stats = analyze_sales(sales, pc_map)[0]
+    assert stats.total('count') > 0.9 * len(sales)
+    assert set(stats) == set(layout)
+
+if __name__ == "__main__":
+    test_layout_and_price()
+    test_generated_sales_analyze()
+    print("✅ All tests passed")
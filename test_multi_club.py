@@ -0,0 +1,38 @@
+import json
+import os
+import shutil
+import tempfile
+
+import multi_club
+from test_anal import make_sales
+
+def test_network_run():
+    with tempfile.TemporaryDirectory() as tmp:
+        clubs = []
+        for name, rows in (('a', slice(0, 4)), ('b', slice(2, None))):
+            os.makedirs(os.path.join(tmp, name))
+            make_sales().iloc[rows].to_excel(os.path.join(tmp, name, 'sales.xlsx'), index=False)
+            shutil.copy('price.xlsx', os.path.join(tmp, name, 'price.xlsx'))
+            clubs.append({'club': name, 'sales': f'{name}/sales.xlsx', 'price': f'{name}/price.xlsx'})
+        clubs.append({'club': 'broken', 'sales': 'a/missing.xlsx', 'price': 'a/price.xlsx'})
+        with open(os.path.join(tmp, 'clubs.json'), 'w', encoding='utf-8') as f:
+            json.dump(clubs, f)
+
+        cwd = os.getcwd()
+        os.chdir(tmp)  # keeps the cache of the test inside tmp
+        try:
+            report = multi_club.run_network(multi_club.load_manifest('clubs.json'), max_workers=2)
+        finally:
+            os.chdir(cwd)
+
+    assert list(report['clubs']) == ['a', 'b'] and list(report['errors']) == ['broken']
+    a, b, net = report['clubs']['a'], report['clubs']['b'], report['network']
+    assert net['checks'] == a['checks'] + b['checks']
+    assert net['revenue'] == a['revenue'] + b['revenue']
+    # 9990000001 buys in both clubs: a repeat guest of the network, not of either club alone
+    assert net['cross_club_guests'] >= 1
+    assert net['guests'] < a['guests'] + b['guests']
+
+if __name__ == "__main__":
+    test_network_run()
+    print("✅ All tests passed")
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from anal import _accumulate_occupancy
+from occupancy import (align_cube, merge_cubes, minute_deltas, occupancy_cube, peak_concurrency, peaks_from_deltas,
+                       sum_cubes, weekend_mask)
+
+def make_sessions():
+    starts = pd.to_datetime(['2025-10-06 10:15:00', '2025-10-10 22:05:00', '2025-10-06 10:59:30', '2025-10-07 09:00:00'])
+    ends = pd.to_datetime(['2025-10-06 11:40', '2025-10-11 07:55', '2025-10-06 11:00', '2025-10-07 09:00'])
+    return starts, ends, np.array([0, 0, 1, 1])
+
+def test_cube_matches_hourly_loop():
+    starts, ends, zone_ids = make_sessions()
+    zones = ['A', 'B']
+    expected = {}
+    for s, e, z in zip(starts, ends, zone_ids):
+        _accumulate_occupancy(expected, zones[z], s, e)
+
+    dates, cube = occupancy_cube(starts, ends, zone_ids, len(zones))
+    days = [str(d) for d in dates]
+
+    # Every occupied (day, zone) cell of the cube is a daily_occupancy entry and vice versa
+    got = {(days[d], zones[z]) for d, z in zip(*np.nonzero(cube.sum(axis=2) > 0))}
+    assert got == {(d_str, z) for d_str, zones_data in expected.items() for z in zones_data}
+    for d_str, zones_data in expected.items():
+        for z, hours in zones_data.items():
+            assert np.allclose(cube[days.index(d_str), zones.index(z)], [hours[h] for h in range(24)])
+
+def test_cube_minutes():
+    starts, ends, zone_ids = make_sessions()
+    dates, cube = occupancy_cube(starts, ends, zone_ids, 2)
+    assert str(dates[0]) == '2025-10-06' and len(dates) == 6
+    assert cube[0, 0, 10] == 45 and cube[0, 0, 11] == 40
+    assert cube[0, 1, 10] == 0.5
+    assert cube[4, 0, 23] == 60 and cube[5, 0, 7] == 55
+    assert cube.sum() == 85 + 590 + 0.5
+
+def test_cube_zero_length_sessions():
+    s = pd.to_datetime(['2025-10-06 10:15:00'])
+    for ends in (s, s - pd.Timedelta(minutes=5)):
+        dates, cube = occupancy_cube(s, ends, np.array([0]), 1)
+        assert len(dates) == 0 and cube.shape == (0, 1, 24)
+
+def test_weekend_mask():
+    dates = np.array(['2025-10-06', '2025-10-10', '2025-10-12'], dtype='datetime64[D]')
+    mask = weekend_mask(dates)
+    assert mask[0, 7] and not mask[0, 8]
+    assert not mask[1, 16] and mask[1, 17]
+    assert mask[2].all()
+
+def test_peak_concurrency_matches_minute_scan():
+    rng = np.random.default_rng(7)
+    n = 300
+    base = np.datetime64('2025-10-06T00:00', 'm')
+    starts = base + rng.integers(0, 3 * 1440, n).astype('timedelta64[m]')
+    ends = starts + rng.integers(0, 600, n).astype('timedelta64[m]')
+    zone_ids = rng.integers(0, 3, n)
+
+    dates, cube = occupancy_cube(starts, ends, zone_ids, 3)
+    peaks = peak_concurrency(starts, ends, zone_ids, 3, dates)
+
+    n_mins = len(dates) * 1440
+    level = np.zeros((3, n_mins), dtype=int)
+    s = (starts - base).astype(int)
+    e = (ends - base).astype(int)
+    for a, b, z in zip(s, e, zone_ids):
+        level[z, a:b] += 1
+    expected = level.reshape(3, len(dates), 24, 60).max(axis=3).transpose(1, 0, 2)
+    assert (peaks == expected).all()
+
+def test_peak_back_to_back_sessions():
+    starts = pd.to_datetime(['2025-10-06 10:00:00', '2025-10-06 11:00:00', '2025-10-06 10:30:00'])
+    ends = pd.to_datetime(['2025-10-06 11:00:00', '2025-10-06 12:00:00', '2025-10-06 10:45:00'])
+    dates, cube = occupancy_cube(starts, ends, [0, 0, 0], 1)
+    peaks = peak_concurrency(starts, ends, [0, 0, 0], 1, dates)
+    assert peaks[0, 0, 10] == 2 and peaks[0, 0, 11] == 1
+    assert cube[0, 0, 10] == 75
+
+def test_minute_deltas_merge_in_any_order():
+    rng = np.random.default_rng(11)
+    n = 200
+    base = np.datetime64('2025-10-06T00:00', 'm')
+    starts = base + rng.integers(0, 4 * 1440, n).astype('timedelta64[m]')
+    ends = starts + rng.integers(1, 700, n).astype('timedelta64[m]')
+    zone_ids = rng.integers(0, 2, n)
+
+    dates, cube = occupancy_cube(starts, ends, zone_ids, 2)
+    expected = peak_concurrency(starts, ends, zone_ids, 2, dates)
+
+    acc = (np.array([], dtype='datetime64[D]'), [], np.zeros((0, 0, 1440), dtype=np.int32))
+    parts = []
+    for part in np.array_split(rng.permutation(n), 5):
+        d, deltas = minute_deltas(starts[part], ends[part], zone_ids[part], 2)
+        acc = merge_cubes(acc, (d, [0, 1], deltas))
+        parts.append((d, [0, 1], deltas))
+    peaks = align_cube((acc[0], acc[1], peaks_from_deltas(acc[2])), dates, [0, 1])
+    assert (peaks == expected).all()
+
+    # One allocation for all parts gives the same cube as merging them one by one
+    summed = sum_cubes(parts)
+    assert (summed[0] == acc[0]).all() and summed[1] == acc[1] and (summed[2] == acc[2]).all()
+
+if __name__ == "__main__":
+    test_cube_matches_hourly_loop()
+    test_cube_minutes()
+    test_cube_zero_length_sessions()
+    test_weekend_mask()
+    test_peak_concurrency_matches_minute_scan()
+    test_peak_back_to_back_sessions()
+    test_minute_deltas_merge_in_any_order()
+    print("✅ All tests passed")
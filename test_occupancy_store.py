@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import occupancy_store
+from anal import analyze_sessions
+from pipeline import build_session_table
+from test_anal import PC_MAP, assert_close, make_sales
+
+def priced_sessions():
+    table = build_session_table(make_sales(), PC_MAP)
+    return table[table['in_price']]
+
+def test_daily_appends_match_full_analysis():
+    sessions = priced_sessions()
+    ref = analyze_sessions(sessions)
+    days = pd.date_range(sessions['dt_start'].min().normalize(), sessions['dt_start'].max().normalize())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for bins in (24, 1440):
+            path = os.path.join(tmp, str(bins))
+            # Each run only knows the sessions started up to that day
+            for day in days:
+                occupancy_store.append_sessions(sessions[sessions['dt_start'] < day + pd.Timedelta(days=1)],
+                                                path, bins=bins)
+
+            cube = occupancy_store.OccupancyCube(path)
+            group_stats, glob_max = occupancy_store.reduce_cube(cube, chunk_days=2)
+            assert_close(group_stats, ref[2])
+            assert_close(glob_max, ref[3])
+
+            # Night session 10.10 22:05 - 11.10 07:55: one day slice without loading the rest
+            dates, night = cube.slice('zones', '2025-10-11', '2025-10-11', names=['ОБЩИЙ ЗАЛ'])
+            assert len(dates) == 1 and abs(night.sum() - (7 * 60 + 55)) < 1e-3
+
+def test_index_grows_past_slots():
+    sessions = priced_sessions()
+    with tempfile.TemporaryDirectory() as tmp:
+        old_slots = occupancy_store.ZONE_SLOTS, occupancy_store.PC_SLOTS
+        occupancy_store.ZONE_SLOTS, occupancy_store.PC_SLOTS = 1, 1
+        try:
+            first = sessions[sessions['zone'] == 'ОБЩИЙ ЗАЛ']
+            occupancy_store.append_sessions(first, tmp)
+            occupancy_store.append_sessions(sessions, tmp, since=sessions['dt_start'].min())
+        finally:
+            occupancy_store.ZONE_SLOTS, occupancy_store.PC_SLOTS = old_slots
+
+        cube = occupancy_store.OccupancyCube(tmp)
+        assert cube.meta['zone_slots'] == 2 and cube.meta['zones'][0] == 'ОБЩИЙ ЗАЛ'
+        hours = occupancy_store.pc_hours(cube)
+        expected = ((sessions['dt_end'] - sessions['dt_start']).dt.total_seconds() / 3600).groupby(sessions['pc']).sum()
+        assert np.allclose([hours[pc] for pc in expected.index], expected.to_numpy(), atol=1e-4)
+
+if __name__ == "__main__":
+    test_daily_appends_match_full_analysis()
+    test_index_grows_past_slots()
+    print("✅ All tests passed")
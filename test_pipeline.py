@@ -0,0 +1,62 @@
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from anal import analyze_sales, analyze_sessions
+from pipeline import build_session_table
+from test_anal import PC_MAP, assert_close, make_sales
+from time_anal import collect_time_stats, generate_report, time_stats_from_sessions
+
+def test_session_table_feeds_both_reports():
+    table = build_session_table(make_sales(), PC_MAP)
+    assert set(table['zone']) == {'ОБЩИЙ ЗАЛ', 'АВТОСИМУЛЯТОР', 'Main Hall (PCs)'}
+    assert table.loc[table['zone'] == 'АВТОСИМУЛЯТОР', 'zone_type'].iloc[0] == 'CONSOLE'
+    assert not table.loc[table['zone'] == 'Main Hall (PCs)', 'in_price'].any()
+
+    for a, b in zip(analyze_sessions(table[table['in_price']]), analyze_sales(make_sales(), PC_MAP)):
+        assert_close(a, b)
+
+    stats = time_stats_from_sessions(table)
+    assert np.flatnonzero(stats['ОБЩИЙ ЗАЛ']['minutes']['NIGHT']).tolist() == [22 * 60 + 5]
+    assert np.flatnonzero(stats['Main Hall (PCs)']['minutes']['1_HOUR']).tolist() == [9 * 60]
+    # Friday 22:05 is a weekend purchase
+    assert stats['ОБЩИЙ ЗАЛ']['by_day']['выходные']['NIGHT'][22 * 60 + 5] == 1
+    assert stats['ОБЩИЙ ЗАЛ']['by_day']['будни']['NIGHT'].sum() == 0
+    # Standalone time_anal names zones from price.xlsx the same way
+    direct = collect_time_stats(make_sales(), {}, {}, price_map=PC_MAP)
+    assert set(direct) == set(stats) and direct['АВТОСИМУЛЯТОР']['type'] == 'CONSOLE'
+
+def test_time_stats_match_without_price_config():
+    table = build_session_table(make_sales(), {})
+    a, b = time_stats_from_sessions(table), collect_time_stats(make_sales(), {}, {})
+    assert list(a) == list(b)
+    for z in a:
+        assert a[z]['type'] == b[z]['type'] and 'tariffs' not in a[z]
+        for t in a[z]['minutes']:
+            assert np.array_equal(a[z]['minutes'][t], b[z]['minutes'][t])
+            assert np.array_equal(sum(d[t] for d in a[z]['by_day'].values()), a[z]['minutes'][t])
+
+def test_time_report_payload():
+    stats = collect_time_stats(make_sales(), {}, {})
+    with tempfile.TemporaryDirectory() as tmp:
+        pages = {}
+        for mode in ('consolidated', 'figures'):
+            generate_report(stats, [], out_path=os.path.join(tmp, f'{mode}.html'), mode=mode)
+            with open(os.path.join(tmp, f'{mode}.html'), encoding='utf-8') as f:
+                pages[mode] = f.read()
+
+    charts = json.loads(re.search(r"const TIME_CHARTS = (.*);", pages['consolidated']).group(1))
+    totals = [m.sum() for z in sorted(stats, key=lambda x: (stats[x]['type'], x)) for m in stats[z]['minutes'].values() if m.any()]
+    assert [sum(c[1]) for c in charts] == totals
+    assert all(np.array_equal(np.sum([s for _, s in c[3]], axis=0), c[1]) for c in charts)
+    assert all(len(c[1]) == 24 for c in charts)
+    assert pages['consolidated'].count("class='chart'") == pages['figures'].count('class="plotly-graph-div"') == len(charts)
+
+if __name__ == "__main__":
+    test_session_table_feeds_both_reports()
+    test_time_stats_match_without_price_config()
+    test_time_report_payload()
+    print("✅ All tests passed")
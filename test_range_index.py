@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from anal import analyze_sessions, classify_sales, parse_sales_dates
+from range_index import RangeIndex, range_max, sparse_max
+from test_anal import PC_MAP, assert_close, make_sales
+
+def test_range_max_matches_brute_force():
+    values = np.random.default_rng(0).integers(0, 100, size=(37, 3))
+    levels = sparse_max(values)
+    for i in range(37):
+        for j in range(i + 1, 38):
+            assert (range_max(levels, i, j) == values[i:j].max(axis=0)).all()
+
+def test_window_matches_filtered_run():
+    sessions = classify_sales(parse_sales_dates(make_sales()), PC_MAP)
+    index = RangeIndex.from_sessions(sessions)
+
+    for a, b in zip(index.results(), analyze_sessions(sessions)):
+        assert_close(a, b)
+
+    # Sales, retention and PC revenue count sessions started within the window
+    day = sessions['dt_start'].dt.normalize()
+    window = sessions[(day >= pd.Timestamp('2025-10-10')) & (day <= pd.Timestamp('2025-10-13'))]
+    got, expected = index.results('2025-10-10', '2025-10-13'), analyze_sessions(window)
+    for k in (0, 4, 5):
+        assert_close(got[k], expected[k])
+
+    assert index.sales_stats('2025-10-07', '2025-10-09').total('count') == 0
+    assert index.results('2030-01-01', None)[0].total('count') == 0
+
+if __name__ == "__main__":
+    test_range_max_matches_brute_force()
+    test_window_matches_filtered_run()
+    print("✅ All tests passed")
@@ -0,0 +1,31 @@
+import os
+import tempfile
+
+from report_writer import ReportWriter
+
+def test_streams_and_replaces_atomically():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'r.html')
+        parts = [f"<p>{i}</p>" for i in range(1000)]
+        with ReportWriter(path, buffer_chars=100) as out:
+            out.writelines(parts)
+            # Flushed as it goes: the buffer never holds more than ~buffer_chars
+            assert out._size < 100 and os.path.getsize(out.tmp) > 0
+            assert not os.path.exists(path)
+        with open(path, encoding='utf-8') as f:
+            assert f.read() == ''.join(parts)
+
+        # A failed render keeps the previous report and leaves no temp file
+        try:
+            with ReportWriter(path) as out:
+                out.write('broken')
+                raise ValueError
+        except ValueError:
+            pass
+        with open(path, encoding='utf-8') as f:
+            assert f.read() == ''.join(parts)
+        assert os.listdir(tmp) == ['r.html']
+
+if __name__ == "__main__":
+    test_streams_and_replaces_atomically()
+    print("✅ All tests passed")
@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+import store
+from anal import analyze_sales
+from pipeline import build_session_table
+from test_anal import PC_MAP, make_sales
+
+def test_store_queries():
+    table = build_session_table(make_sales(), PC_MAP)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'anal.sqlite')
+        store.write_store(db, table, {'version': store.STORE_VERSION})
+        assert store.read_meta(db) == {'version': str(store.STORE_VERSION)}
+
+        stats = analyze_sales(make_sales(), PC_MAP)[0]
+        revenue = store.zone_revenue(db_path=db)
+        assert revenue['count'].sum() == stats.total('count')
+        assert revenue['cash'].sum() == stats.total('cash')
+
+        weekend = store.zone_revenue('ОБЩИЙ ЗАЛ', '2025-10-01', '2025-10-31', 'выходные', db_path=db)
+        assert weekend['cash'].sum() == stats.sum('cash', zone='ОБЩИЙ ЗАЛ', d_type='выходные')
+
+        # Night session 10.10 22:05 - 11.10 07:55 on PC 1, clipped to 11.10
+        pc = store.pc_occupancy('1', '2025-10-11', '2025-10-11', db_path=db)
+        assert pc['minutes'].tolist() == [7 * 60 + 55]
+
+        occ = store.zone_occupancy('ОБЩИЙ ЗАЛ', db_path=db)
+        assert len(occ) == 24 and occ['peak'].max() >= 1
+
+        assert len(store.phone_history('9990000001', db_path=db)) == 2
+
+if __name__ == "__main__":
+    test_store_queries()
+    print("✅ All tests passed")
@@ -1,15 +1,29 @@
+import json
 import pandas as pd
-import requests
+import numpy as np
 import os
 import plotly.graph_objects as go
 import datetime
 from dotenv import load_dotenv
 
+import boundaries
+import instrument
+from anal import get_day_types
+from api_client import get_client
+from ingest import CHUNK_SIZE, decode_column, decode_pairs, iter_sales_chunks, read_sales
+from report_writer import ReportWriter
+from sales_cube import DAY_TYPES
+
 # --- SETTINGS ---
 load_dotenv()
 API_KEY = os.getenv("LANGAME_API_KEY") or "ВСТАВЬТЕ_ВАШ_КЛЮЧ"
 FILE_NAME = 'Покупка пакетов.xlsx'
 BASE_URL = 'https://cyberx165.langame-pr.ru/public_api'
+# Графики отчета: 'consolidated' (гистограммы считаются заранее, один JSON, ленивая отрисовка)
+# или 'figures' (отдельный plotly-график с сырыми часами на каждый тариф, прежний вариант)
+REPORT_MODE = 'consolidated'
+# Столбцов в гистограмме: 24 (по часам) или 1440 (по минутам)
+REPORT_BINS = 24
 
 # --- HELPERS ---
 def format_time(h_float):
@@ -60,32 +74,26 @@ TARIFF_TYPE_MAP = {
     'базовый': '1_HOUR' # Assuming basic is 1 hour
 }
 
-def safe_request(endpoint):
-    headers = {'X-API-KEY': API_KEY, 'accept': 'application/json'}
-    try:
-        r = requests.get(f"{BASE_URL}{endpoint}", headers=headers)
-        if r.status_code != 200:
-            print(f"⚠️ Error {r.status_code} on {endpoint}")
-            return []
-        raw = r.json()
-        if isinstance(raw, list): return raw
-        return raw.get('data', raw.get('items', []))
-    except Exception as e:
-        print(f"⚠️ Exception on {endpoint}: {e}")
-        pass
-    return []
+def safe_request(endpoint, base_url=BASE_URL, api_key=None):
+    """List payload of one endpoint via the pooled, cached API client ([] on failure)."""
+    return get_client(base_url, api_key or API_KEY).get_list(endpoint)
+
+ZONES_ENDPOINT = "/global/types_of_pc_in_clubs/list"
+LINKS_ENDPOINT = "/global/linking_pc_by_type/list"
 
-def fetch_metadata():
+@instrument.staged(rows_out=lambda r: len(r[1]))
+def fetch_metadata(base_url=BASE_URL, api_key=None):
+    """Zones and PC links of a club; api_key defaults to API_KEY (other Langame accounts pass their own)."""
     print("🌐 Скачивание метаданных...")
     zones = {}
     pc_map = {}
 
-    # Try fetch, but don't fail if timeout
-    z_list = safe_request("/global/types_of_pc_in_clubs/list")
+    # Both endpoints are independent: fetched concurrently, from the disk cache while it is fresh
+    lists = get_client(base_url, api_key or API_KEY).get_lists([ZONES_ENDPOINT, LINKS_ENDPOINT])
+    z_list, l_list = lists[ZONES_ENDPOINT], lists[LINKS_ENDPOINT]
     if z_list:
         zones = {z['id']: z['name'] for z in z_list if 'id' in z}
 
-    l_list = safe_request("/global/linking_pc_by_type/list")
     if l_list:
         for l in l_list:
             num = str(l.get('pc_number') or l.get('name')).strip().lower()
@@ -95,89 +103,220 @@ def fetch_metadata():
 
     return zones, pc_map
 
-def analyze_time_distribution(file_path, zones, pc_map):
+def resolve_zone(pc_raw, zones, pc_map, price_map=None):
+    """
+    PC -> (zone name, zone type): price.xlsx zones (price_map from anal.load_config) first,
+    then the API links, then a name-based fallback.
+    """
+    pc = str(pc_raw).lower().strip()
+
+    if price_map and pc in price_map:
+        return price_map[pc], classify_zone(price_map[pc])
+
+    z_id = pc_map.get(pc)
+    if z_id and z_id in zones:
+        z_name = zones[z_id]
+        return z_name, classify_zone(z_name)
+
+    # Fallback Grouping Logic if API failed or PC not linked
+    if 'auto' in pc:
+        return "Auto Simulators", "CONSOLE"
+    if 'ps' in pc or 'vip' in pc or 'std' in pc:
+        # Group PS by their specific name if possible
+        return str(pc_raw).strip(), "CONSOLE" # Use original case
+    if pc.isdigit():
+        return "Main Hall (PCs)", "STANDARD"
+    return f"Other ({pc})", classify_zone(pc)
+
+@instrument.staged()
+def analyze_time_distribution(file_path, zones, pc_map, price_map=None):
     print("📂 Анализ времени покупок...")
     try:
-        df = pd.read_excel(file_path)
+        with instrument.stage('read_sales') as st:
+            df = read_sales(file_path, columns=['ПК', 'Название тарифа', 'Дата покупки тарифа'])
+            st['rows_out'] = len(df)
     except Exception as e:
         print(f"❌ Ошибка Excel: {e}")
         return None
 
-    df['dt_buy'] = pd.to_datetime(df['Дата покупки тарифа'], dayfirst=True, errors='coerce')
-    df = df.dropna(subset=['dt_buy'])
-
-    # Hour as float for precise binning (e.g. 13.9 is 13:54)
-    df['hour'] = df['dt_buy'].dt.hour + df['dt_buy'].dt.minute/60.0
+    return collect_time_stats(df, zones, pc_map, price_map=price_map)
 
-    # Data Structure:
-    # stats[ZoneName] = { 'type': 'STANDARD'/'CONSOLE', 'tariffs': { '1_HOUR': [], ... } }
+def analyze_time_distribution_stream(file_path, zones, pc_map, chunk_size=CHUNK_SIZE, price_map=None):
+    """Bounded-memory variant: folds the export into stats chunk by chunk."""
+    print("📂 Потоковый анализ времени покупок...")
     stats = {}
+    try:
+        for chunk in iter_sales_chunks(file_path, chunk_size, columns=['ПК', 'Название тарифа', 'Дата покупки тарифа']):
+            collect_time_stats(chunk, zones, pc_map, stats, price_map)
+    except Exception as e:
+        print(f"❌ Ошибка Excel: {e}")
+        return None
+    return stats
 
-    for _, row in df.iterrows():
-        pc = str(row.get('ПК')).lower().strip()
+TIME_TARIFFS = ['1_HOUR', '3_HOURS', '5_HOURS', 'NIGHT']
 
-        # Determine Zone Name and Type
-        z_name = "Unknown Zone"
-        z_type = "STANDARD"
+def tariff_type(t_name):
+    """Export tariff name -> TIME_TARIFFS code or None."""
+    t_name = str(t_name).lower()
+    for k, v in TARIFF_TYPE_MAP.items():
+        if k in t_name:
+            return v
+    return None
 
-        z_id = pc_map.get(pc)
-        if z_id and z_id in zones:
-            z_name = zones[z_id]
-            z_type = classify_zone(z_name)
-        else:
-            # Fallback Grouping Logic if API failed or PC not linked
-            if 'auto' in pc:
-                z_name = "Auto Simulators"
-                z_type = "CONSOLE"
-            elif 'ps' in pc or 'vip' in pc or 'std' in pc:
-                # Group PS by their specific name if possible
-                z_name = row.get('ПК').strip() # Use original case
-                z_type = "CONSOLE"
-            elif pc.isdigit():
-                z_name = "Main Hall (PCs)"
-                z_type = "STANDARD"
-            else:
-                z_name = f"Other ({pc})"
-                z_type = classify_zone(pc)
+def _count_hours(stats):
+    return int(sum(m.sum() for z in stats.values() for m in z['minutes'].values()))
 
+def fold_time_stats(zone, zone_type, t_code, dt_buy, stats=None):
+    """
+    Columnar core of the time stats: one row per purchase (arrays of equal length).
+    Every purchase gets one integer key (zone, tariff, day type, minute of the day) and all
+    histograms come from a single np.bincount. Adds to stats (a new dict if None):
+    stats[zone] = {'type', 'minutes': {t: counts (1440,)}, 'by_day': {d_type: {t: counts (1440,)}}}
+    Memory depends on the number of zones only, not on the number of purchases.
+    """
+    if stats is None: stats = {}
+    dt_buy = pd.Series(dt_buy).reset_index(drop=True)
+    z_codes, z_names = pd.factorize(pd.Series(zone, dtype=object))
+    z_types = pd.Series(zone_type, dtype=object).groupby(z_codes, sort=True).first().to_numpy()
+
+    for z_name, z_type in zip(z_names, z_types):
         if z_name not in stats:
             stats[z_name] = {
                 'type': z_type,
-                'tariffs': {'1_HOUR': [], '3_HOURS': [], '5_HOURS': [], 'NIGHT': []}
+                'minutes': {t: np.zeros(1440, dtype=np.int64) for t in TIME_TARIFFS},
+                'by_day': {d: {t: np.zeros(1440, dtype=np.int64) for t in TIME_TARIFFS} for d in DAY_TYPES}
             }
 
-        t_name = str(row.get('Название тарифа')).lower()
-        t_type = None
+    t_codes = pd.Categorical(t_code, categories=TIME_TARIFFS).codes
+    known = t_codes >= 0
+    instrument.count('dropped_unknown_tariff', int((~known).sum()))
+
+    minute = (dt_buy.dt.hour * 60 + dt_buy.dt.minute).to_numpy(dtype=np.int64)
+    d_codes = (get_day_types(dt_buy) == DAY_TYPES[1]).astype(np.int64)
+    n_t, n_d = len(TIME_TARIFFS), len(DAY_TYPES)
+    key = ((z_codes * n_t + t_codes) * n_d + d_codes) * 1440 + minute
+    counts = np.bincount(key[known], minlength=len(z_names) * n_t * n_d * 1440).reshape(len(z_names), n_t, n_d, 1440)
+
+    for z, z_name in enumerate(z_names):
+        entry = stats[z_name]
+        for t, t_name in enumerate(TIME_TARIFFS):
+            entry['minutes'][t_name] += counts[z, t].sum(axis=0)
+            for d, d_type in enumerate(DAY_TYPES):
+                entry['by_day'][d_type][t_name] += counts[z, t, d]
+    return stats
+
+@instrument.staged(rows_in=lambda df, *a, **kw: len(df), rows_out=_count_hours)
+def collect_time_stats(df, zones, pc_map, stats=None, price_map=None):
+    """
+    Adds purchase times of df to stats (a new dict if None) and returns it.
+    Zones resolve once per distinct PC (see resolve_zone) and tariffs once per distinct name.
+    """
+    dt_buy = pd.to_datetime(df['Дата покупки тарифа'], dayfirst=True, errors='coerce')
+    dated = dt_buy.notna().to_numpy()
+    instrument.count('dropped_unparseable_date', int((~dated).sum()))
 
-        for k, v in TARIFF_TYPE_MAP.items():
-            if k in t_name:
-                t_type = v
-                break
+    pcs = df['ПК'] if 'ПК' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    z_names, z_types = decode_pairs(pcs, lambda pc: resolve_zone(pc, zones, pc_map, price_map))
+    t_codes = decode_column(df['Название тарифа'], tariff_type)
+    return fold_time_stats(z_names[dated], z_types[dated], t_codes[dated], dt_buy[dated], stats)
 
-        if t_type and t_type in stats[z_name]['tariffs']:
-            stats[z_name]['tariffs'][t_type].append(row['hour'])
+@instrument.staged(rows_in=len, rows_out=_count_hours)
+def time_stats_from_sessions(sessions):
+    """
+    Same stats dict as collect_time_stats, built from the shared session table
+    (pipeline.build_session_table) instead of raw export rows.
+    """
+    rows = sessions.dropna(subset=['dt_buy'])
+    return fold_time_stats(rows['zone'].to_numpy(dtype=object), rows['zone_type'].to_numpy(dtype=object),
+                           rows['t_code'].to_numpy(dtype=object), rows['dt_buy'])
+
+def minute_hours(minutes):
+    """Per-minute counts -> purchase hours as floats (13.9 is 13:54), for plotly's own binning."""
+    return np.repeat(np.arange(1440) / 60.0, minutes)
+
+def rebin(minutes, bins=REPORT_BINS):
+    """Per-minute counts -> bins columns (24: per hour, 1440: unchanged)."""
+    return np.bincount(np.arange(1440) * bins // 1440, weights=minutes, minlength=bins).astype(np.int64)
+
+BOUNDARY_MSG = {
+    'morning_end': "Конец Утра → {time}",
+    'night_start': "Начало Ночи → {time}",
+    'night_end': "Конец Ночи → {time}",
+}
 
-    return stats
+def zone_prices(price_grid, z_name):
+    """price_grid entry of a zone: exact name first, then case/space-insensitive."""
+    if not price_grid: return None
+    if z_name in price_grid: return price_grid[z_name]
+    key = str(z_name).strip().lower()
+    return next((p for z, p in price_grid.items() if str(z).strip().lower() == key), None)
 
-def generate_recommendations(stats):
+def boundary_recommendations(stats, price_grid):
+    """
+    Minute-level boundary search (boundaries.py) for every priced zone, tariff and day type at once.
+    Returns (recommendations, {(zone, tariff)} whose morning cutoff was scored).
+    """
+    rows = []
+    for z_name, data in stats.items():
+        prices = zone_prices(price_grid, z_name)
+        if not prices: continue
+        rules = RULES.get(data['type'], RULES['STANDARD'])
+        for d_type, hists in data['by_day'].items():
+            rows += boundaries.boundary_rows(z_name, d_type, hists, prices, rules)
+    if price_grid and stats and not any(zone_prices(price_grid, z) for z in stats):
+        print("⚠️ Ни одна зона продаж не найдена в price.xlsx: границы по ценам не считаются, только эвристика спроса.")
+
+    recommendations = []
+    for r in boundaries.optimize(rows):
+        if not boundaries.significant(r): continue
+        day = f" ({r['d_type']})"
+        # Optimum at the edge of the search window: the real one is further away, the gain is a lower bound
+        edge = (" или раньше" if r['shift'] < 0 else " или позже") if r['at_edge'] else ""
+        recommendations.append({
+            'zone': r['zone'],
+            'tariff': r['tariff'],
+            'msg': BOUNDARY_MSG[r['boundary']].format(time=format_time(r['best'] / 60)) + edge + day,
+            'reason': f"Сейчас {format_time(r['cutoff'] / 60)}. Ожидаемо {r['gain']:+.0f} ₽ за период выгрузки, "
+                      f"другую цену заплатят {r['moved']} чек."
+                      + (f" Оптимум у края поиска (±{boundaries.MAX_SHIFT} мин), эффект оценен снизу." if edge else ""),
+            'priority': r['gain']
+        })
+    scored = {(r['zone'], r['tariff']) for r in rows if r['boundary'] == 'morning_end'}
+    return recommendations, scored
+
+def merge_by_rank(*groups):
+    """
+    Recommendation lists with incomparable 'priority' units in one list: each group is sorted
+    by its own priority and the groups interleave by relative rank (top of each group first).
+    """
+    ranked = []
+    for g, recs in enumerate(groups):
+        recs = sorted(recs, key=lambda x: x['priority'], reverse=True)
+        ranked += [((i + 1) / len(recs), g, r) for i, r in enumerate(recs)]
+    return [r for _, _, r in sorted(ranked, key=lambda x: x[:2])]
+
+@instrument.staged(rows_out=len)
+def generate_recommendations(stats, price_grid=None):
+    """
+    Priced zones (price_grid from anal.load_config) get the optimal cutoffs with the expected
+    revenue effect; tariffs without prices keep the hourly demand heuristic.
+    The two groups rank by different units (rubles vs checks) and are merged by rank.
+    """
+    boundary, scored = boundary_recommendations(stats, price_grid)
     recommendations = []
 
     for z_name, data in stats.items():
         z_type = data['type']
-        tariffs = data['tariffs']
 
         # Use rules based on Type
         rules = RULES.get(z_type, RULES['STANDARD'])
 
-        for t_type, hours in tariffs.items():
-            if not hours: continue
+        for t_type, minutes in data['minutes'].items():
+            total_sales = int(minutes.sum())
+            if not total_sales or (z_name, t_type) in scored: continue
 
             # 1. Histogram (24 bins)
-            hist = [0] * 24
-            for h in hours:
-                hist[int(h % 24)] += 1
-
-            total_sales = len(hours)
+            hist = rebin(minutes, 24).tolist()
 
             # --- MORNING CUTOFF ANALYSIS ---
             if t_type in rules and 'morning_end' in rules[t_type]:
@@ -225,12 +364,10 @@ def generate_recommendations(stats):
                 if night_peak > 10 and waiting_sales == 0:
                      pass
 
-    return sorted(recommendations, key=lambda x: x['priority'], reverse=True)
+    return merge_by_rank(boundary, recommendations)
 
-def generate_report(stats, recs):
-    print("🎨 Генерация отчета...")
-
-    html = """
+# Static parts of TIME_REPORT.html
+REPORT_HEAD = """
     <html>
     <head>
         <title>CyberX Time Analysis</title>
@@ -261,99 +398,171 @@ def generate_report(stats, recs):
                     <th>Причина</th>
                 </tr>
     """
-
-    if not recs:
-        html += "<tr><td colspan='4' style='text-align:center'>Временные границы выглядят оптимально.</td></tr>"
-    else:
-        for r in recs:
-            html += f"""
+REPORT_NO_RECS = "<tr><td colspan='4' style='text-align:center'>Временные границы выглядят оптимально.</td></tr>"
+REPORT_REC = """
             <tr>
-                <td>{r['zone']}</td>
-                <td>{r['tariff']}</td>
-                <td><span class="badge badge-warn">{r['msg']}</span></td>
-                <td>{r['reason']}</td>
+                <td>{zone}</td>
+                <td>{tariff}</td>
+                <td><span class="badge badge-warn">{msg}</span></td>
+                <td>{reason}</td>
             </tr>
-            """
-
-    html += "</table></div>"
-
-    # --- CHARTS ---
-    # Sort zones: Standard first, then Console
-    sorted_zones = sorted(stats.keys(), key=lambda x: (stats[x]['type'], x))
-
-    for z_name in sorted_zones:
-        z_data = stats[z_name]
-        z_type = z_data['type']
-        tariffs = z_data['tariffs']
-
-        html += f"<h2>{z_name} <span style='font-size:12px; color:#666'>({z_type})</span></h2>"
-        html += "<div style='display:flex; flex-wrap:wrap; gap:20px;'>"
-
-        # Determine rules for this zone type
-        current_rules = RULES.get(z_type, RULES['STANDARD'])
-
-        for t_type, hours in tariffs.items():
-            if not hours: continue
-
-            fig = go.Figure()
-
-            # Histogram
-            fig.add_trace(go.Histogram(
-                x=hours,
-                xbins=dict(start=0, end=24, size=1),
-                marker_color='#36a2eb',
-                name='Покупки'
-            ))
+            """.format
+REPORT_ZONE = "<h2>{} <span style='font-size:12px; color:#666'>({})</span></h2><div style='display:flex; flex-wrap:wrap; gap:20px;'>".format
+REPORT_CHART = "<div class='card' style='padding:10px;'>{}</div>".format
+REPORT_CHART_SLOT = "<div class='card' style='padding:10px;'><div class='chart' data-i='{}' style='width:400px; height:250px;'></div></div>".format
+
+# Draws each TIME_CHARTS entry ([title, counts, rule, split]) when its slot scrolls into view;
+# same look as tariff_figure, with the histogram drawn as pre-binned bars.
+# split ([[day type, counts], ...]) stacks the bars by day type.
+REPORT_CHARTS_SCRIPT = """
+    <script>
+        const TIME_CHARTS = {charts};
+        function drawChart(el) {{
+            const [title, counts, rule, split] = TIME_CHARTS[+el.dataset.i];
+            const w = 24 / counts.length, shapes = [], annotations = [];
+            const rect = (x0, x1, color, opacity) => shapes.push(
+                {{type: 'rect', x0, x1, y0: 0, y1: 1, yref: 'paper', fillcolor: color, opacity, line: {{width: 0}}}});
+            if (rule && rule.morning_end !== undefined) {{
+                rect(8, rule.morning_end, 'green', 0.1);
+                rect(rule.morning_end, 24, 'orange', 0.1);
+                annotations.push({{x: rule.morning_end, y: 1, yref: 'paper', text: 'End: ' + rule.label, showarrow: true, arrowcolor: 'white'}});
+            }}
+            if (rule && rule.start !== undefined) {{
+                rect(rule.start, 24, 'purple', 0.2);
+                rect(0, rule.end, 'purple', 0.2);
+            }}
+            const x = counts.map((_, i) => (i + 0.5) * w), colors = ['#36a2eb', '#ff9f40'];
+            const bars = (split || [['Покупки', counts]]).map(([name, y], k) => (
+                {{type: 'bar', x, y, width: w, marker: {{color: colors[k % colors.length]}}, name}}));
+            Plotly.newPlot(el, bars, {{
+                title: {{text: title}}, shapes, annotations, bargap: 0, barmode: 'stack',
+                plot_bgcolor: '#1e1e1e', paper_bgcolor: '#1e1e1e', font: {{color: '#ccc'}},
+                height: 250, width: 400, margin: {{l: 20, r: 20, t: 30, b: 20}},
+                xaxis: {{title: {{text: 'Час (0-23)'}}, dtick: 2}}, showlegend: !!split,
+                legend: {{orientation: 'h', x: 0, y: 1}}
+            }});
+        }}
+        const chartObserver = new IntersectionObserver(entries => entries.forEach(e => {{
+            if (e.isIntersecting) {{ chartObserver.unobserve(e.target); drawChart(e.target); }}
+        }}), {{rootMargin: '300px'}});
+        document.querySelectorAll('.chart').forEach(el => chartObserver.observe(el));
+    </script>""".format
+
+def chart_rule(rule):
+    """Time windows of a tariff for the client-side chart; the label is formatted here like in tariff_figure."""
+    if not rule: return None
+    rule = dict(rule)
+    if 'morning_end' in rule:
+        rule['label'] = format_time(rule['morning_end'])
+    return rule
+
+def tariff_figure(t_type, hours, rule):
+    """Purchase-hour histogram of one tariff with its current time windows shaded."""
+    fig = go.Figure()
+
+    # Histogram
+    fig.add_trace(go.Histogram(
+        x=hours,
+        xbins=dict(start=0, end=24, size=1),
+        marker_color='#36a2eb',
+        name='Покупки'
+    ))
+
+    # Draw Current Windows
+    shapes = []
+
+    if rule:
+        if 'morning_end' in rule:
+            me = rule['morning_end']
+            # Morning (Green)
+            shapes.append(dict(type="rect", x0=8, x1=me, y0=0, y1=1, yref="paper", fillcolor="green", opacity=0.1, line_width=0))
+            # Evening (Orange)
+            shapes.append(dict(type="rect", x0=me, x1=24, y0=0, y1=1, yref="paper", fillcolor="orange", opacity=0.1, line_width=0))
+
+            fig.add_annotation(x=me, y=1, yref="paper", text=f"End: {format_time(me)}", showarrow=True, arrowcolor="white")
+
+        if 'start' in rule: # Night
+            ns = rule['start']
+            ne = rule['end']
+            shapes.append(dict(type="rect", x0=ns, x1=24, y0=0, y1=1, yref="paper", fillcolor="purple", opacity=0.2, line_width=0))
+            shapes.append(dict(type="rect", x0=0, x1=ne, y0=0, y1=1, yref="paper", fillcolor="purple", opacity=0.2, line_width=0))
+
+    fig.update_layout(
+        title=f"{t_type}",
+        shapes=shapes,
+        plot_bgcolor='#1e1e1e',
+        paper_bgcolor='#1e1e1e',
+        font_color='#ccc',
+        height=250,
+        width=400,
+        margin=dict(l=20, r=20, t=30, b=20),
+        xaxis=dict(title="Час (0-23)", dtick=2),
+        showlegend=False
+    )
+    return fig
+
+@instrument.staged()
+def generate_report(stats, recs, out_path="TIME_REPORT.html", mode=REPORT_MODE, bins=REPORT_BINS):
+    print("🎨 Генерация отчета...")
+    charts = []  # 'consolidated': [title, counts, rule, split] per chart slot
 
-            # Draw Current Windows
-            rule = current_rules.get(t_type)
-            shapes = []
+    with ReportWriter(out_path) as out:
+        out.write(REPORT_HEAD)
+        if not recs:
+            out.write(REPORT_NO_RECS)
+        else:
+            for r in recs:
+                out.write(REPORT_REC(zone=r['zone'], tariff=r['tariff'], msg=r['msg'], reason=r['reason']))
+        out.write("</table></div>")
 
-            if rule:
-                if 'morning_end' in rule:
-                    me = rule['morning_end']
-                    # Morning (Green)
-                    shapes.append(dict(type="rect", x0=8, x1=me, y0=0, y1=1, yref="paper", fillcolor="green", opacity=0.1, line_width=0))
-                    # Evening (Orange)
-                    shapes.append(dict(type="rect", x0=me, x1=24, y0=0, y1=1, yref="paper", fillcolor="orange", opacity=0.1, line_width=0))
+        # --- CHARTS ---
+        # Sort zones: Standard first, then Console
+        sorted_zones = sorted(stats.keys(), key=lambda x: (stats[x]['type'], x))
 
-                    fig.add_annotation(x=me, y=1, yref="paper", text=f"End: {format_time(me)}", showarrow=True, arrowcolor="white")
+        for z_name in sorted_zones:
+            z_data = stats[z_name]
+            z_type = z_data['type']
 
-                if 'start' in rule: # Night
-                    ns = rule['start']
-                    ne = rule['end']
-                    shapes.append(dict(type="rect", x0=ns, x1=24, y0=0, y1=1, yref="paper", fillcolor="purple", opacity=0.2, line_width=0))
-                    shapes.append(dict(type="rect", x0=0, x1=ne, y0=0, y1=1, yref="paper", fillcolor="purple", opacity=0.2, line_width=0))
+            out.write(REPORT_ZONE(z_name, z_type))
 
-            fig.update_layout(
-                title=f"{t_type}",
-                shapes=shapes,
-                plot_bgcolor='#1e1e1e',
-                paper_bgcolor='#1e1e1e',
-                font_color='#ccc',
-                height=250,
-                width=400,
-                margin=dict(l=20, r=20, t=30, b=20),
-                xaxis=dict(title="Час (0-23)", dtick=2),
-                showlegend=False
-            )
+            # Determine rules for this zone type
+            current_rules = RULES.get(z_type, RULES['STANDARD'])
 
-            html += f"<div class='card' style='padding:10px;'>{fig.to_html(full_html=False, include_plotlyjs=False)}</div>"
+            # Charts come from the per-minute histograms, never from per-purchase data
+            for t_type, minutes in z_data['minutes'].items():
+                if not minutes.any(): continue
+                if mode == 'figures':
+                    fig = tariff_figure(t_type, minute_hours(minutes), current_rules.get(t_type))
+                    out.write(REPORT_CHART(fig.to_html(full_html=False, include_plotlyjs=False)))
+                else:
+                    out.write(REPORT_CHART_SLOT(len(charts)))
+                    chart = [t_type, rebin(minutes, bins).tolist(), chart_rule(current_rules.get(t_type))]
+                    if 'by_day' in z_data:
+                        chart.append([[d, rebin(m[t_type], bins).tolist()] for d, m in z_data['by_day'].items()])
+                    charts.append(chart)
 
-        html += "</div><hr style='border-color:#333'>"
+            out.write("</div><hr style='border-color:#333'>")
 
-    html += "</body></html>"
+        if charts:
+            payload = json.dumps(charts, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+            out.write(REPORT_CHARTS_SCRIPT(charts=payload))
+        out.write("</body></html>")
 
-    with open("TIME_REPORT.html", "w", encoding="utf-8") as f:
-        f.write(html)
-    print("✅ Отчет сохранен: TIME_REPORT.html")
+    print(f"✅ Отчет сохранен: {out_path}")
 
 if __name__ == "__main__":
+    # python time_anal.py [--memory] [--profile collect_time_stats]
+    instrument.cli_run('time_anal')
+    from anal import PRICE_FILE, load_config
+    # Zones come from price.xlsx like in pipeline.py, so they match the price grid
+    price_map, price_grid, _ = load_config(PRICE_FILE)
     zones, pc_map = fetch_metadata()
     # Proceed even if zones empty, using fallback
-    stats = analyze_time_distribution(FILE_NAME, zones, pc_map)
+    stats = analyze_time_distribution(FILE_NAME, zones, pc_map, price_map)
     if stats:
-        recs = generate_recommendations(stats)
+        recs = generate_recommendations(stats, price_grid)
         generate_report(stats, recs)
     else:
-        print("❌ Ошибка анализа.")
\ No newline at end of file
+        print("❌ Ошибка анализа.")
+
+    instrument.finish_run()